@@ -1,11 +1,16 @@
 # your_project/middleware/active_user_middleware.py
-from django.utils import timezone
-from datetime import timedelta
+from users import presence
+
 
 class ActiveUserMiddleware:
     """
-    Middleware that updates a user's `last_seen` and `is_online` status
-    whenever they make an authenticated request.
+    Middleware that records a presence heartbeat whenever a user makes an
+    authenticated request.
+
+    Heartbeats go to the presence store (users.presence), not the users
+    table; `last_seen` / `is_online` are written back in batches by
+    `manage.py flush_presence --loop` with Redis, or by this middleware at
+    most once per PRESENCE_FLUSH_INTERVAL with the in-process store.
 
     Add this AFTER authentication middleware in settings.py.
     """
@@ -18,15 +23,7 @@ class ActiveUserMiddleware:
 
         user = getattr(request, "user", None)
         if user and user.is_authenticated:
-            now = timezone.now()
-            # If user inactive for >5 minutes, consider them "back online"
-            if not user.is_online or (user.last_seen and now - user.last_seen > timedelta(minutes=5)):
-                user.is_online = True
-                user.last_seen = now
-                user.save(update_fields=["is_online", "last_seen"])
-            else:
-                # Just update the timestamp (light update)
-                user.last_seen = now
-                user.save(update_fields=["last_seen"])
+            presence.heartbeat(user.id)
+            presence.flush_in_process_if_due()
 
         return response
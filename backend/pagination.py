@@ -0,0 +1,20 @@
+from rest_framework.pagination import BasePagination
+
+
+class KeysetPagination(BasePagination):
+    """
+    Base of the keyset paginators (posts, comments, messages, follows): the
+    page size comes from ?page_size, clamped to 1..max_page_size, falling
+    back to page_size when missing or not a number. Subclasses locate
+    their pages with a range condition on an indexed key, never OFFSET.
+    """
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 50
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
@@ -188,6 +188,87 @@ CHANNEL_LAYERS = {
     },
 }
 
+# ====================================================
+# CACHE (shared across workers when Redis is configured)
+# ====================================================
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# ====================================================
+# CHAT SOCKETS (uploads, catch-up, connect cache, coalescing)
+# ====================================================
+# Max size of a single binary frame on the socket (the spool buffer per frame).
+CHAT_UPLOAD_CHUNK_SIZE = int(os.getenv("CHAT_UPLOAD_CHUNK_SIZE", 64 * 1024))
+# Size of each part sent to Cloudinary, raised to its 5 MB minimum. One part
+# is held in memory while it is pushed, so this is the peak memory per upload.
+CHAT_UPLOAD_PART_SIZE = int(os.getenv("CHAT_UPLOAD_PART_SIZE", 5 * 1024 * 1024))
+CHAT_UPLOAD_MAX_SIZE = int(os.getenv("CHAT_UPLOAD_MAX_SIZE", 25 * 1024 * 1024))
+# Threads dedicated to pushing attachments to storage.
+CHAT_UPLOAD_WORKERS = int(os.getenv("CHAT_UPLOAD_WORKERS", 4))
+# Max messages replayed to a reconnecting socket (since_seq); clients page
+# the rest over REST.
+CHAT_CATCHUP_LIMIT = int(os.getenv("CHAT_CATCHUP_LIMIT", 200))
+# Seconds socket admission data (users, conversation participants) stays
+# cached; entries are also dropped whenever the row changes.
+CHAT_CONNECT_CACHE_TTL = int(os.getenv("CHAT_CONNECT_CACHE_TTL", 300))
+# Typing / read receipt coalescing (seconds): at most one typing broadcast
+# per window, typing_stopped after the timeout without keystrokes, and at
+# most one read receipt write + event per window.
+CHAT_TYPING_WINDOW = float(os.getenv("CHAT_TYPING_WINDOW", 3))
+CHAT_TYPING_TIMEOUT = float(os.getenv("CHAT_TYPING_TIMEOUT", 5))
+CHAT_READ_RECEIPT_WINDOW = float(os.getenv("CHAT_READ_RECEIPT_WINDOW", 2))
+# Frames buffered per socket before a slow client is closed (code 4008).
+CHAT_SEND_QUEUE_SIZE = int(os.getenv("CHAT_SEND_QUEUE_SIZE", 256))
+
+# ====================================================
+# PRESENCE (heartbeats in Redis, last_seen flushed to the DB in batches)
+# ====================================================
+# "redis" or "memory" (single process; dev and tests).
+PRESENCE_BACKEND = os.getenv("PRESENCE_BACKEND", "redis" if REDIS_URL else "memory")
+# Seconds since the last heartbeat during which a user without an open
+# socket still counts as online.
+PRESENCE_TIMEOUT = int(os.getenv("PRESENCE_TIMEOUT", 300))
+# Seconds between batched last_seen writes to the users table: by
+# manage.py flush_presence --loop with Redis, by the server process itself
+# (ActiveUserMiddleware) with the memory backend.
+PRESENCE_FLUSH_INTERVAL = int(os.getenv("PRESENCE_FLUSH_INTERVAL", 60))
+
+# ====================================================
+# HOME TIMELINES (fan-out-on-write, see posts.timeline)
+# ====================================================
+# Entries kept per user (manage.py trim_timelines); older posts drop out
+# of the home feed.
+TIMELINE_MAX_LENGTH = int(os.getenv("TIMELINE_MAX_LENGTH", 500))
+# Authors with more followers than this are not fanned out on write;
+# their posts are pulled into followers' feeds at read time.
+TIMELINE_FANOUT_THRESHOLD = int(os.getenv("TIMELINE_FANOUT_THRESHOLD", 5000))
+# Authors with more followers than this are fanned out by
+# manage.py fan_out_posts --loop instead of while the post is created.
+TIMELINE_INLINE_FANOUT = int(os.getenv("TIMELINE_INLINE_FANOUT", 100))
+# Seconds between passes of manage.py fan_out_posts --loop.
+TIMELINE_FANOUT_INTERVAL = int(os.getenv("TIMELINE_FANOUT_INTERVAL", 5))
+
+# ====================================================
+# TRENDING HASHTAGS (hourly usage buckets, see posts.trending)
+# ====================================================
+# Hours of buckets kept and scored.
+TRENDING_WINDOW_HOURS = int(os.getenv("TRENDING_WINDOW_HOURS", 48))
+# A use this many hours old counts half as much as one from this hour.
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", 6))
+# Tags kept on the leaderboard by `manage.py refresh_trending_hashtags`.
+TRENDING_SIZE = int(os.getenv("TRENDING_SIZE", 50))
+
 # ====================================================
 # EMAIL SETTINGS
 # ====================================================
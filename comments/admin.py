@@ -1,4 +1,6 @@
 from django.contrib import admin
+from django.db import transaction
+
 from .models import Comment
 
 
@@ -26,8 +28,10 @@ class CommentAdmin(admin.ModelAdmin):
 
     short_content.short_description = "content"
 
-    def likes_count(self, obj):
-        """Show the number of likes for each comment."""
-        return obj.likes.count()
-
-    likes_count.short_description = "likes"
+    def delete_queryset(self, request, queryset):
+        """Bulk "delete selected" skips Comment.delete(): recount what it touched."""
+        with transaction.atomic():
+            post_ids = set(queryset.values_list("post_id", flat=True))
+            root_ids = set(queryset.exclude(thread_root=None).values_list("thread_root_id", flat=True))
+            queryset.delete()
+            Comment.recount(post_ids, root_ids)
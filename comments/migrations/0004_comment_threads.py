@@ -0,0 +1,74 @@
+# Generated by Django 5.2.7 on 2026-10-17 04:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_threads(apps, schema_editor):
+    """Walk the reply tree level by level, setting thread_root / depth, then count threads."""
+    Comment = apps.get_model("comments", "Comment")
+
+    root_of = {
+        pk: pk for pk in Comment.objects.filter(parent__isnull=True).values_list("pk", flat=True)
+    }
+    frontier = list(root_of)
+    depth = 0
+    while frontier:
+        depth += 1
+        children = []
+        for start in range(0, len(frontier), 1000):
+            for pk, parent_id in Comment.objects.filter(
+                parent_id__in=frontier[start:start + 1000]
+            ).values_list("pk", "parent_id"):
+                root_of[pk] = root_of[parent_id]
+                children.append(Comment(pk=pk, thread_root_id=root_of[parent_id], depth=depth))
+        Comment.objects.bulk_update(children, ["thread_root", "depth"], batch_size=1000)
+        frontier = [comment.pk for comment in children]
+
+    Comment.objects.filter(parent__isnull=True).update(reply_count=Coalesce(Subquery(
+        Comment.objects.filter(thread_root=OuterRef("pk"))
+        .order_by()
+        .values("thread_root")
+        .annotate(n=Count("pk"))
+        .values("n")
+    ), 0))
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0003_comment_likes_count'),
+        ('posts', '0008_trending_hashtags'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='thread_root',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='thread_replies', to='comments.comment'),
+        ),
+        migrations.RunPython(backfill_threads, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['thread_root', 'created_at', 'id'], name='comment_thread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('parent__isnull', True)), fields=['post', 'created_at', 'id'], name='comment_top_level_idx'),
+        ),
+    ]
@@ -1,6 +1,10 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
 from django.conf import settings
 
+from users.relations import count_of, toggle_membership
+
 User = settings.AUTH_USER_MODEL
 
 class Comment(models.Model):
@@ -30,6 +34,25 @@ class Comment(models.Model):
         help_text="If set, this comment is a reply to another comment"
     )
 
+    # Thread bookkeeping, set on create: the top-level comment this one
+    # belongs to (null for top-level comments) and its nesting level, so a
+    # whole thread is one indexed range on (thread_root, created_at, id)
+    thread_root = models.ForeignKey(
+        "self",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="thread_replies",
+        editable=False,
+    )
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    # Replies in the thread (top-level comments only), kept in step by
+    # save() and comments.signals
+    reply_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # Stored like counter, kept in step by the like toggle
+    likes_count = models.PositiveIntegerField(default=0)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -38,8 +61,83 @@ class Comment(models.Model):
         indexes = [
             models.Index(fields=["post", "created_at"]),
             models.Index(fields=["user", "created_at"]),
+            models.Index(fields=["thread_root", "created_at", "id"], name="comment_thread_idx"),
+            models.Index(
+                fields=["post", "created_at", "id"],
+                condition=models.Q(parent__isnull=True),
+                name="comment_top_level_idx",
+            ),
         ]
 
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            super().save(*args, **kwargs)
+            return
+
+        if self.parent_id is not None:
+            self.depth = self.parent.depth + 1
+            self.thread_root_id = self.parent.thread_root_id or self.parent_id
+
+        # New comment (or reply): bump the post's (and thread's) counter in
+        # the same transaction. Deletes are counted in delete() below.
+        from posts.models import Post
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            Post.objects.filter(pk=self.post_id).update(comments_count=F("comments_count") + 1)
+            if self.thread_root_id is not None:
+                Comment.objects.filter(pk=self.thread_root_id).update(reply_count=F("reply_count") + 1)
+
+    def delete(self, *args, **kwargs):
+        """
+        Delete the comment and, by CASCADE, its replies, then take them all
+        off the post's (and thread's) counter with one UPDATE each.
+
+        Comments removed with their post need no accounting; comments removed
+        with their author are recounted by comments.signals.
+        """
+        from posts.models import Post
+
+        with transaction.atomic():
+            deleted, per_model = super().delete(*args, **kwargs)
+            removed = per_model.get(Comment._meta.label, 0)
+            if removed:
+                Post.objects.filter(pk=self.post_id).update(
+                    comments_count=Greatest(F("comments_count") - removed, 0)
+                )
+                # Replies always sit in the deleted comment's thread
+                if self.thread_root_id is not None:
+                    Comment.objects.filter(pk=self.thread_root_id).update(
+                        reply_count=Greatest(F("reply_count") - removed, 0)
+                    )
+        return deleted, per_model
+
+    @classmethod
+    def recount(cls, post_ids=(), thread_root_ids=()):
+        """
+        Recompute comments_count of `post_ids` and reply_count of
+        `thread_root_ids` from the comment rows, one UPDATE each. Used after
+        deletes that bypass delete() (bulk deletes, CASCADE from a user).
+        """
+        from posts.models import Post
+
+        if post_ids:
+            Post.objects.filter(pk__in=post_ids).update(comments_count=count_of(cls, "post"))
+        if thread_root_ids:
+            cls.objects.filter(pk__in=thread_root_ids).update(reply_count=count_of(cls, "thread_root"))
+
+    def toggle_like(self, user):
+        """
+        Like the comment as `user`, or unlike it if already liked. Returns
+        whether it is now liked; `likes_count` is refreshed.
+        """
+        with transaction.atomic():
+            liked, changed = toggle_membership(self.likes, user)
+            if changed:
+                Comment.objects.filter(pk=self.pk).update(likes_count=F("likes_count") + (1 if liked else -1))
+            self.refresh_from_db(fields=["likes_count"])
+        return liked
+
     def __str__(self):
         user_str = getattr(self.user, "username", str(self.user))
         if self.parent:
@@ -0,0 +1,10 @@
+from posts.pagination import PostCursorPagination
+
+
+class CommentCursorPagination(PostCursorPagination):
+    """Top-level comments of a post, newest first."""
+
+
+class ReplyCursorPagination(PostCursorPagination):
+    """Replies in a thread, oldest first."""
+    newest_first = False
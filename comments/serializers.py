@@ -1,14 +1,22 @@
 from rest_framework import serializers
 from django.conf import settings
 from .models import Comment
+from posts.likes import is_liked, prime_likes
 from posts.models import Post
+from users.relations import PrimedListSerializer
 
 User = settings.AUTH_USER_MODEL
 
 
+class CommentListSerializer(PrimedListSerializer):
+    def prime(self, comments):
+        # One query for the viewer's likes on this level of comments
+        prime_likes(self.context, comments=comments)
+
+
 class CommentSerializer(serializers.ModelSerializer):
     user = serializers.SerializerMethodField()
-    likes_count = serializers.SerializerMethodField()
+    likes_count = serializers.IntegerField(read_only=True)
     is_liked = serializers.SerializerMethodField()
     replies = serializers.SerializerMethodField()  # new field
 
@@ -26,6 +34,7 @@ class CommentSerializer(serializers.ModelSerializer):
             "parent",
             "replies",  # include replies
         ]
+        list_serializer_class = CommentListSerializer
 
     def get_user(self, obj):
         user_obj = obj.user
@@ -48,19 +57,33 @@ class CommentSerializer(serializers.ModelSerializer):
             "profile_picture": profile_picture_url or fallback_avatar,
         }
 
-    def get_likes_count(self, obj):
-        return obj.likes.count()
-
     def get_is_liked(self, obj):
-        user = self.context.get("request").user
-        if user and user.is_authenticated:
-            return obj.likes.filter(id=user.id).exists()
-        return False
+        return is_liked(self.context, obj)
+
+    def get_replies(self, obj):
+        # Children linked in memory by comments.tree; never queried per level
+        return CommentSerializer(obj.tree_replies, many=True, context=self.context).data
+
+
+class CommentReplySerializer(CommentSerializer):
+    """A reply in a paginated thread: flat, placed by `parent` and `depth`."""
+
+    class Meta(CommentSerializer.Meta):
+        fields = [f for f in CommentSerializer.Meta.fields if f != "replies"] + ["depth", "thread_root"]
+
+
+class CommentThreadSerializer(CommentSerializer):
+    """
+    A top-level comment in a paginated listing: its reply_count and only the
+    first few replies of its thread (see comments.tree.attach_reply_previews).
+    """
+    replies = serializers.SerializerMethodField()
+
+    class Meta(CommentSerializer.Meta):
+        fields = CommentSerializer.Meta.fields + ["reply_count"]
 
     def get_replies(self, obj):
-        # recursively serialize child comments
-        replies_qs = obj.replies.all().order_by("created_at")  # oldest first for replies
-        return CommentSerializer(replies_qs, many=True, context=self.context).data
+        return CommentReplySerializer(obj.preview_replies, many=True, context=self.context).data
 
 
 class CommentCreateUpdateSerializer(serializers.ModelSerializer):
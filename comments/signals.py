@@ -0,0 +1,46 @@
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+
+from comments.models import Comment
+
+User = get_user_model()
+
+
+# -------------------------------
+# Stored counters when a user is deleted
+# -------------------------------
+# Single comment deletes are counted by Comment.delete, in bulk. Deleting a
+# post takes its comments (and their counters) with it, so nothing is
+# counted there. Deleting a user removes, through CASCADE and without
+# m2m_changed:
+#   - their comments on other people's posts, with every reply under them:
+#     the posts and threads touched are remembered before and recounted
+#     after (Comment.recount);
+#   - their comment likes: pre_delete runs inside the delete's transaction,
+#     so each liked comment is decremented there, in one UPDATE.
+@receiver(pre_delete, sender=User)
+def remember_commented_posts(sender, instance, **kwargs):
+    rows = (
+        Comment.objects.filter(user=instance)
+        .exclude(post__user=instance)
+        .values_list("post_id", "thread_root_id")
+        .distinct()
+    )
+    post_ids, root_ids = set(), set()
+    for post_id, root_id in rows:
+        post_ids.add(post_id)
+        if root_id is not None:
+            root_ids.add(root_id)
+    instance._commented_on = (post_ids, root_ids)
+
+    Comment.objects.filter(likes=instance).update(likes_count=Greatest(F("likes_count") - 1, 0))
+
+
+@receiver(post_delete, sender=User)
+def recount_commented_posts(sender, instance, **kwargs):
+    # Roots written by the deleted user are already gone
+    post_ids, root_ids = getattr(instance, "_commented_on", ((), ()))
+    Comment.recount(post_ids, root_ids)
@@ -1,3 +1,146 @@
+from django.contrib import admin
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from comments.admin import CommentAdmin
+from comments.models import Comment
+from posts.models import Post
+from users.models import CustomUser
+
+
+class CommentTreeTests(TestCase):
+    """Comment threads are assembled in memory with a constant query count."""
+
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(username="alice", email="alice@example.com", password="pass")
+        self.bob = CustomUser.objects.create_user(username="bob", email="bob@example.com", password="pass")
+        self.post = Post.objects.create(user=self.bob, content="hello")
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def thread(self, roots, depth):
+        """`roots` top-level comments, each with a reply chain `depth` deep."""
+        for i in range(roots):
+            parent = Comment.objects.create(user=self.bob, post=self.post, content=f"root {i}")
+            for level in range(depth):
+                parent = Comment.objects.create(user=self.alice, post=self.post, content=f"reply {level}", parent=parent)
+                parent.likes.add(self.alice)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries.captured_queries), response.data
+
+    def test_thread_detail_query_count_independent_of_size(self):
+        self.thread(roots=1, depth=1)
+        root = Comment.objects.get(parent__isnull=True)
+        small, _ = self.count_queries(reverse("comment-detail", args=[root.pk]))
+
+        for _ in range(3):
+            Comment.objects.create(user=self.bob, post=self.post, content="another", parent=root)
+        reply = Comment.objects.filter(parent=root).order_by("created_at", "id").first()
+        for level in range(4):
+            reply = Comment.objects.create(user=self.alice, post=self.post, content=f"deep {level}", parent=reply)
+        large, data = self.count_queries(reverse("comment-detail", args=[root.pk]))
+
+        self.assertEqual(small, large)
+        self.assertEqual(len(data["replies"]), 4)
+        self.assertTrue(data["replies"][0]["is_liked"])
+        self.assertEqual(data["replies"][0]["replies"][-1]["replies"][0]["content"], "deep 1")
+
+    def test_reply_detail_query_count_independent_of_depth(self):
+        self.thread(roots=1, depth=2)
+        reply = Comment.objects.get(parent__parent__isnull=True, parent__isnull=False)
+        small, _ = self.count_queries(reverse("comment-detail", args=[reply.pk]))
+        self.thread(roots=1, depth=1)
+        nested = reply
+        for level in range(4):
+            nested = Comment.objects.create(user=self.alice, post=self.post, content=f"deep {level}", parent=nested)
+        large, data = self.count_queries(reverse("comment-detail", args=[reply.pk]))
+
+        self.assertEqual(small, large)
+        self.assertEqual([r["content"] for r in data["replies"]], ["reply 1", "deep 0"])
+        self.assertEqual(data["replies"][1]["replies"][0]["content"], "deep 1")
+
+        response = self.client.post(reverse("post-comments", args=[self.post.pk]), {"content": "new", "parent": reply.pk})
+        self.assertEqual(response.data["replies"], [])
+        response = self.client.patch(reverse("comment-detail", args=[reply.pk]), {"content": "edited"})
+        self.assertEqual((response.data["content"], len(response.data["replies"])), ("edited", 3))
+
+    def test_post_detail_embeds_first_page(self):
+        self.thread(roots=2, depth=2)
+        small, _ = self.count_queries(reverse("post-detail", args=[self.post.pk]))
+        self.thread(roots=10, depth=5)
+        large, data = self.count_queries(reverse("post-detail", args=[self.post.pk]))
+
+        self.assertEqual(small, large)
+        comments = data["comments"]
+        self.assertEqual(len(comments["results"]), 10)  # top-level only, one page
+        self.assertEqual(comments["results"][0]["reply_count"], 5)
+        self.assertEqual([r["content"] for r in comments["results"][0]["replies"]], ["reply 0", "reply 1", "reply 2"])
+
+        rest = self.client.get(comments["next"]).data
+        self.assertEqual([c["content"] for c in rest["results"]], ["root 1", "root 0"])
+
+
+class CommentThreadPaginationTests(TestCase):
+    """Paginated top-level comments with reply previews, and per-thread reply pages."""
+
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(username="alice", email="alice@example.com", password="pass")
+        self.post = Post.objects.create(user=self.alice, content="hello")
+        self.roots = [Comment.objects.create(user=self.alice, post=self.post, content=f"root {i}") for i in range(3)]
+        self.replies = []
+        parent = self.roots[0]
+        for i in range(5):
+            parent = Comment.objects.create(user=self.alice, post=self.post, content=f"reply {i}", parent=parent)
+            self.replies.append(parent)
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def test_thread_fields(self):
+        self.roots[0].refresh_from_db()
+        self.assertEqual(self.roots[0].reply_count, 5)
+        self.assertEqual([(c.thread_root_id, c.depth) for c in self.replies],
+                         [(self.roots[0].pk, depth) for depth in range(1, 6)])
+
+        self.replies[2].delete()  # and the two below it
+        self.roots[0].refresh_from_db()
+        self.assertEqual(self.roots[0].reply_count, 2)
+
+    def test_admin_bulk_delete_recounts(self):
+        CommentAdmin(Comment, admin.site).delete_queryset(
+            None, Comment.objects.filter(pk__in=[self.replies[3].pk, self.roots[1].pk])
+        )
+        self.post.refresh_from_db()
+        self.roots[0].refresh_from_db()
+        # replies[3] took replies[4] with it
+        self.assertEqual((self.post.comments_count, self.roots[0].reply_count), (5, 3))
+
+    def test_top_level_pages_with_previews(self):
+        response = self.client.get(reverse("post-comments", args=[self.post.pk]), {"page_size": 2})
+        self.assertEqual([c["id"] for c in response.data["results"]], [self.roots[2].pk, self.roots[1].pk])
+
+        response = self.client.get(response.data["next"])
+        self.assertIsNone(response.data["next"])
+        thread = response.data["results"][0]
+        self.assertEqual(thread["reply_count"], 5)
+        self.assertEqual([r["id"] for r in thread["replies"]], [r.pk for r in self.replies[:3]])
+        self.assertEqual([r["depth"] for r in thread["replies"]], [1, 2, 3])
+
+    def test_reply_pages(self):
+        url = reverse("comment-replies", args=[self.roots[0].pk])
+        ids = []
+        while url:
+            response = self.client.get(url, {"page_size": 2} if not ids else None)
+            ids += [r["id"] for r in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(ids, [r.pk for r in self.replies])
+
+        sibling = Comment.objects.create(user=self.alice, post=self.post, content="sibling", parent=self.replies[0])
+        response = self.client.get(reverse("comment-replies", args=[self.replies[0].pk]))
+        self.assertEqual([r["id"] for r in response.data["results"]], [self.replies[1].pk, sibling.pk])
@@ -0,0 +1,80 @@
+"""
+Comment threads assembled in memory.
+
+A post's comments are loaded with one query (authors joined in), linked
+into a tree by parent_id in Python and serialized from that tree, so the
+query count of a thread does not depend on its size or depth. Each comment
+in the tree carries its children as `tree_replies`, which is all
+CommentSerializer.get_replies reads: it never queries obj.replies, so
+whatever it serializes must come through comment_tree (or thread_tree).
+
+Paginated listings don't load whole threads: each top-level comment of a
+page gets a preview of its first replies (attach_reply_previews) and the
+rest is paged per thread via thread_root.
+"""
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from comments.models import Comment
+from posts.likes import prime_likes
+
+
+def comment_tree(comments):
+    """
+    Link `comments` (all of one post) into a tree. Returns the top-level
+    comments newest first; replies at every level are oldest first.
+    """
+    comments = sorted(comments, key=lambda comment: (comment.created_at, comment.pk))
+    by_id = {comment.pk: comment for comment in comments}
+    roots = []
+    for comment in comments:
+        comment.tree_replies = []
+    for comment in comments:
+        if comment.parent_id is None:
+            roots.append(comment)
+        elif comment.parent_id in by_id:
+            by_id[comment.parent_id].tree_replies.append(comment)
+    roots.reverse()
+    return roots
+
+
+def thread_tree(comment, context):
+    """
+    `comment`, top-level or a reply at any depth, with every reply under it
+    attached: one indexed query on thread_root for its thread, one for the
+    viewer's likes.
+    """
+    root_id = comment.thread_root_id or comment.pk
+    comments = [
+        reply for reply in Comment.objects.filter(thread_root_id=root_id).select_related("user")
+        if reply.pk != comment.pk
+    ]
+    comments.append(comment)
+    comment_tree(comments)
+    prime_likes(context, comments=comments)
+    return comment
+
+
+def attach_reply_previews(roots, limit):
+    """
+    Set `preview_replies` on each top-level comment to the first `limit`
+    replies of its thread (oldest first), for a whole page in one query.
+    """
+    previews = {root.pk: [] for root in roots}
+    if previews and limit > 0:
+        replies = (
+            Comment.objects.filter(thread_root_id__in=previews)
+            .select_related("user")
+            .annotate(position=Window(
+                RowNumber(),
+                partition_by=[F("thread_root_id")],
+                order_by=[F("created_at").asc(), F("id").asc()],
+            ))
+            .filter(position__lte=limit)
+            .order_by("thread_root_id", "position")
+        )
+        for reply in replies:
+            previews[reply.thread_root_id].append(reply)
+    for root in roots:
+        root.preview_replies = previews[root.pk]
+    return [reply for replies in previews.values() for reply in replies]
@@ -2,6 +2,7 @@ from django.urls import path
 from .views import (
     PostCommentListCreateView,
     CommentDetailView,
+    CommentRepliesView,
     CommentLikeToggleView,
 )
 
@@ -12,6 +13,9 @@ urlpatterns = [
     # Retrieve, update, delete single comment
     path("comments/<int:comment_id>/", CommentDetailView.as_view(), name="comment-detail"),
 
+    # Replies of a top-level comment's thread (paginated)
+    path("comments/<int:comment_id>/replies/", CommentRepliesView.as_view(), name="comment-replies"),
+
     # Like / Unlike comment
     path("comments/<int:comment_id>/like/", CommentLikeToggleView.as_view(), name="comment-like-toggle"),
 ]
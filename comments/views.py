@@ -5,8 +5,16 @@ from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnl
 from django.shortcuts import get_object_or_404
 
 from .models import Comment
+from .pagination import CommentCursorPagination, ReplyCursorPagination
+from posts.likes import prime_likes
 from posts.models import Post
-from .serializers import CommentSerializer, CommentCreateUpdateSerializer
+from .serializers import (
+    CommentSerializer,
+    CommentCreateUpdateSerializer,
+    CommentReplySerializer,
+    CommentThreadSerializer,
+)
+from .tree import attach_reply_previews, comment_tree, thread_tree
 
 
 # -------------------------------
@@ -15,15 +23,26 @@ from .serializers import CommentSerializer, CommentCreateUpdateSerializer
 class PostCommentListCreateView(APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    reply_preview_size = 3
+
     def get(self, request, post_id):
         """
-        List top-level comments for a post.
-        Replies are included recursively via serializer.
+        List top-level comments for a post, newest first, a cursor page at a
+        time. Each carries its reply_count and the first few replies of its
+        thread; the rest are paged by CommentRepliesView.
         """
         post = get_object_or_404(Post, id=post_id)
-        top_level_comments = post.comments.filter(parent__isnull=True).order_by("-created_at")
-        serializer = CommentSerializer(top_level_comments, many=True, context={"request": request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        context = {"request": request}
+
+        paginator = CommentCursorPagination()
+        roots = paginator.paginate_queryset(
+            post.comments.filter(parent__isnull=True).select_related("user"), request, view=self
+        )
+        replies = attach_reply_previews(roots, self.reply_preview_size)
+        prime_likes(context, comments=roots + replies)
+
+        serializer = CommentThreadSerializer(roots, many=True, context=context)
+        return paginator.get_paginated_response(serializer.data)
 
     def post(self, request, post_id):
         """
@@ -36,11 +55,37 @@ class PostCommentListCreateView(APIView):
         )
         if serializer.is_valid():
             comment = serializer.save()
+            comment_tree([comment])  # a new comment has no replies yet
             read_serializer = CommentSerializer(comment, context={"request": request})
             return Response(read_serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+# -------------------------------
+# Replies in a thread (paginated)
+# -------------------------------
+class CommentRepliesView(APIView):
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+    def get(self, request, comment_id):
+        """
+        Replies under a comment, oldest first, a cursor page at a time. Flat:
+        each reply has `parent` and `depth`. For a top-level comment that is
+        its whole thread (indexed on thread_root); for a reply, its direct
+        replies (indexed on parent), which clients expand level by level.
+        """
+        comment = get_object_or_404(Comment, id=comment_id)
+        if comment.thread_root_id is None:
+            replies = Comment.objects.filter(thread_root=comment)
+        else:
+            replies = Comment.objects.filter(parent=comment)
+
+        paginator = ReplyCursorPagination()
+        replies = paginator.paginate_queryset(replies.select_related("user"), request, view=self)
+        serializer = CommentReplySerializer(replies, many=True, context={"request": request})
+        return paginator.get_paginated_response(serializer.data)
+
+
 # -------------------------------
 # Retrieve, Update, Delete a comment or reply
 # -------------------------------
@@ -51,9 +96,11 @@ class CommentDetailView(APIView):
         return get_object_or_404(Comment, id=comment_id)
 
     def get(self, request, comment_id):
-        """Retrieve a single comment (or reply)"""
+        """Retrieve a single comment (or reply) with its replies nested"""
         comment = self.get_object(comment_id)
-        serializer = CommentSerializer(comment, context={"request": request})
+        # Its subtree from one indexed query on the thread
+        context = {"request": request}
+        serializer = CommentSerializer(thread_tree(comment, context), context=context)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def patch(self, request, comment_id):
@@ -66,7 +113,8 @@ class CommentDetailView(APIView):
         serializer = CommentCreateUpdateSerializer(comment, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
-            read_serializer = CommentSerializer(comment, context={"request": request})
+            context = {"request": request}
+            read_serializer = CommentSerializer(thread_tree(comment, context), context=context)
             return Response(read_serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -90,16 +138,12 @@ class CommentLikeToggleView(APIView):
     def post(self, request, comment_id):
         """Toggle like/unlike for a comment or reply"""
         comment = self.get_object(comment_id)
-        user = request.user
+        action = "liked" if comment.toggle_like(request.user) else "unliked"
 
-        if user in comment.likes.all():
-            comment.likes.remove(user)
-            action = "unliked"
-        else:
-            comment.likes.add(user)
-            action = "liked"
-
-        return Response({"detail": f"Successfully {action} comment."}, status=status.HTTP_200_OK)
+        return Response(
+            {"detail": f"Successfully {action} comment.", "likes_count": comment.likes_count},
+            status=status.HTTP_200_OK,
+        )
 
     def get_object(self, comment_id):
         """Helper to fetch comment"""
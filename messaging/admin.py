@@ -20,8 +20,8 @@ class ConversationAdmin(admin.ModelAdmin):
 
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
-    list_display = ("id", "conversation", "sender", "short_text", "is_read", "created_at")
-    list_filter = ("is_read", "created_at")
+    list_display = ("id", "conversation", "sender", "short_text", "created_at")
+    list_filter = ("created_at",)
     search_fields = ("sender__username", "conversation__user1__username", "conversation__user2__username", "text")
     ordering = ("-created_at",)
 
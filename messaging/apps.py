@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class MessagingConfig(AppConfig):
+    name = 'messaging'
+
+    def ready(self):
+        import messaging.signals
@@ -0,0 +1,104 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import IntegerField, Q, Value
+
+from messaging.models import Conversation
+
+User = get_user_model()
+
+
+# Lookups made on every WebSocket connect. Entries expire after
+# CHAT_CONNECT_CACHE_TTL and are dropped by messaging.signals as soon as the
+# underlying row changes, so a warm socket admission costs no DB round trip
+# and a cold one a single query.
+
+# The user columns a socket needs: identity, whether it may connect, and
+# what MessageSerializer shows of the sender. Nothing else (password hash,
+# reset codes, email) is put in the shared cache.
+SOCKET_USER_FIELDS = (
+    "id",
+    "username",
+    "first_name",
+    "last_name",
+    "profile_picture",
+    "is_active",
+    "last_seen",
+)
+
+
+def _ttl():
+    return getattr(settings, "CHAT_CONNECT_CACHE_TTL", 300)
+
+
+def user_key(user_id):
+    return f"chat:user:{user_id}"
+
+
+def _load_socket_entry(user_id):
+    """
+    {"user": SOCKET_USER_FIELDS values, "conversation_ids": set} for a user,
+    or None if there is no such user. One UNION ALL query on a cold cache:
+    the user's row plus one row per conversation they take part in.
+    """
+    entry = cache.get(user_key(user_id))
+    if entry is not None:
+        return entry
+
+    nulls = {f"null_{name}": Value(None, output_field=IntegerField()) for name in SOCKET_USER_FIELDS}
+    user_row = (
+        User.objects.filter(pk=user_id)
+        .annotate(null_conversation=Value(None, output_field=IntegerField()))
+        .order_by()
+        .values_list(*SOCKET_USER_FIELDS, "null_conversation")
+    )
+    conversation_rows = (
+        Conversation.objects.filter(Q(user1_id=user_id) | Q(user2_id=user_id))
+        .annotate(**nulls)
+        .order_by()
+        .values_list(*nulls, "id")
+    )
+
+    user = None
+    conversation_ids = set()
+    for row in user_row.union(conversation_rows, all=True):
+        if row[-1] is None:
+            user = row[:-1]
+        else:
+            conversation_ids.add(row[-1])
+    if user is None:
+        return None
+
+    entry = {"user": user, "conversation_ids": conversation_ids}
+    cache.set(user_key(user_id), entry, _ttl())
+    return entry
+
+
+def get_cached_user(user_id):
+    """
+    Active user for a socket, or None if it doesn't exist or is inactive.
+    Only SOCKET_USER_FIELDS are loaded; other fields are deferred.
+    """
+    entry = _load_socket_entry(int(user_id))
+    if entry is None:
+        return None
+    values = dict(zip(SOCKET_USER_FIELDS, entry["user"]))
+    # from_db() takes the loaded values in model field order
+    names = [f.attname for f in User._meta.concrete_fields if f.attname in values]
+    user = User.from_db(DEFAULT_DB_ALIAS, names, [values[name] for name in names])
+    return user if user.is_active else None
+
+
+def user_conversation_ids(user_id):
+    """Ids of every conversation the user takes part in (cached with the user)."""
+    entry = _load_socket_entry(int(user_id))
+    return set(entry["conversation_ids"]) if entry else set()
+
+
+def invalidate_user(user_id):
+    cache.delete(user_key(user_id))
+
+
+def invalidate_conversation(participant_ids):
+    cache.delete_many([user_key(user_id) for user_id in participant_ids])
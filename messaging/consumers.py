@@ -1,84 +1,234 @@
+import asyncio
 import json
-import base64
-import uuid
-import io
-import cloudinary.uploader
+from functools import lru_cache
+from urllib.parse import parse_qs
 
+import msgpack
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.base import File
 from django.utils import timezone
 
+from messaging.cache import user_conversation_ids
 from messaging.models import Conversation, Message
+from messaging.outbox import RESUME_CLOSE_CODE, SEND_ERROR_CLOSE_CODE, OutboundQueue
 from messaging.serializers import MessageSerializer
+from messaging.uploads import (
+    UPLOAD_EXECUTOR,
+    ChunkedUpload,
+    UploadError,
+    attachment_name,
+    decode_base64_attachment,
+    infer_file_type,
+    upload_attachment,
+)
+from users import presence
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
+# Strong references to in-flight upload tasks (asyncio only keeps weak ones)
+_background_uploads = set()
 
-class ChatConsumer(AsyncWebsocketConsumer):
-    async def connect(self):
-        self.conversation_id = self.scope["url_route"]["kwargs"]["conversation_id"]
-        self.room_group_name = f"chat_{self.conversation_id}"
-        self.user = self.scope.get("user")
 
-        # Must be logged in
-        if not self.user or not self.user.is_authenticated:
-            await self.close()
-            return
+def chat_group(conversation_id):
+    """Group of every socket watching one conversation."""
+    return f"chat_{conversation_id}"
 
-        # Must belong to conversation
-        is_member = await self.is_user_in_conversation()
-        if not is_member:
-            await self.close()
-            return
 
-        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
-        await self.accept()
+def user_group(user_id):
+    """Group of a user's inbox sockets (see InboxConsumer)."""
+    return f"user_{user_id}"
 
-        # Auto-mark messages as read when user opens chat
-        await self.mark_messages_as_read()
 
-    async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+# ============================================================
+# WIRE ENCODING
+# ============================================================
+# Group events carry one ready-made JSON frame ("frame") built by the sender,
+# so each receiving socket forwards it as-is instead of re-serializing a
+# nested message dict per recipient.
+
+def encode_frame(payload):
+    """Compact JSON text for one outgoing frame."""
+    return json.dumps(payload, separators=(",", ":"))
+
 
-    async def receive(self, text_data):
+def embed_frame(fields, key, encoded):
+    """JSON frame of `fields` plus `key` set to an already-encoded JSON value."""
+    head = encode_frame(fields)[:-1]
+    separator = "," if fields else ""
+    return f"{head}{separator}{json.dumps(key)}:{encoded}}}"
+
+
+@lru_cache(maxsize=256)
+def msgpack_frame(frame):
+    """
+    msgpack version of a JSON frame, for sockets that negotiated msgpack.
+    Cached so a broadcast is converted once per process, not once per socket.
+    """
+    return msgpack.packb(json.loads(frame))
+
+
+class BaseChatConsumer(AsyncWebsocketConsumer):
+    """
+    Frame handling shared by the per-conversation socket (ChatConsumer) and
+    the per-user multiplexed socket (InboxConsumer).
+
+    Ephemeral events (typing, read receipts, upload progress) go to the
+    conversation group only. Messages additionally go to each participant's
+    user group so inbox sockets receive them without joining every
+    conversation group.
+
+    Wire format: JSON text frames by default. Clients that offer the
+    "msgpack" subprotocol get binary msgpack frames instead and send
+    msgpack-encoded frames back; upload chunks then travel as
+    {"type": "upload_chunk", "data": <bytes>}.
+
+    Outgoing frames go through a bounded per-socket queue (OutboundQueue).
+    A client too slow to keep up is closed with code 4008 and should
+    reconnect with since_seq to resume.
+    """
+
+    wire_format = "json"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Coalescing state, keyed by conversation id (see start_typing)
+        self.typing = {}
+        self.pending_reads = {}
+        self.read_sent_at = {}
+        self.outbox = None
+        # Chunked attachment in flight (one per socket)
+        self.upload = None
+
+    async def accept_connection(self):
+        """Accept the socket, picking the wire format from the offered subprotocols."""
+        subprotocols = self.scope.get("subprotocols") or []
+        if "msgpack" in subprotocols:
+            self.wire_format = "msgpack"
+            await self.accept(subprotocol="msgpack")
+        elif "json" in subprotocols:
+            await self.accept(subprotocol="json")
+        else:
+            await self.accept()
+
+        self.outbox = OutboundQueue(self.send, self.close_for_resume, self.close_after_send_error)
+        self.outbox.start()
+
+    async def close_for_resume(self):
+        """The client fell too far behind: drop it; it resumes via since_seq."""
+        print(f"⚠️ Send queue full for user {self.user.id}, closing with {RESUME_CLOSE_CODE}")
+        await self.stop_outbox()
+        await self.close(code=RESUME_CLOSE_CODE)
+
+    async def close_after_send_error(self):
+        """A frame could not be written (see OutboundQueue): drop the socket."""
         try:
-            data = json.loads(text_data)
-        except json.JSONDecodeError:
-            await self.send(json.dumps({
-                "error": "Invalid JSON format"
-            }))
-            return
+            await self.close(code=SEND_ERROR_CLOSE_CODE)
+        except Exception as e:
+            print(f"❌ Could not close socket for user {self.user.id}: {e!r}")
 
+    async def stop_outbox(self):
+        if self.outbox is not None:
+            await self.outbox.stop()
+
+    async def queue_send(self, message, droppable=False):
+        if self.outbox is None:
+            # Not accepted yet: nothing is queued before the handshake
+            await self.send(**message)
+        else:
+            self.outbox.put(message, droppable=droppable)
+
+    async def send_frame(self, payload):
+        """Encode and send a frame addressed to this socket only."""
+        if self.wire_format == "msgpack":
+            await self.queue_send({"bytes_data": msgpack.packb(payload)})
+        else:
+            await self.queue_send({"text_data": encode_frame(payload)})
+
+    async def send_encoded(self, frame, droppable=False):
+        """Forward a pre-encoded JSON frame from a group event."""
+        if self.wire_format == "msgpack":
+            await self.queue_send({"bytes_data": msgpack_frame(frame)}, droppable)
+        else:
+            await self.queue_send({"text_data": frame}, droppable)
+
+    async def read_frame(self, text_data=None, bytes_data=None):
+        """
+        Decode one client frame. Upload chunks are consumed here; returns the
+        frame dict, or None if there is nothing more to handle (errors are
+        reported to the client).
+        """
+        if bytes_data is not None and self.wire_format == "json":
+            # Binary frames on a JSON socket are always chunks of the current upload
+            await self.receive_upload_chunk(bytes_data)
+            return None
+
+        try:
+            if bytes_data is not None:
+                data = msgpack.unpackb(bytes_data)
+            else:
+                data = json.loads(text_data)
+        except (TypeError, ValueError, msgpack.UnpackException):
+            data = None
+
+        if not isinstance(data, dict):
+            await self.send_frame({
+                "error": "Invalid msgpack format" if bytes_data is not None else "Invalid JSON format"
+            })
+            return None
+
+        if data.get("type") == "upload_chunk" and self.wire_format == "msgpack":
+            chunk = data.get("data")
+            if not isinstance(chunk, bytes):
+                await self.send_frame({"type": "upload_error", "error": "upload_chunk data must be binary"})
+                return None
+            await self.receive_upload_chunk(chunk)
+            return None
+
+        return data
+
+    async def handle_frame(self, conversation_id, data):
+        """Handle one client frame addressed to `conversation_id`."""
         event_type = data.get("type", "message")
 
         # ==========================
         # READ RECEIPTS
         # ==========================
         if event_type == "mark_read":
-            await self.mark_messages_as_read()
-            # Broadcast read receipt to other user
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    "type": "read_receipt",
-                    "user_id": self.user.id,
-                },
-            )
+            await self.request_read_receipt(conversation_id)
             return
 
         # ==========================
         # TYPING INDICATOR
         # ==========================
         if event_type == "typing":
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    "type": "typing_indicator",
-                    "user_id": self.user.id,
-                },
-            )
+            if data.get("is_typing", True) is False:
+                await self.stop_typing(conversation_id)
+            else:
+                await self.start_typing(conversation_id)
+            return
+
+        if event_type == "typing_stopped":
+            await self.stop_typing(conversation_id)
+            return
+
+        # ==========================
+        # CHUNKED ATTACHMENT UPLOAD
+        # ==========================
+        if event_type == "upload_init":
+            await self.start_upload(conversation_id, data)
+            return
+
+        if event_type == "upload_finalize":
+            await self.finish_upload(data)
+            return
+
+        if event_type == "upload_abort":
+            if self.upload and self.upload.upload_id == data.get("upload_id"):
+                self.discard_upload()
             return
 
         # ==========================
@@ -91,208 +241,477 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
         # Validate message
         if not text and not file_base64:
-            await self.send(json.dumps({
+            await self.send_frame({
                 "error": "Message must contain text or file"
-            }))
+            })
             return
 
+        file_obj = None
+        if file_base64 and file_name:
+            try:
+                # Decode off the event loop; the pool keeps the DB thread free
+                file_obj = await sync_to_async(
+                    decode_base64_attachment, thread_sensitive=False
+                )(file_base64, file_name)
+            except UploadError as e:
+                await self.send_frame({"error": str(e)})
+                return
+
+        await self.create_and_broadcast(
+            conversation_id,
+            text=text,
+            file_obj=file_obj,
+            file_name=file_name,
+            file_type=file_type,
+        )
+
+    async def create_and_broadcast(self, conversation_id, text="", file_obj=None, file_name=None, file_type=None):
+        """
+        Save a message and broadcast it to the conversation and its participants.
+
+        Attachments are saved as `pending` and broadcast right away; the actual
+        upload is handed to the upload pool (see start_background_upload).
+        """
+        if file_obj is not None and not file_type:
+            file_type = infer_file_type(file_name)
+
+        # Sending ends the typing session
+        await self.stop_typing(conversation_id)
+
         try:
             # Save message to DB
             message = await self.save_message(
+                conversation_id,
                 text=text,
-                file_base64=file_base64,
-                file_name=file_name,
                 file_type=file_type,
+                has_attachment=file_obj is not None,
             )
-
-            # Debug logging
-            print(f"✅ Message saved: ID={message.id}, has_file={bool(message.file) or bool(message.cloudinary_url)}")
-            if getattr(message, "file", None):
-                try:
-                    print(f"✅ File URL: {message.file.url}")
-                except Exception:
-                    pass
-            if getattr(message, "cloudinary_url", None):
-                print(f"✅ Cloudinary URL: {message.cloudinary_url}")
-            print(f"✅ File type: {message.file_type}")
+            print(f"✅ Message saved: ID={message.id}, file_type={message.file_type}, upload_status={message.upload_status}")
 
             # Serialize full REST-style response
             serialized = await self.serialize_message(message)
-            print(f"✅ Serialized data: {serialized}")
 
             # Broadcast to all users in the conversation
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    "type": "chat_message",
-                    "message": serialized,
-                },
+            participant_ids = (message.conversation.user1_id, message.conversation.user2_id)
+            await self.broadcast_message(
+                self.channel_layer, conversation_id, participant_ids, "chat_message", serialized
             )
         except Exception as e:
             print(f"❌ Error saving message: {e}")
             import traceback
             traceback.print_exc()
-            await self.send(json.dumps({
+            if file_obj is not None:
+                file_obj.close()
+            await self.send_frame({
                 "error": f"Failed to save message: {str(e)}"
-            }))
+            })
+            return
+
+        if file_obj is not None:
+            self.start_background_upload(
+                conversation_id, participant_ids, message.id, file_obj, file_name, file_type
+            )
+
+    @staticmethod
+    async def broadcast_message(channel_layer, conversation_id, participant_ids, event_type, message):
+        """
+        Send a message event to the conversation group and to each participant's inbox.
+
+        The message is encoded exactly once; both frames embed that same text.
+        """
+        message_json = encode_frame(message)
+
+        if event_type == "chat_message":
+            # Conversation sockets get the bare message object
+            chat_frame = message_json
+        else:
+            chat_frame = embed_frame({"type": event_type}, "message", message_json)
+        await channel_layer.group_send(
+            chat_group(conversation_id),
+            {
+                "type": event_type,
+                "frame": chat_frame,
+            },
+        )
+
+        inbox_frame = embed_frame(
+            {
+                "type": "message" if event_type == "chat_message" else event_type,
+                "conversation_id": conversation_id,
+            },
+            "message",
+            message_json,
+        )
+        for user_id in participant_ids:
+            await channel_layer.group_send(
+                user_group(user_id),
+                {
+                    "type": "inbox_event",
+                    "frame": inbox_frame,
+                },
+            )
+
+    # ============================================================
+    # COALESCED TYPING INDICATORS / READ RECEIPTS
+    # ============================================================
+    # Clients send `typing` on every keystroke and `mark_read` whenever the
+    # chat is in view. Both are coalesced per socket and conversation, so
+    # channel-layer traffic scales with conversations, not keystrokes:
+    #   - typing: at most one broadcast per CHAT_TYPING_WINDOW; keystrokes in
+    #     between only push back the expiry. After CHAT_TYPING_TIMEOUT without
+    #     a keystroke (or on send / disconnect) a `typing_stopped` goes out.
+    #   - mark_read: at most one DB write + receipt per
+    #     CHAT_READ_RECEIPT_WINDOW; requests inside the window collapse into
+    #     one trailing write, and nothing is sent if nothing new was read.
+
+    async def start_typing(self, conversation_id):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        expires_at = now + getattr(settings, "CHAT_TYPING_TIMEOUT", 5)
+
+        state = self.typing.get(conversation_id)
+        if state is None:
+            state = self.typing[conversation_id] = {"sent_at": None, "expires_at": expires_at}
+            state["watchdog"] = asyncio.ensure_future(self.typing_watchdog(conversation_id))
+        state["expires_at"] = expires_at
+
+        window = getattr(settings, "CHAT_TYPING_WINDOW", 3)
+        if state["sent_at"] is None or now - state["sent_at"] >= window:
+            state["sent_at"] = now
+            await self.broadcast_typing(conversation_id, True)
+
+    async def stop_typing(self, conversation_id):
+        state = self.typing.pop(conversation_id, None)
+        if state is None:
+            return
+        state["watchdog"].cancel()
+        await self.broadcast_typing(conversation_id, False)
+
+    async def typing_watchdog(self, conversation_id):
+        """Send `typing_stopped` once the user's keystrokes stop for the timeout."""
+        loop = asyncio.get_running_loop()
+        while True:
+            state = self.typing.get(conversation_id)
+            if state is None:
+                return
+            remaining = state["expires_at"] - loop.time()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(remaining)
+
+        self.typing.pop(conversation_id, None)
+        await self.broadcast_typing(conversation_id, False)
+
+    async def broadcast_typing(self, conversation_id, is_typing):
+        await self.channel_layer.group_send(
+            chat_group(conversation_id),
+            {
+                "type": "typing_indicator",
+                "user_id": self.user.id,
+                "frame": encode_frame({
+                    "type": "typing" if is_typing else "typing_stopped",
+                    "conversation_id": conversation_id,
+                    "user_id": self.user.id,
+                    "is_typing": is_typing,
+                }),
+            },
+        )
+
+    async def request_read_receipt(self, conversation_id):
+        if conversation_id in self.pending_reads:
+            # Already scheduled; this request rides along
+            return
+
+        loop = asyncio.get_running_loop()
+        window = getattr(settings, "CHAT_READ_RECEIPT_WINDOW", 2)
+        last_sent = self.read_sent_at.get(conversation_id)
+        wait = 0 if last_sent is None else last_sent + window - loop.time()
+        if wait <= 0:
+            await self.send_read_receipt(conversation_id)
+            return
+
+        self.pending_reads[conversation_id] = asyncio.ensure_future(
+            self.delayed_read_receipt(conversation_id, wait)
+        )
+
+    async def delayed_read_receipt(self, conversation_id, wait):
+        await asyncio.sleep(wait)
+        self.pending_reads.pop(conversation_id, None)
+        await self.send_read_receipt(conversation_id)
+
+    async def send_read_receipt(self, conversation_id):
+        """Advance the watermark and, if it moved, tell the other participant."""
+        self.read_sent_at[conversation_id] = asyncio.get_running_loop().time()
+        if not await self.mark_messages_as_read(conversation_id):
+            return
+
+        await self.channel_layer.group_send(
+            chat_group(conversation_id),
+            {
+                "type": "read_receipt",
+                "user_id": self.user.id,
+                "frame": encode_frame({
+                    "type": "read_receipt",
+                    "conversation_id": conversation_id,
+                    "user_id": self.user.id,
+                }),
+            },
+        )
+
+    async def settle_coalesced_events(self):
+        """On disconnect: end typing sessions and write pending read receipts now."""
+        for conversation_id in list(self.typing):
+            await self.stop_typing(conversation_id)
+        for conversation_id, task in list(self.pending_reads.items()):
+            task.cancel()
+            self.pending_reads.pop(conversation_id, None)
+            await self.send_read_receipt(conversation_id)
+
+    # ============================================================
+    # RECONNECT CATCH-UP
+    # ============================================================
+
+    @staticmethod
+    def parse_seq(value):
+        try:
+            seq = int(value)
+        except (TypeError, ValueError):
+            return None
+        return seq if seq >= 0 else None
+
+    async def send_catch_up(self, conversation_id, since_seq):
+        """
+        Replay messages with seq > since_seq in one indexed range read.
+
+        Called after joining the conversation group but before any live
+        event is dispatched to this socket, so nothing is missed; a message
+        committed in between may arrive twice and clients dedupe on seq.
+        """
+        messages, has_more = await self.get_messages_since(conversation_id, since_seq)
+        await self.send_frame({
+            "type": "catch_up",
+            "conversation_id": conversation_id,
+            "since_seq": since_seq,
+            "messages": messages,
+            "has_more": has_more,
+        })
+
+    # ============================================================
+    # BACKGROUND ATTACHMENT UPLOADS
+    # ============================================================
+
+    def start_background_upload(self, conversation_id, participant_ids, message_id, file_obj, file_name, file_type):
+        """Schedule the upload; it keeps running even if this socket closes."""
+        task = asyncio.ensure_future(
+            self.run_background_upload(
+                conversation_id, participant_ids, message_id, file_obj, file_name, file_type
+            )
+        )
+        _background_uploads.add(task)
+        task.add_done_callback(_background_uploads.discard)
+
+    async def run_background_upload(self, conversation_id, participant_ids, message_id, file_obj, file_name, file_type):
+        loop = asyncio.get_running_loop()
+        channel_layer = self.channel_layer
+
+        async def progress(status):
+            await channel_layer.group_send(
+                chat_group(conversation_id),
+                {
+                    "type": "upload_progress",
+                    # attachment_ready follows unless the upload failed
+                    "droppable": status != Message.UploadStatus.FAILED,
+                    "frame": encode_frame({
+                        "type": "upload_progress",
+                        "conversation_id": conversation_id,
+                        "message_id": message_id,
+                        "status": status,
+                    }),
+                },
+            )
+
+        def on_progress(status):
+            # Called from the upload thread
+            asyncio.run_coroutine_threadsafe(progress(status), loop)
+
+        await progress("queued")
+        try:
+            fields = await loop.run_in_executor(
+                UPLOAD_EXECUTOR, upload_attachment, file_obj, file_name, file_type, on_progress
+            )
+        except Exception as e:
+            print(f"❌ Attachment upload failed for message {message_id}: {e}")
+            await self.finish_message_upload(message_id, {}, Message.UploadStatus.FAILED)
+            await progress(Message.UploadStatus.FAILED)
+            return
+        finally:
+            file_obj.close()
+
+        message = await self.finish_message_upload(message_id, fields, Message.UploadStatus.READY)
+        serialized = await self.serialize_message(message)
+        print(f"☁️ Attachment ready for message {message_id}: {serialized.get('file_url')}")
+
+        await self.broadcast_message(
+            channel_layer, conversation_id, participant_ids, "attachment_ready", serialized
+        )
+
+    # ============================================================
+    # CHUNKED UPLOAD HELPERS
+    # ============================================================
+
+    async def start_upload(self, conversation_id, data):
+        """Open a spool file for a new upload (replaces any unfinished one)."""
+        self.discard_upload()
+        try:
+            self.upload = ChunkedUpload(
+                conversation_id=conversation_id,
+                file_name=data.get("file_name"),
+                file_size=data.get("file_size"),
+                file_type=data.get("file_type"),
+                text=data.get("text", ""),
+            )
+        except UploadError as e:
+            await self.send_frame({"type": "upload_error", "error": str(e)})
+            return
+
+        await self.send_frame({
+            "type": "upload_ready",
+            "upload_id": self.upload.upload_id,
+            "chunk_size": self.upload.chunk_size,
+        })
+
+    async def receive_upload_chunk(self, chunk):
+        if not self.upload:
+            await self.send_frame({
+                "type": "upload_error",
+                "error": "No upload in progress (send upload_init first)",
+            })
+            return
+
+        try:
+            self.upload.write(chunk)
+        except UploadError as e:
+            upload_id = self.upload.upload_id
+            self.discard_upload()
+            await self.send_frame({
+                "type": "upload_error",
+                "upload_id": upload_id,
+                "error": str(e),
+            })
+
+    async def finish_upload(self, data):
+        upload = self.upload
+        if not upload or upload.upload_id != data.get("upload_id"):
+            await self.send_frame({
+                "type": "upload_error",
+                "upload_id": data.get("upload_id"),
+                "error": "Unknown upload_id",
+            })
+            return
+
+        self.upload = None
+        try:
+            spool = upload.finalize(data.get("sha256"))
+        except UploadError as e:
+            upload.discard()
+            await self.send_frame({
+                "type": "upload_error",
+                "upload_id": upload.upload_id,
+                "error": str(e),
+            })
+            return
+
+        # The upload pool now owns the spool file and closes it when done
+        await self.create_and_broadcast(
+            upload.conversation_id,
+            text=upload.text,
+            file_obj=File(spool, name=attachment_name(upload.file_name)),
+            file_name=upload.file_name,
+            file_type=upload.file_type,
+        )
+
+    def discard_upload(self):
+        if getattr(self, "upload", None):
+            self.upload.discard()
+            self.upload = None
+
+    # ============================================================
+    # PRESENCE
+    # ============================================================
+    # Every open chat / inbox socket keeps its user online in the presence
+    # store (users.presence); the count drops again on disconnect.
+
+    async def presence_connected(self):
+        await sync_to_async(presence.socket_connected, thread_sensitive=False)(self.user.id)
+        self.presence_tracked = True
+
+    async def presence_disconnected(self):
+        if getattr(self, "presence_tracked", False):
+            self.presence_tracked = False
+            await sync_to_async(presence.socket_disconnected, thread_sensitive=False)(self.user.id)
 
     async def chat_message(self, event):
         """Send full message object to WebSocket."""
-        await self.send(json.dumps(event["message"]))
+        await self.send_encoded(event["frame"])
+
+    async def upload_progress(self, event):
+        """Send attachment upload status (queued / uploading / failed)."""
+        await self.send_encoded(event["frame"], droppable=event.get("droppable", False))
+
+    async def attachment_ready(self, event):
+        """Send the message again once its attachment URL is available."""
+        await self.send_encoded(event["frame"])
 
     async def typing_indicator(self, event):
         """Send typing event to UI (only to other users)."""
         # Don't send typing indicator back to the sender
         if event["user_id"] != self.user.id:
-            await self.send(json.dumps({
-                "type": "typing",
-                "user_id": event["user_id"]
-            }))
+            await self.send_encoded(event["frame"], droppable=True)
 
     async def read_receipt(self, event):
         """Send read receipt to UI."""
         # Only send to the message sender
         if event["user_id"] != self.user.id:
-            await self.send(json.dumps({
-                "type": "read_receipt",
-                "user_id": event["user_id"]
-            }))
+            await self.send_encoded(event["frame"])
 
     # ============================================================
     # DATABASE HELPERS
     # ============================================================
 
     @database_sync_to_async
-    def is_user_in_conversation(self):
-        try:
-            c = Conversation.objects.get(id=self.conversation_id)
-            return self.user == c.user1 or self.user == c.user2
-        except Conversation.DoesNotExist:
-            return False
+    def is_user_in_conversation(self, conversation_id):
+        # Cached with the socket's user, so a cold connect costs one query
+        return conversation_id in user_conversation_ids(self.user.id)
 
     @database_sync_to_async
-    def save_message(self, text=None, file_base64=None, file_name=None, file_type=None):
+    def save_message(self, conversation_id, text=None, file_type=None, has_attachment=False):
         """
         Save message to database.
-        - Fixes base64 decoding bug.
-        - Infers file_type from extension if not provided.
-        - Uploads audio/video with resource_type='video' and documents with resource_type='raw'.
-        - Keeps image uploads via Django FileField (cloudinary_storage handles them as images).
+        Messages with an attachment start as `pending`; the upload pool fills in
+        file / cloudinary_url later (see finish_message_upload).
         """
-        conversation = Conversation.objects.get(id=self.conversation_id)
-
-        # Decode file if provided
-        decoded_file = None
-        file_obj = None
-        if file_base64 and file_name:
-            try:
-                # Handle data URI format: "data:<mime>;base64,<data>"
-                if file_base64.startswith("data:"):
-                    header, encoded = file_base64.split(",", 1)
-                    decoded_file = base64.b64decode(encoded)
-                else:
-                    # Plain base64 string
-                    decoded_file = base64.b64decode(file_base64)
-
-                # Generate unique filename for storage if needed
-                unique_name = f"{uuid.uuid4().hex}_{file_name}"
-                file_obj = ContentFile(decoded_file, name=unique_name)
-
-                print(f"📎 File decoded: {unique_name}, size: {len(decoded_file)} bytes")
-            except Exception as e:
-                print(f"❌ Error decoding base64 file: {e}")
-                raise ValueError(f"Invalid file data: {str(e)}")
-
-        # Create message without file first
-        msg = Message.objects.create(
-            conversation=conversation,
+        msg = Message.objects.create_message(
+            conversation_id,
             sender=self.user,
             text=text or "",
-            file_type=file_type,  # may be updated below
+            file_type=file_type,
+            upload_status=(
+                Message.UploadStatus.PENDING if has_attachment else Message.UploadStatus.READY
+            ),
         )
-
         print(f"💾 Message created with ID: {msg.id}")
-
-        # If there's a decoded file, handle upload according to type
-        if decoded_file:
-            # Infer file_type from extension when not provided
-            inferred_type = file_type
-            if not inferred_type and file_name:
-                lower = file_name.lower()
-                if any(lower.endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.svg']):
-                    inferred_type = "image"
-                elif any(lower.endswith(ext) for ext in ['.mp3', '.m4a', '.wav', '.ogg', '.aac', '.flac']):
-                    inferred_type = "audio"
-                elif any(lower.endswith(ext) for ext in ['.mp4', '.mov', '.avi', '.mkv', '.webm']):
-                    inferred_type = "video"
-                elif any(lower.endswith(ext) for ext in ['.pdf', '.doc', '.docx', '.txt', '.xls', '.xlsx', '.ppt', '.pptx']):
-                    inferred_type = "document"
-                else:
-                    inferred_type = "file"
-
-            msg.file_type = inferred_type
-
-            try:
-                # AUDIO/VIDEO: upload with resource_type='video' (Cloudinary treats audio under video)
-                if inferred_type in ("audio", "video"):
-                    # Upload bytes directly to Cloudinary as video resource
-                    upload_bytes = io.BytesIO(decoded_file)
-                    result = cloudinary.uploader.upload(
-                        upload_bytes,
-                        resource_type="video",
-                        public_id=f"attachments/{uuid.uuid4().hex}_{file_name}",
-                        overwrite=True,
-                    )
-                    msg.cloudinary_url = result.get("secure_url") or result.get("url")
-                    # We intentionally do NOT set msg.file (avoid default image upload path)
-                    msg.save(update_fields=["file_type", "cloudinary_url"])
-                    print(f"☁️ Uploaded audio/video to Cloudinary: {msg.cloudinary_url}")
-
-                # IMAGE: use Django FileField so existing storage (cloudinary_storage) handles it as image
-                elif inferred_type == "image":
-                    msg.file = file_obj
-                    # msg.save() will trigger storage to upload via cloudinary_storage as image
-                    msg.save()
-                    print(f"☁️ Image saved via FileField storage, URL (may be available after refresh): {getattr(msg.file, 'url', None)}")
-
-                # DOCUMENTS / OTHER: upload as raw so Cloudinary won't try to validate as image
-                else:
-                    upload_bytes = io.BytesIO(decoded_file)
-                    result = cloudinary.uploader.upload(
-                        upload_bytes,
-                        resource_type="raw",
-                        public_id=f"attachments/{uuid.uuid4().hex}_{file_name}",
-                        overwrite=True,
-                    )
-                    msg.cloudinary_url = result.get("secure_url") or result.get("url")
-                    msg.save(update_fields=["file_type", "cloudinary_url"])
-                    print(f"☁️ Uploaded raw file to Cloudinary: {msg.cloudinary_url}")
-
-            except cloudinary.exceptions.Error as e:
-                # Log and raise a clear error so the caller can handle it
-                print(f"❌ Cloudinary upload error: {e}")
-                raise ValueError(f"Cloudinary upload failed: {str(e)}")
-
-        else:
-            # No file to attach — ensure file_type is saved if provided earlier
-            if file_type:
-                msg.file_type = file_type
-                msg.save(update_fields=["file_type"])
-
-        # Refresh from DB to get any fields filled by storage signals
-        msg.refresh_from_db()
-
-        # Try to print final URL(s) if available
-        if getattr(msg, "cloudinary_url", None):
-            print(f"🔗 Final cloudinary_url: {msg.cloudinary_url}")
-        if getattr(msg, "file", None):
-            try:
-                print(f"🔗 Final file URL: {msg.file.url}")
-            except Exception:
-                pass
-
         return msg
 
+    @database_sync_to_async
+    def finish_message_upload(self, message_id, fields, upload_status):
+        """Store the upload result and return the refreshed message."""
+        Message.objects.filter(pk=message_id).update(
+            upload_status=upload_status,
+            updated_at=timezone.now(),
+            **fields,
+        )
+        return Message.objects.select_related("sender", "conversation").get(pk=message_id)
+
     @database_sync_to_async
     def serialize_message(self, message):
         """
@@ -305,15 +724,182 @@ class ChatConsumer(AsyncWebsocketConsumer):
         return data
 
     @database_sync_to_async
-    def mark_messages_as_read(self):
-        """Mark unread messages (from the other user) as read."""
-        conversation = Conversation.objects.get(id=self.conversation_id)
-        qs = Message.objects.filter(
-            conversation=conversation,
-            is_read=False
-        ).exclude(sender=self.user)
-
-        now = timezone.now()
-        count = qs.update(is_read=True, read_at=now)
-
-        return count
\ No newline at end of file
+    def get_messages_since(self, conversation_id, since_seq):
+        """Serialized messages after `since_seq` (oldest first) and whether more remain."""
+        limit = getattr(settings, "CHAT_CATCHUP_LIMIT", 200)
+        conversation = Conversation.objects.get(id=conversation_id)
+        rows = list(
+            Message.objects.filter(conversation_id=conversation_id, seq__gt=since_seq)
+            .select_related("sender")
+            .order_by("seq")[: limit + 1]
+        )
+        serialized = MessageSerializer(
+            rows[:limit], many=True, context={"conversation": conversation}
+        ).data
+        return serialized, len(rows) > limit
+
+    @database_sync_to_async
+    def mark_messages_as_read(self, conversation_id):
+        """Advance this user's read watermark; the number of messages marked read (0 if none)."""
+        return Conversation.objects.mark_read(conversation_id, self.user)
+
+
+class ChatConsumer(BaseChatConsumer):
+    """
+    One socket per open conversation: ws/conversations/<id>/.
+
+    Reconnecting clients pass ?since_seq=<last seq seen> to get the messages
+    they missed as a single `catch_up` frame before live events resume.
+    """
+
+    async def connect(self):
+        self.conversation_id = int(self.scope["url_route"]["kwargs"]["conversation_id"])
+        self.room_group_name = chat_group(self.conversation_id)
+        self.user = self.scope.get("user")
+
+        # Must be logged in
+        if not self.user or not self.user.is_authenticated:
+            await self.close()
+            return
+
+        # Must belong to conversation
+        is_member = await self.is_user_in_conversation(self.conversation_id)
+        if not is_member:
+            await self.close()
+            return
+
+        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        await self.accept_connection()
+        await self.presence_connected()
+
+        query_params = parse_qs(self.scope.get("query_string", b"").decode())
+        since_seq = self.parse_seq(query_params.get("since_seq", [None])[0])
+        if since_seq is not None:
+            await self.send_catch_up(self.conversation_id, since_seq)
+
+        # Auto-mark messages as read when user opens chat
+        await self.mark_messages_as_read(self.conversation_id)
+
+    async def disconnect(self, close_code):
+        self.discard_upload()
+        await self.settle_coalesced_events()
+        await self.stop_outbox()
+        await self.presence_disconnected()
+        await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        data = await self.read_frame(text_data, bytes_data)
+        if data is None:
+            return
+
+        await self.handle_frame(self.conversation_id, data)
+
+
+class InboxConsumer(BaseChatConsumer):
+    """
+    One multiplexed socket per user for all of their conversations: ws/inbox/.
+
+    - New messages and attachment_ready events for every conversation arrive
+      through the user's own group, as {"type": ..., "conversation_id", "message"}.
+    - {"type": "subscribe", "conversation_id": X} joins conversation X's group
+      for live typing / read receipt / upload progress events, and
+      {"type": "unsubscribe", "conversation_id": X} leaves it. Adding
+      "since_seq" to subscribe replays missed messages as a `catch_up` frame.
+    - Every other frame is the same as on ws/conversations/<id>/ plus a
+      `conversation_id` field.
+
+    So a client joins one group per connection plus one per chat it currently
+    has open, instead of opening one socket per conversation.
+    """
+
+    async def connect(self):
+        self.user = self.scope.get("user")
+        self.subscriptions = set()
+
+        # Must be logged in
+        if not self.user or not self.user.is_authenticated:
+            await self.close()
+            return
+
+        self.conversation_ids = await self.get_conversation_ids()
+
+        await self.channel_layer.group_add(user_group(self.user.id), self.channel_name)
+        await self.accept_connection()
+        await self.presence_connected()
+
+    async def disconnect(self, close_code):
+        if not self.user or not self.user.is_authenticated:
+            return
+
+        self.discard_upload()
+        await self.settle_coalesced_events()
+        await self.stop_outbox()
+        await self.presence_disconnected()
+        await self.channel_layer.group_discard(user_group(self.user.id), self.channel_name)
+        for conversation_id in self.subscriptions:
+            await self.channel_layer.group_discard(chat_group(conversation_id), self.channel_name)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        data = await self.read_frame(text_data, bytes_data)
+        if data is None:
+            return
+
+        conversation_id = await self.resolve_conversation(data.get("conversation_id"))
+        if conversation_id is None:
+            await self.send_frame({
+                "error": "Unknown conversation_id",
+                "conversation_id": data.get("conversation_id"),
+            })
+            return
+
+        event_type = data.get("type", "message")
+
+        if event_type == "subscribe":
+            if conversation_id not in self.subscriptions:
+                self.subscriptions.add(conversation_id)
+                await self.channel_layer.group_add(chat_group(conversation_id), self.channel_name)
+            await self.send_frame({"type": "subscribed", "conversation_id": conversation_id})
+
+            since_seq = self.parse_seq(data.get("since_seq"))
+            if since_seq is not None:
+                await self.send_catch_up(conversation_id, since_seq)
+            return
+
+        if event_type == "unsubscribe":
+            if conversation_id in self.subscriptions:
+                self.subscriptions.discard(conversation_id)
+                await self.channel_layer.group_discard(chat_group(conversation_id), self.channel_name)
+            await self.send_frame({"type": "unsubscribed", "conversation_id": conversation_id})
+            return
+
+        await self.handle_frame(conversation_id, data)
+
+    async def resolve_conversation(self, conversation_id):
+        """Return the conversation id as int if the user belongs to it, else None."""
+        try:
+            conversation_id = int(conversation_id)
+        except (TypeError, ValueError):
+            return None
+
+        if conversation_id not in self.conversation_ids:
+            # Conversation may have been started after this socket connected
+            if not await self.is_user_in_conversation(conversation_id):
+                return None
+            self.conversation_ids.add(conversation_id)
+        return conversation_id
+
+    # Messages reach inbox sockets through the user group (inbox_event), so
+    # the copies arriving via subscribed conversation groups are dropped.
+    async def chat_message(self, event):
+        pass
+
+    async def attachment_ready(self, event):
+        pass
+
+    async def inbox_event(self, event):
+        """Forward a message event from any of the user's conversations."""
+        await self.send_encoded(event["frame"])
+
+    @database_sync_to_async
+    def get_conversation_ids(self):
+        return user_conversation_ids(self.user.id)
@@ -0,0 +1,260 @@
+"""
+In-process load harness for the chat sockets.
+
+Drives backend.asgi.application with one WebsocketCommunicator per
+participant per conversation and reports connect latency, fan-out latency
+(sender's frame in -> the other participant's frame out), DB queries per
+message and traced memory per socket. Used by `manage.py chat_loadtest`
+and by the regression test in messaging/tests.py.
+
+The caller is responsible for the environment: a throwaway database and an
+in-process (or local Redis) channel layer — see the management command.
+"""
+import asyncio
+import contextlib
+import gc
+import io
+import itertools
+import json
+import threading
+import time
+import tracemalloc
+
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
+from django.db import connection
+from django.db.backends.signals import connection_created
+from rest_framework_simplejwt.tokens import AccessToken
+
+from messaging.models import Conversation
+from users.models import CustomUser
+
+
+class QueryCounter:
+    """execute_wrapper counting every statement on every DB connection."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def attach(self, sender=None, connection=None, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def __enter__(self):
+        self.attach(connection=connection)
+        connection_created.connect(self.attach, weak=False)
+        return self
+
+    def __exit__(self, *exc):
+        connection_created.disconnect(self.attach)
+        if self in connection.execute_wrappers:
+            connection.execute_wrappers.remove(self)
+
+
+def percentiles(samples):
+    """p50 / p95 / p99 / max of a list of seconds, in milliseconds."""
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(samples)
+
+    def pick(p):
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 2)
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": pick(1.0)}
+
+
+def create_fixtures(users, conversations, prefix="loadtest"):
+    """Create `users` users and `conversations` distinct 1-on-1 conversations."""
+    max_conversations = users * (users - 1) // 2
+    if conversations > max_conversations:
+        raise ValueError(
+            f"{users} users can have at most {max_conversations} distinct conversations"
+        )
+
+    created = CustomUser.objects.bulk_create([
+        CustomUser(username=f"{prefix}{i}", email=f"{prefix}{i}@example.com")
+        for i in range(users)
+    ])
+    if created[0].pk is None:
+        # Backends without RETURNING on bulk insert
+        created = list(CustomUser.objects.filter(username__startswith=prefix).order_by("pk"))
+
+    pairs = itertools.islice(itertools.combinations(created, 2), conversations)
+    return [Conversation.objects.get_or_create_1on1(a, b)[0] for a, b in pairs]
+
+
+class ChatLoadTest:
+    """
+    One run of the harness. `rate` is the total number of messages sent per
+    second across all conversations; each conversation gets
+    `messages_per_conversation`, with its two participants taking turns.
+    """
+
+    def __init__(self, application, conversations, messages_per_conversation=10,
+                 rate=50, connect_concurrency=20, drain_timeout=10):
+        self.application = application
+        self.conversations = conversations
+        self.messages_per_conversation = messages_per_conversation
+        self.rate = rate
+        self.connect_concurrency = connect_concurrency
+        self.drain_timeout = drain_timeout
+
+        self.sockets = {}         # (conversation_id, user_id) -> communicator
+        self.sent_at = {}         # message index -> monotonic send time
+        self.expected = {}        # message index -> recipient user id
+        self.fanout = []          # seconds
+        self.connect_times = []   # seconds
+        self.delivered = asyncio.Event()
+
+    def run(self, quiet=True):
+        """Run the whole scenario; returns the report dict."""
+        counter = QueryCounter()
+        output = io.StringIO() if quiet else None
+        with counter, (contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext()):
+            # DB work runs back on this thread (database_sync_to_async)
+            report = async_to_sync(self._run)(counter)
+        return report
+
+    async def _run(self, counter):
+        # ---- connect phase ----
+        queries_before_connect = counter.count
+        semaphore = asyncio.Semaphore(self.connect_concurrency)
+        await asyncio.gather(*[
+            self._connect(semaphore, conversation, user)
+            for conversation in self.conversations
+            for user in (conversation.user1, conversation.user2)
+        ])
+        await self._settle(counter)
+        connect_queries = counter.count - queries_before_connect
+
+        readers = [
+            asyncio.ensure_future(self._read(conversation_id, user_id, communicator))
+            for (conversation_id, user_id), communicator in self.sockets.items()
+        ]
+
+        # ---- message phase ----
+        queries_before_send = counter.count
+        started = time.monotonic()
+        total = len(self.conversations) * self.messages_per_conversation
+        for index in range(total):
+            delay = started + index / self.rate - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self._send(index)
+
+        try:
+            await asyncio.wait_for(self.delivered.wait(), self.drain_timeout)
+        except asyncio.TimeoutError:
+            pass
+        duration = time.monotonic() - started
+        send_queries = counter.count - queries_before_send
+
+        for reader in readers:
+            reader.cancel()
+
+        memory_per_socket = await self._measure_memory()
+
+        for communicator in self.sockets.values():
+            await communicator.disconnect()
+
+        sockets = len(self.sockets)
+        return {
+            "conversations": len(self.conversations),
+            "sockets": sockets,
+            "messages_sent": total,
+            "messages_delivered": len(self.fanout),
+            "lost": total - len(self.fanout),
+            "duration_s": round(duration, 3),
+            "throughput_msgs_per_s": round(len(self.fanout) / duration, 1) if duration else None,
+            "connect_ms": percentiles(self.connect_times),
+            "fanout_ms": percentiles(self.fanout),
+            "queries_per_connect": round(connect_queries / sockets, 2) if sockets else None,
+            "queries_per_message": round(send_queries / total, 2) if total else None,
+            "memory_per_socket_kb": (
+                round(memory_per_socket / 1024, 1) if memory_per_socket is not None else None
+            ),
+        }
+
+    async def _settle(self, counter, interval=0.05, limit=2.0):
+        """Wait for post-accept work (read watermark, catch-up) to finish."""
+        deadline = time.monotonic() + limit
+        last = None
+        while counter.count != last and time.monotonic() < deadline:
+            last = counter.count
+            await asyncio.sleep(interval)
+
+    async def _measure_memory(self, sample=20):
+        """
+        Traced memory per socket, from a separate batch of extra sockets so
+        tracemalloc's overhead doesn't skew the latency figures.
+        """
+        conversations = self.conversations[:sample]
+        if not conversations:
+            return None
+
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        extra = []
+        for conversation in conversations:
+            token = AccessToken.for_user(conversation.user1)
+            communicator = WebsocketCommunicator(
+                self.application, f"/ws/conversations/{conversation.pk}/?token={token}"
+            )
+            await communicator.connect(timeout=10)
+            extra.append(communicator)
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        for communicator in extra:
+            await communicator.disconnect()
+        return (after - before) / len(extra)
+
+    async def _connect(self, semaphore, conversation, user):
+        token = AccessToken.for_user(user)
+        communicator = WebsocketCommunicator(
+            self.application, f"/ws/conversations/{conversation.pk}/?token={token}"
+        )
+        async with semaphore:
+            started = time.monotonic()
+            connected, _ = await communicator.connect(timeout=10)
+            self.connect_times.append(time.monotonic() - started)
+        if not connected:
+            raise RuntimeError(f"Socket for user {user.pk} in conversation {conversation.pk} was rejected")
+        self.sockets[(conversation.pk, user.pk)] = communicator
+
+    async def _send(self, index):
+        conversation = self.conversations[index % len(self.conversations)]
+        turn = (index // len(self.conversations)) % 2
+        sender, recipient = (
+            (conversation.user1_id, conversation.user2_id) if turn == 0
+            else (conversation.user2_id, conversation.user1_id)
+        )
+        self.expected[index] = recipient
+        self.sent_at[index] = time.monotonic()
+        await self.sockets[(conversation.pk, sender)].send_to(
+            text_data=json.dumps({"text": f"loadtest {index}"})
+        )
+
+    async def _read(self, conversation_id, user_id, communicator):
+        total = len(self.conversations) * self.messages_per_conversation
+        while True:
+            # Long timeout: the task is cancelled at the end of the run, and
+            # a timeout would tear the application down instead
+            frame = json.loads(await communicator.receive_from(timeout=3600))
+            text = frame.get("text") or ""
+            if not text.startswith("loadtest "):
+                continue
+            index = int(text.split(" ", 1)[1])
+            if self.expected.get(index) != user_id:
+                continue  # the sender's own echo
+            self.fanout.append(time.monotonic() - self.sent_at[index])
+            if len(self.fanout) == total:
+                self.delivered.set()
@@ -0,0 +1,86 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from messaging.models import Conversation
+
+# Messages from the other participant past each participant's watermark
+UNREAD_FOR_USER1 = Q(messages__sender=F("user2")) & (
+    Q(user1_last_read_id__isnull=True) | Q(messages__id__gt=F("user1_last_read_id"))
+)
+UNREAD_FOR_USER2 = Q(messages__sender=F("user1")) & (
+    Q(user2_last_read_id__isnull=True) | Q(messages__id__gt=F("user2_last_read_id"))
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute Conversation.user1_unread_count / user2_unread_count from "
+        "the read watermarks, in chunks of conversations."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of conversations recomputed per query (default: 500).",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+
+        last_pk = 0
+        total = 0
+        while True:
+            with transaction.atomic():
+                chunk, changed = self.backfill_chunk(last_pk, chunk_size)
+            if not chunk:
+                break
+
+            total += len(chunk)
+            last_pk = chunk[-1].pk
+            self.stdout.write(f"Processed {total} conversations ({len(changed)} updated in this chunk)")
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled unread counters for {total} conversations."))
+
+    def backfill_chunk(self, last_pk, chunk_size):
+        """
+        Recount the next chunk of conversations. Their rows are locked first
+        (the lock Message.save and mark_read take), so no send or read can
+        land between the count and the write and be overwritten.
+        """
+        ids = list(
+            Conversation.objects.select_for_update()
+            .filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:chunk_size]
+        )
+        if not ids:
+            return [], []
+
+        chunk = list(
+            Conversation.objects.filter(pk__in=ids)
+            .order_by("pk")
+            .annotate(
+                computed_user1_unread=Count("messages", filter=UNREAD_FOR_USER1),
+                computed_user2_unread=Count("messages", filter=UNREAD_FOR_USER2),
+            )
+            .only("pk", "user1_unread_count", "user2_unread_count")
+        )
+
+        changed = []
+        for conversation in chunk:
+            if (
+                conversation.user1_unread_count != conversation.computed_user1_unread
+                or conversation.user2_unread_count != conversation.computed_user2_unread
+            ):
+                conversation.user1_unread_count = conversation.computed_user1_unread
+                conversation.user2_unread_count = conversation.computed_user2_unread
+                changed.append(conversation)
+
+        if changed:
+            Conversation.objects.bulk_update(
+                changed, ["user1_unread_count", "user2_unread_count"]
+            )
+        return chunk, changed
@@ -0,0 +1,116 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+from messaging.loadtest import ChatLoadTest, create_fixtures
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the chat WebSocket consumers in-process against a throwaway "
+        "test database and report connect / fan-out latency, queries per "
+        "message and memory per socket. Threshold options turn it into a "
+        "regression gate (non-zero exit when exceeded)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=50, help="Users to create (default: 50).")
+        parser.add_argument(
+            "--conversations", type=int, default=25,
+            help="1-on-1 conversations; each gets one socket per participant (default: 25).",
+        )
+        parser.add_argument(
+            "--messages", type=int, default=20,
+            help="Messages sent per conversation (default: 20).",
+        )
+        parser.add_argument(
+            "--rate", type=float, default=100,
+            help="Messages per second across all conversations (default: 100).",
+        )
+        parser.add_argument(
+            "--channel-layer", choices=["memory", "redis"], default="memory",
+            help="InMemoryChannelLayer, or channels_redis on REDIS_URL (default: memory).",
+        )
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+        parser.add_argument("--verbose", action="store_true", help="Keep consumer / middleware output.")
+        parser.add_argument("--max-fanout-p95-ms", type=float, help="Fail if fan-out p95 exceeds this.")
+        parser.add_argument("--max-queries-per-message", type=float, help="Fail if exceeded.")
+        parser.add_argument("--max-memory-per-socket-kb", type=float, help="Fail if exceeded.")
+
+    def handle(self, *args, **options):
+        if options["channel_layer"] == "redis":
+            if not settings.REDIS_URL:
+                raise CommandError("--channel-layer redis needs REDIS_URL")
+            channel_layers = {
+                "default": {
+                    "BACKEND": "channels_redis.core.RedisChannelLayer",
+                    "CONFIG": {"hosts": [settings.REDIS_URL]},
+                }
+            }
+        else:
+            channel_layers = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+        overrides = override_settings(
+            CHANNEL_LAYERS=channel_layers,
+            CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+            PRESENCE_BACKEND="memory",
+        )
+
+        # Never touch real data: run against a fresh test database
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with overrides:
+                from backend.asgi import application
+
+                conversations = create_fixtures(options["users"], options["conversations"])
+                report = ChatLoadTest(
+                    application,
+                    conversations,
+                    messages_per_conversation=options["messages"],
+                    rate=options["rate"],
+                ).run(quiet=not options["verbose"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        report["users"] = options["users"]
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report)
+
+        failures = []
+        checks = (
+            ("max_fanout_p95_ms", report["fanout_ms"]["p95"], "fan-out p95 (ms)"),
+            ("max_queries_per_message", report["queries_per_message"], "queries per message"),
+            ("max_memory_per_socket_kb", report["memory_per_socket_kb"], "memory per socket (KB)"),
+        )
+        for option, value, label in checks:
+            limit = options[option]
+            if limit is not None and (value is None or value > limit):
+                failures.append(f"{label} {value} > {limit}")
+        if report["lost"]:
+            failures.append(f"{report['lost']} messages not delivered")
+        if failures:
+            raise CommandError("; ".join(failures))
+
+    def print_report(self, report):
+        def ms(stats):
+            return " / ".join(f"{stats[k]}" for k in ("p50", "p95", "p99", "max"))
+
+        self.stdout.write(
+            f"Users: {report['users']}  Conversations: {report['conversations']}  "
+            f"Sockets: {report['sockets']}"
+        )
+        self.stdout.write(
+            f"Messages: {report['messages_delivered']}/{report['messages_sent']} delivered "
+            f"in {report['duration_s']}s ({report['throughput_msgs_per_s']} msg/s)"
+        )
+        self.stdout.write(f"Connect latency ms  p50/p95/p99/max: {ms(report['connect_ms'])}")
+        self.stdout.write(f"Fan-out latency ms  p50/p95/p99/max: {ms(report['fanout_ms'])}")
+        self.stdout.write(f"Queries per connect: {report['queries_per_connect']}")
+        self.stdout.write(f"Queries per message: {report['queries_per_message']}")
+        self.stdout.write(f"Memory per socket:   {report['memory_per_socket_kb']} KB")
@@ -7,7 +7,7 @@ class JWTAuthMiddleware:
 
     async def __call__(self, scope, receive, send):
         from rest_framework_simplejwt.tokens import UntypedToken
-        from django.contrib.auth import get_user_model
+        from messaging.cache import get_cached_user
         from django.db import close_old_connections
         from asgiref.sync import sync_to_async
         import jwt
@@ -52,8 +52,10 @@ class JWTAuthMiddleware:
                 if user_id is None:
                     raise ValueError("user_id not found in token payload")
 
-                User = get_user_model()
-                scope["user"] = await sync_to_async(User.objects.get)(id=user_id)
+                # Served from the connect cache; one query on a cold cache
+                scope["user"] = await sync_to_async(get_cached_user)(user_id)
+                if scope["user"] is None:
+                    raise ValueError(f"User {user_id} does not exist or is inactive")
                 print(f"User {scope['user']} attached to scope")
             except Exception as e:
                 print("JWT validation error:", e)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0005_message_cloudinary_url_message_file_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='upload_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='ready', max_length=10),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:32
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def backfill_watermarks(apps, schema_editor):
+    """Derive each participant's watermark from the old per-message is_read flags."""
+    Conversation = apps.get_model("messaging", "Conversation")
+    Message = apps.get_model("messaging", "Message")
+
+    read = (
+        Message.objects.filter(is_read=True)
+        .values("conversation_id", "sender_id")
+        .annotate(last_id=Max("id"), last_at=Max("read_at"))
+    )
+    by_conversation = {}
+    for row in read:
+        by_conversation.setdefault(row["conversation_id"], []).append(row)
+
+    batch = []
+    for conversation in Conversation.objects.filter(pk__in=by_conversation.keys()).iterator():
+        for row in by_conversation[conversation.pk]:
+            # The reader is whoever did NOT send these messages
+            slot = "user2" if row["sender_id"] == conversation.user1_id else "user1"
+            setattr(conversation, f"{slot}_last_read_id", row["last_id"])
+            setattr(conversation, f"{slot}_last_read_at", row["last_at"])
+        batch.append(conversation)
+
+    Conversation.objects.bulk_update(
+        batch,
+        ["user1_last_read_id", "user1_last_read_at", "user2_last_read_id", "user2_last_read_at"],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0006_message_upload_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='user1_last_read_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='user1_last_read_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='user2_last_read_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='user2_last_read_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_watermarks, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='message',
+            name='is_read',
+        ),
+        migrations.RemoveField(
+            model_name='message',
+            name='read_at',
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0007_read_watermarks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='user1_unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='user2_unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
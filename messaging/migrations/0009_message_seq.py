@@ -0,0 +1,58 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:40
+
+from django.db import migrations, models
+
+
+def backfill_seq(apps, schema_editor):
+    """Number existing messages 1..N per conversation in (created_at, id) order."""
+    Conversation = apps.get_model("messaging", "Conversation")
+    Message = apps.get_model("messaging", "Message")
+
+    for conversation in Conversation.objects.only("pk").iterator():
+        seq = 0
+        batch = []
+        for message in (
+            Message.objects.filter(conversation_id=conversation.pk)
+            .order_by("created_at", "id")
+            .only("pk")
+            .iterator()
+        ):
+            seq += 1
+            message.seq = seq
+            batch.append(message)
+            if len(batch) >= 1000:
+                Message.objects.bulk_update(batch, ["seq"])
+                batch = []
+        if batch:
+            Message.objects.bulk_update(batch, ["seq"])
+        Conversation.objects.filter(pk=conversation.pk).update(last_seq=seq)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0008_conversation_unread_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='last_seq',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='seq',
+            field=models.PositiveBigIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_seq, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='message',
+            name='seq',
+            field=models.PositiveBigIntegerField(editable=False),
+        ),
+        migrations.AddConstraint(
+            model_name='message',
+            constraint=models.UniqueConstraint(fields=('conversation', 'seq'), name='unique_message_seq'),
+        ),
+    ]
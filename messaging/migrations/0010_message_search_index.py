@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-17 09:12
+
+from django.db import migrations
+
+from messaging.search import install_search_index, uninstall_search_index
+
+
+def install(apps, schema_editor):
+    """Postgres: generated tsvector column + GIN index. SQLite: FTS5 table + triggers."""
+    install_search_index(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    uninstall_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0009_message_seq'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -1,6 +1,7 @@
 from django.conf import settings
-from django.db import models
-from django.db.models import Q, F
+from django.db import models, transaction
+from django.db.models import Q, F, Case, When, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 
@@ -23,6 +24,49 @@ class ConversationManager(models.Manager):
         conversation = self.create(user1=user1, user2=user2)
         return conversation, True
 
+    def mark_read(self, conversation_id, user):
+        """
+        Move `user`'s read watermark up to the conversation's latest message
+        and reset their unread counter.
+
+        The conversation row is locked (as Message.save does) and its counter
+        read before the single-row UPDATE, so the value returned is exactly
+        the counter that was reset: the number of messages this call marked
+        read. 0 if `user` is not a participant or had nothing unread.
+        """
+        now = timezone.now()
+        updates = {}
+        for slot in ("user1", "user2"):
+            is_reader = When(**{slot: user}, then=Coalesce(F("last_message_id"), F(f"{slot}_last_read_id")))
+            updates[f"{slot}_last_read_id"] = Case(is_reader, default=F(f"{slot}_last_read_id"))
+            updates[f"{slot}_last_read_at"] = Case(
+                When(**{slot: user}, then=Value(now)), default=F(f"{slot}_last_read_at")
+            )
+            updates[f"{slot}_unread_count"] = Case(
+                When(**{slot: user}, then=Value(0)),
+                default=F(f"{slot}_unread_count"),
+                output_field=models.PositiveIntegerField(),
+            )
+
+        behind = Q()
+        for slot in ("user1", "user2"):
+            behind |= Q(**{slot: user}) & (
+                Q(**{f"{slot}_last_read_id__isnull": True})
+                | Q(**{f"{slot}_last_read_id__lt": F("last_message_id")})
+            )
+
+        with transaction.atomic():
+            conversation = (
+                self.select_for_update()
+                .filter(behind, pk=conversation_id, last_message__isnull=False)
+                .only("user1_id", "user1_unread_count", "user2_unread_count")
+                .first()
+            )
+            if conversation is None:
+                return 0
+            self.filter(pk=conversation.pk).update(**updates)
+        return conversation.unread_count_for(user.pk)
+
 
 class Conversation(models.Model):
     user1 = models.ForeignKey(
@@ -44,6 +88,21 @@ class Conversation(models.Model):
         on_delete=models.SET_NULL,
     )
 
+    # Read watermarks: every message up to and including *_last_read_id
+    # has been read by that participant (see ConversationManager.mark_read).
+    user1_last_read_id = models.BigIntegerField(null=True, blank=True)
+    user1_last_read_at = models.DateTimeField(null=True, blank=True)
+    user2_last_read_id = models.BigIntegerField(null=True, blank=True)
+    user2_last_read_at = models.DateTimeField(null=True, blank=True)
+
+    # Highest Message.seq handed out in this conversation
+    last_seq = models.PositiveBigIntegerField(default=0)
+
+    # Denormalized unread counters: incremented in Message.save for the
+    # recipient, reset by mark_read. Repair with `manage.py backfill_unread_counts`.
+    user1_unread_count = models.PositiveIntegerField(default=0)
+    user2_unread_count = models.PositiveIntegerField(default=0)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -69,11 +128,57 @@ class Conversation(models.Model):
             return self.user1
         raise ValueError("User is not part of this conversation")
 
+    def read_watermark(self, user_id):
+        """Return (last_read_id, last_read_at) for one participant."""
+        if user_id == self.user1_id:
+            return self.user1_last_read_id, self.user1_last_read_at
+        if user_id == self.user2_id:
+            return self.user2_last_read_id, self.user2_last_read_at
+        raise ValueError("User is not part of this conversation")
+
+    def unread_count_for(self, user_id):
+        """Stored unread counter for one participant."""
+        if user_id == self.user1_id:
+            return self.user1_unread_count
+        if user_id == self.user2_id:
+            return self.user2_unread_count
+        raise ValueError("User is not part of this conversation")
+
+    def unread_messages(self, reader_id):
+        """Messages from the other participant past `reader_id`'s watermark."""
+        last_read_id, _ = self.read_watermark(reader_id)
+        qs = self.messages.exclude(sender_id=reader_id)
+        if last_read_id is not None:
+            qs = qs.filter(id__gt=last_read_id)
+        return qs
+
     def __str__(self):
         return f"Conversation({self.user1} <-> {self.user2})"
 
 
+class MessageManager(models.Manager):
+    def create_message(self, conversation, sender, **fields):
+        """
+        The single write path for new messages (REST view and WebSocket).
+
+        `conversation` may be an instance or a pk. Inserts the message and
+        updates the conversation (seq, last_message, unread counter) in one
+        transaction and a fixed number of queries: lock the conversation row,
+        INSERT, UPDATE. The returned message has `conversation` and `sender`
+        attached and current, so serializing it needs no further queries.
+        """
+        conversation_id = getattr(conversation, "pk", conversation)
+        message = self.model(conversation_id=conversation_id, sender=sender, **fields)
+        message.save()
+        return message
+
+
 class Message(models.Model):
+    class UploadStatus(models.TextChoices):
+        PENDING = "pending", "Pending"
+        READY = "ready", "Ready"
+        FAILED = "failed", "Failed"
+
     conversation = models.ForeignKey(
         Conversation, related_name="messages", on_delete=models.CASCADE
     )
@@ -81,6 +186,10 @@ class Message(models.Model):
         settings.AUTH_USER_MODEL, related_name="sent_messages", on_delete=models.CASCADE
     )
 
+    # Monotonic per-conversation sequence number (1, 2, 3, ...), assigned in
+    # save(). Clients use it to detect gaps and to catch up after reconnecting.
+    seq = models.PositiveBigIntegerField(editable=False)
+
     text = models.TextField(blank=True)
 
     # LOCAL FILE — Optional
@@ -102,33 +211,75 @@ class Message(models.Model):
         help_text="Type of file: image, audio, video, document, or file"
     )
 
-    # Read receipts
-    is_read = models.BooleanField(default=False)
-    read_at = models.DateTimeField(null=True, blank=True)
+    # Attachment upload state (attachments are uploaded in the background)
+    upload_status = models.CharField(
+        max_length=10,
+        choices=UploadStatus.choices,
+        default=UploadStatus.READY,
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = MessageManager()
+
     class Meta:
         ordering = ["-created_at"]
         indexes = [models.Index(fields=["conversation", "created_at"])]
+        constraints = [
+            models.UniqueConstraint(fields=["conversation", "seq"], name="unique_message_seq"),
+        ]
 
-    def mark_as_read(self, when=None):
-        if not self.is_read:
-            self.is_read = True
-            self.read_at = when or timezone.now()
-            self.save(update_fields=["is_read", "read_at"])
+    def read_state(self, conversation=None):
+        """
+        Return (is_read, read_at) derived from the recipient's watermark.
+        `read_at` is when the recipient last advanced their watermark past
+        this message.
+        """
+        conversation = conversation or self.conversation
+        if self.sender_id == conversation.user1_id:
+            reader_id = conversation.user2_id
+        else:
+            reader_id = conversation.user1_id
+        last_read_id, last_read_at = conversation.read_watermark(reader_id)
+        if last_read_id is not None and self.pk <= last_read_id:
+            return True, last_read_at
+        return False, None
 
     def save(self, *args, **kwargs):
-        is_new = self.pk is None
-        super().save(*args, **kwargs)
+        if self.pk is not None:
+            super().save(*args, **kwargs)
+            return
 
-        # Update conversation.last_message only for new messages
-        if is_new:
-            Conversation.objects.filter(pk=self.conversation_id).update(
-                last_message_id=self.pk,
-                updated_at=timezone.now()
-            )
+        with transaction.atomic():
+            # Lock the conversation row until commit so concurrent senders
+            # get consecutive sequence numbers and never collide.
+            conversation = Conversation.objects.select_for_update().get(pk=self.conversation_id)
+            self.seq = conversation.last_seq + 1
+
+            super().save(*args, **kwargs)
+
+            # Advance seq, last_message and the recipient's unread counter
+            # (the recipient is whichever participant is not the sender)
+            now = timezone.now()
+            updates = {"last_seq": self.seq, "last_message_id": self.pk, "updated_at": now}
+            if self.sender_id == conversation.user1_id:
+                recipient_counter = "user2_unread_count"
+            elif self.sender_id == conversation.user2_id:
+                recipient_counter = "user1_unread_count"
+            else:
+                recipient_counter = None
+            if recipient_counter:
+                updates[recipient_counter] = F(recipient_counter) + 1
+            Conversation.objects.filter(pk=conversation.pk).update(**updates)
+
+        # Keep the in-memory conversation in step with the row
+        conversation.last_seq = self.seq
+        conversation.last_message = self
+        conversation.updated_at = now
+        if recipient_counter:
+            setattr(conversation, recipient_counter, getattr(conversation, recipient_counter) + 1)
+        self.conversation = conversation
 
     def __str__(self):
         preview = (
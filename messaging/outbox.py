@@ -0,0 +1,118 @@
+import asyncio
+import weakref
+
+from django.conf import settings
+
+
+# Close code sent when a socket's queue overflows with undroppable frames.
+# The client should reconnect and resume with since_seq (see catch-up).
+RESUME_CLOSE_CODE = 4008
+
+# Close code sent when a frame could not be written to the socket
+SEND_ERROR_CLOSE_CODE = 1011
+
+# Process-wide counters, exposed by ChatSocketMetricsView
+_queues = weakref.WeakSet()
+_counters = {"dropped": 0, "overflow_closes": 0, "send_errors": 0, "high_water": 0}
+
+
+class OutboundQueue:
+    """
+    Bounded per-connection send queue.
+
+    Group event handlers put frames here instead of awaiting the socket
+    send, so a slow client never stalls the channel-layer receive loop and
+    never makes the consumer buffer without limit; a single writer task
+    drains the queue to the socket in order.
+
+    Policy when the client falls behind:
+      - droppable frames (typing, upload progress) are only queued while the
+        queue is less than half full, and silently dropped otherwise;
+      - any other frame arriving at a full queue closes the socket with
+        RESUME_CLOSE_CODE so the client reconnects and catches up.
+    A send() that raises stops the writer: the error is logged, nothing
+    more is queued and `on_error` closes the socket.
+
+    Limitation: the queue only fills while send() is slow to return. Under
+    Daphne, send() hands the frame to the Twisted transport and returns at
+    once, whatever the client's read rate, and ASGI exposes no size of the
+    transport's write buffer to gate on. So on that server this bounds
+    what the consumer itself holds (e.g. while its event loop is busy),
+    not the bytes buffered for a slow client in the transport.
+    """
+
+    def __init__(self, send, on_overflow, on_error, maxsize=None):
+        self.maxsize = maxsize or getattr(settings, "CHAT_SEND_QUEUE_SIZE", 256)
+        self.queue = asyncio.Queue(maxsize=self.maxsize)
+        self.dropped = 0
+        self.overflowed = False
+        self.failed = False
+        self._send = send
+        self._on_overflow = on_overflow
+        self._on_error = on_error
+        self._writer = None
+        _queues.add(self)
+
+    @property
+    def depth(self):
+        return self.queue.qsize()
+
+    def start(self):
+        self._writer = asyncio.ensure_future(self._drain())
+
+    async def stop(self):
+        if self._writer is not None:
+            self._writer.cancel()
+            self._writer = None
+        _queues.discard(self)
+
+    def put(self, message, droppable=False):
+        """Queue one send() call's kwargs; returns False if it was not queued."""
+        if self.overflowed or self.failed:
+            return False
+
+        if droppable and self.depth >= self.maxsize // 2:
+            self.dropped += 1
+            _counters["dropped"] += 1
+            return False
+
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            _counters["overflow_closes"] += 1
+            asyncio.ensure_future(self._on_overflow())
+            return False
+
+        _counters["high_water"] = max(_counters["high_water"], self.depth)
+        return True
+
+    async def _drain(self):
+        while True:
+            message = await self.queue.get()
+            try:
+                await self._send(**message)
+            except Exception as e:
+                print(f"❌ Socket send failed, closing the connection: {e!r}")
+                self.failed = True
+                _counters["send_errors"] += 1
+                # This task ends here; stop() must not cancel it mid-close
+                self._writer = None
+                _queues.discard(self)
+                await self._on_error()
+                return
+
+
+def queue_metrics():
+    """Send queue depth across this process's open sockets."""
+    depths = [q.depth for q in list(_queues)]
+    return {
+        "sockets": len(depths),
+        "queued": sum(depths),
+        "max_depth": max(depths, default=0),
+        "high_water": _counters["high_water"],
+        "dropped": _counters["dropped"],
+        "overflow_closes": _counters["overflow_closes"],
+        "send_errors": _counters["send_errors"],
+        "queue_size": getattr(settings, "CHAT_SEND_QUEUE_SIZE", 256),
+    }
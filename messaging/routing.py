@@ -1,7 +1,8 @@
 # messaging/routing.py
 from django.urls import re_path
-from .consumers import ChatConsumer
+from .consumers import ChatConsumer, InboxConsumer
 
 websocket_urlpatterns = [
     re_path(r"ws/conversations/(?P<conversation_id>\d+)/$", ChatConsumer.as_asgi()),
+    re_path(r"ws/inbox/$", InboxConsumer.as_asgi()),
 ]
@@ -0,0 +1,219 @@
+"""
+Full-text search over message text.
+
+The index lives in the database and is kept up to date by the database
+itself, so every write path (create_message, edits, deletes, admin, raw
+UPDATEs) maintains it without extra queries from Django:
+
+  PostgreSQL  generated `search_vector` tsvector column on messaging_message
+              + GIN index; matched with plainto_tsquery, snippets from
+              ts_headline.
+  SQLite      external-content FTS5 table messaging_message_fts, kept in
+              sync by AFTER INSERT / UPDATE / DELETE triggers; snippets from
+              FTS5 snippet().
+  others      unindexed icontains fallback.
+
+Both indexed backends match messages containing every word of the query.
+"""
+import html
+import re
+
+from django.db.models import Q, TextField
+from django.db.models.expressions import RawSQL
+
+# Text search configuration baked into the generated column. `simple` does
+# no stemming or stop words, which suits short, mixed-language chat text.
+POSTGRES_CONFIG = "simple"
+
+FTS_TABLE = "messaging_message_fts"
+
+# Markers put around matches by the database, swapped for <mark> after the
+# snippet has been HTML-escaped (message text is user input)
+MARK_START = "\x02"
+MARK_END = "\x03"
+ELLIPSIS = "…"
+SNIPPET_WORDS = 16
+
+POSTGRES_INSTALL = [
+    f"""
+    ALTER TABLE messaging_message ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('{POSTGRES_CONFIG}', coalesce(text, ''))) STORED
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS messaging_message_search_gin
+        ON messaging_message USING GIN (search_vector)
+    """,
+]
+
+POSTGRES_UNINSTALL = [
+    "DROP INDEX IF EXISTS messaging_message_search_gin",
+    "ALTER TABLE messaging_message DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_TABLE = f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        text, content='messaging_message', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+"""
+
+SQLITE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON messaging_message BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON messaging_message BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF text ON messaging_message BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+]
+
+SQLITE_UNINSTALL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+# ============================================================
+# INDEX MAINTENANCE
+# ============================================================
+
+def _sqlite_triggers_missing(cursor):
+    cursor.execute(
+        "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+        [f"{FTS_TABLE}_%"],
+    )
+    return cursor.fetchone()[0] < len(SQLITE_TRIGGERS)
+
+
+def install_search_index(connection):
+    """
+    Create the search index for `connection`'s backend (idempotent).
+
+    On SQLite, Django rebuilds a table (create / copy / drop / rename) for
+    most ALTERs, which drops its triggers; this is therefore also run after
+    every migrate (messaging.signals) and rebuilds the FTS table whenever
+    the triggers had to be recreated.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            for statement in POSTGRES_INSTALL:
+                cursor.execute(statement)
+        elif connection.vendor == "sqlite":
+            if not _sqlite_triggers_missing(cursor):
+                return
+            cursor.execute(SQLITE_TABLE)
+            for statement in SQLITE_TRIGGERS:
+                cursor.execute(statement)
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def uninstall_search_index(connection):
+    statements = {
+        "postgresql": POSTGRES_UNINSTALL,
+        "sqlite": SQLITE_UNINSTALL,
+    }.get(connection.vendor, [])
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+# ============================================================
+# QUERIES
+# ============================================================
+
+def query_terms(query):
+    """Words of a user query; punctuation and operators are ignored."""
+    return re.findall(r"\w+", query or "")
+
+
+def search_messages(queryset, query):
+    """
+    Narrow a Message queryset to rows matching every word of `query`, with
+    the raw snippet (match markers, unescaped) annotated as `search_snippet`.
+    Ordering and pagination are left to the caller.
+    """
+    from django.db import connections
+
+    terms = query_terms(query)
+    if not terms:
+        return queryset.none()
+
+    vendor = connections[queryset.db].vendor
+    if vendor == "postgresql":
+        return _search_postgres(queryset, " ".join(terms))
+    if vendor == "sqlite":
+        return _search_sqlite(queryset, terms)
+
+    condition = Q()
+    for term in terms:
+        condition &= Q(text__icontains=term)
+    return queryset.filter(condition).annotate(search_snippet=RawSQL("NULL", []))
+
+
+def _search_postgres(queryset, text):
+    from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchVectorField
+
+    search_query = SearchQuery(text, config=POSTGRES_CONFIG, search_type="plain")
+    return (
+        queryset
+        .alias(search_vector=RawSQL(
+            '"messaging_message"."search_vector"', [], output_field=SearchVectorField()
+        ))
+        .filter(search_vector=search_query)
+        .annotate(search_snippet=SearchHeadline(
+            "text",
+            search_query,
+            config=POSTGRES_CONFIG,
+            start_sel=MARK_START,
+            stop_sel=MARK_END,
+            max_words=SNIPPET_WORDS,
+            min_words=SNIPPET_WORDS // 2,
+            fragment_delimiter=f" {ELLIPSIS} ",
+            max_fragments=2,
+        ))
+    )
+
+
+def _search_sqlite(queryset, terms):
+    # Each term as a quoted FTS5 string, so user input can't form operators
+    match = " ".join('"%s"' % term.replace('"', '""') for term in terms)
+    matching_ids = RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+    # snippet() only works inside a MATCH query on the FTS table; evaluated
+    # for the rows of the page only, each one a rowid lookup
+    snippet = RawSQL(
+        f"""
+        SELECT snippet({FTS_TABLE}, 0, %s, %s, %s, %s) FROM {FTS_TABLE}
+        WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = "messaging_message"."id"
+        """,
+        [MARK_START, MARK_END, ELLIPSIS, SNIPPET_WORDS, match],
+        output_field=TextField(),
+    )
+    return queryset.filter(id__in=matching_ids).annotate(search_snippet=snippet)
+
+
+def highlight(snippet, text=""):
+    """
+    HTML-safe snippet with matches wrapped in <mark>. Falls back to the start
+    of `text` when the backend produced no snippet.
+    """
+    if snippet is None:
+        words = (text or "").split()
+        snippet = " ".join(words[:SNIPPET_WORDS])
+        if len(words) > SNIPPET_WORDS:
+            snippet += f" {ELLIPSIS}"
+    return (
+        html.escape(snippet)
+        .replace(MARK_START, "<mark>")
+        .replace(MARK_END, "</mark>")
+    )
@@ -3,10 +3,11 @@ import mimetypes
 from urllib.parse import urlparse
 
 from rest_framework import serializers
-from django.utils import timezone
 from django.contrib.auth import get_user_model
+from users.presence import presence_for, prime_presence
+from users.relations import PrimedListSerializer
 from .models import Conversation, Message
-from datetime import timedelta
+from .search import highlight
 
 User = get_user_model()
 
@@ -32,16 +33,13 @@ class UserSummarySerializer(serializers.ModelSerializer):
         ]
 
     def get_is_online(self, obj):
-        """Consider user online if last_seen was within the last 5 minutes."""
-        if not hasattr(obj, "last_seen") or obj.last_seen is None:
-            return False
-        return timezone.now() - obj.last_seen <= timedelta(minutes=5)
+        """Online status from the presence store (open socket or recent heartbeat)."""
+        return presence_for(self.context, obj)[0]
 
     def get_last_seen(self, obj):
         """Return ISO format of last seen timestamp, or None."""
-        if not hasattr(obj, "last_seen") or obj.last_seen is None:
-            return None
-        return obj.last_seen.isoformat()
+        last_seen = presence_for(self.context, obj)[1]
+        return last_seen.isoformat() if last_seen else None
 
 
 # ------------------------------
@@ -56,12 +54,16 @@ class MessageSerializer(serializers.ModelSerializer):
     cloudinary_url = serializers.CharField(read_only=True, allow_null=True)
     # structured attachment helper for frontend
     attachment = serializers.SerializerMethodField()
+    # read receipts, derived from the recipient's read watermark
+    is_read = serializers.SerializerMethodField()
+    read_at = serializers.SerializerMethodField()
 
     class Meta:
         model = Message
         fields = [
             "id",
             "conversation",
+            "seq",
             "sender",
             "text",
             "file",            # original FileField (may be null)
@@ -69,18 +71,33 @@ class MessageSerializer(serializers.ModelSerializer):
             "cloudinary_url",  # explicit cloudinary URL if present
             "attachment",      # structured attachment info for frontend
             "file_type",
+            "upload_status",   # pending while the attachment is uploading
             "is_read",
             "read_at",
             "created_at",
         ]
         read_only_fields = [
             "conversation",
+            "seq",
             "sender",
-            "is_read",
-            "read_at",
+            "upload_status",
             "created_at",
         ]
 
+    def _read_state(self, obj):
+        # Reuse the conversation from context when given (avoids a query per message)
+        conversation = self.context.get("conversation")
+        if conversation is None or conversation.pk != obj.conversation_id:
+            conversation = obj.conversation
+        return obj.read_state(conversation)
+
+    def get_is_read(self, obj):
+        return self._read_state(obj)[0]
+
+    def get_read_at(self, obj):
+        read_at = self._read_state(obj)[1]
+        return serializers.DateTimeField().to_representation(read_at) if read_at else None
+
     def get_file_url(self, obj):
         """
         Return the attachment URL.
@@ -231,8 +248,8 @@ class MessageSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         """
-        Create a new message, link to conversation, and update conversation's last_message.
-        (Same behaviour as before — keep business logic in the view/consumer)
+        Create a new message in the context conversation. The conversation's
+        last_message / counters are updated by Message.objects.create_message.
         """
         request = self.context.get("request")
         conversation = self.context.get("conversation")
@@ -240,27 +257,42 @@ class MessageSerializer(serializers.ModelSerializer):
         if not conversation:
             raise serializers.ValidationError("Conversation context is required.")
 
-        message = Message.objects.create(
-            conversation=conversation,
+        message = Message.objects.create_message(
+            conversation,
             sender=request.user,
             **validated_data,
         )
 
-        # Update conversation last message
-        conversation.last_message = message
-        conversation.updated_at = timezone.now()
-        conversation.save(update_fields=["last_message", "updated_at"])
-
         return message
 
 
+# ------------------------------
+# Message search result
+# ------------------------------
+class MessageSearchResultSerializer(MessageSerializer):
+    """A matching message plus an HTML-escaped snippet with <mark>ed matches."""
+    snippet = serializers.SerializerMethodField()
+
+    class Meta(MessageSerializer.Meta):
+        fields = MessageSerializer.Meta.fields + ["snippet"]
+
+    def get_snippet(self, obj):
+        return highlight(getattr(obj, "search_snippet", None), obj.text)
+
+
 # ------------------------------
 # Conversation Serializer
 # ------------------------------
+class ConversationListSerializer(PrimedListSerializer):
+    def prime(self, conversations):
+        # One presence store round trip for every participant on the page
+        prime_presence(self.context, [user for c in conversations for user in (c.user1, c.user2)])
+
+
 class ConversationSerializer(serializers.ModelSerializer):
     user1 = UserSummarySerializer(read_only=True)
     user2 = UserSummarySerializer(read_only=True)
-    last_message = MessageSerializer(read_only=True)
+    last_message = serializers.SerializerMethodField()
     unread_count = serializers.SerializerMethodField()
     unread_sent_count = serializers.SerializerMethodField()
 
@@ -276,24 +308,34 @@ class ConversationSerializer(serializers.ModelSerializer):
             "created_at",
             "updated_at",
         ]
+        list_serializer_class = ConversationListSerializer
+
+    def get_last_message(self, obj):
+        if obj.last_message is None:
+            return None
+        context = {**self.context, "conversation": obj}
+        return MessageSerializer(obj.last_message, context=context).data
 
     def get_unread_count(self, obj):
-        """Count of unread messages received by the current user."""
+        """Count of unread messages received by the current user (stored counter)."""
         request = self.context.get("request")
         if not request or not request.user:
             return 0
-        return (
-            Message.objects.filter(conversation=obj, is_read=False)
-            .exclude(sender=request.user)
-            .count()
-        )
+        try:
+            return obj.unread_count_for(request.user.id)
+        except ValueError:
+            return 0
 
     def get_unread_sent_count(self, obj):
-        """Count of unread messages sent by the current user."""
+        """Count of unread messages sent by the current user (the other side's counter)."""
         request = self.context.get("request")
         if not request or not request.user:
             return 0
-        return Message.objects.filter(conversation=obj, sender=request.user, is_read=False).count()
+        if request.user.id == obj.user1_id:
+            return obj.user2_unread_count
+        if request.user.id == obj.user2_id:
+            return obj.user1_unread_count
+        return 0
 
 
 # ------------------------------
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.db import connections
+from django.db.models.signals import post_save, post_delete, post_migrate
+from django.dispatch import receiver
+
+from messaging.cache import invalidate_conversation, invalidate_user
+from messaging.models import Conversation, Message
+from messaging.search import install_search_index
+
+User = settings.AUTH_USER_MODEL
+
+
+# -------------------------------
+# Socket admission cache (messaging.cache)
+# -------------------------------
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def drop_cached_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Conversation)
+@receiver(post_delete, sender=Conversation)
+def drop_cached_conversation(sender, instance, **kwargs):
+    invalidate_conversation((instance.user1_id, instance.user2_id))
+
+
+# -------------------------------
+# Message search index (messaging.search)
+# -------------------------------
+@receiver(post_migrate)
+def restore_search_index(sender, using, **kwargs):
+    """SQLite drops the FTS triggers whenever Django rebuilds the message table."""
+    connection = connections[using]
+    if sender.name != "messaging" or connection.vendor != "sqlite":
+        return
+    if Message._meta.db_table in connection.introspection.table_names():
+        install_search_index(connection)
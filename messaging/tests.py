@@ -1,3 +1,728 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import msgpack
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files import File
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from messaging.cache import get_cached_user, user_conversation_ids, user_key
+from messaging.consumers import ChatConsumer, chat_group
+from messaging.loadtest import ChatLoadTest, create_fixtures
+from messaging.models import Conversation, Message
+from messaging.outbox import RESUME_CLOSE_CODE, OutboundQueue, queue_metrics
+from messaging.uploads import ChunkedUpload, UploadError, upload_attachment
+from users.models import CustomUser
+
+
+class MessageWritePathTests(TestCase):
+    """Message.objects.create_message is the only write path; pin its cost."""
+
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(username="alice", email="alice@example.com", password="pass")
+        self.bob = CustomUser.objects.create_user(username="bob", email="bob@example.com", password="pass")
+        self.conversation, _ = Conversation.objects.get_or_create_1on1(self.alice, self.bob)
+
+    def test_create_message_query_count(self):
+        # SAVEPOINT, SELECT ... FOR UPDATE, INSERT, UPDATE, RELEASE SAVEPOINT
+        with self.assertNumQueries(5):
+            message = Message.objects.create_message(self.conversation.pk, sender=self.alice, text="hi")
+
+        # The returned message carries an up-to-date conversation
+        with self.assertNumQueries(0):
+            self.assertEqual(message.seq, 1)
+            self.assertEqual(message.conversation.last_message_id, message.pk)
+            self.assertEqual(message.conversation.unread_count_for(self.bob.id), 1)
+
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.last_message_id, message.pk)
+        self.assertEqual(self.conversation.last_seq, 1)
+        self.assertEqual(self.conversation.unread_count_for(self.bob.id), 1)
+        self.assertEqual(self.conversation.unread_count_for(self.alice.id), 0)
+
+    def test_query_count_does_not_grow_with_history(self):
+        for i in range(5):
+            Message.objects.create_message(self.conversation, sender=self.bob, text=f"m{i}")
+
+        with self.assertNumQueries(5):
+            message = Message.objects.create_message(self.conversation, sender=self.alice, text="late")
+        self.assertEqual(message.seq, 6)
+
+    def test_rest_send_uses_write_path(self):
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        url = reverse("message-list-create", args=[self.conversation.pk])
+
+        # conversation lookup + create_message (5); the presence heartbeat is no query
+        with self.assertNumQueries(6):
+            response = client.post(url, {"text": "hello"})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["seq"], 1)
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.last_message_id, response.data["id"])
+
+
+@override_settings(
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+    PRESENCE_BACKEND="memory",
+)
+class ChatLoadRegressionTests(TransactionTestCase):
+    """Small run of the load harness (manage.py chat_loadtest) as a regression gate."""
+
+    def test_fanout_and_query_budget(self):
+        from backend.asgi import application
+
+        conversations = create_fixtures(users=6, conversations=4)
+        report = ChatLoadTest(application, conversations, messages_per_conversation=3, rate=200).run()
+
+        self.assertEqual(report["sockets"], 8)
+        self.assertEqual(report["lost"], 0)
+        # BEGIN, SELECT ... FOR UPDATE, INSERT, UPDATE
+        self.assertLessEqual(report["queries_per_message"], 4)
+        # Cold connect: user, membership, read watermark UPDATE
+        self.assertLessEqual(report["queries_per_connect"], 3)
+
+
+class MessageSearchTests(TestCase):
+    """Indexed message search, scoped to the requesting user's conversations."""
+
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(username="alice", email="alice@example.com", password="pass")
+        self.bob = CustomUser.objects.create_user(username="bob", email="bob@example.com", password="pass")
+        self.carol = CustomUser.objects.create_user(username="carol", email="carol@example.com", password="pass")
+        self.ab, _ = Conversation.objects.get_or_create_1on1(self.alice, self.bob)
+        self.bc, _ = Conversation.objects.get_or_create_1on1(self.bob, self.carol)
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        self.url = reverse("message-search")
+
+    def search(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_matches_all_words_with_highlighted_snippet(self):
+        hit = Message.objects.create_message(self.ab, sender=self.bob, text="Lunch at <the> pizza place?")
+        Message.objects.create_message(self.ab, sender=self.alice, text="pizza is fine")
+
+        results = self.search(q="pizza lunch")["results"]
+        self.assertEqual([r["id"] for r in results], [hit.pk])
+        self.assertIn("<mark>pizza</mark>", results[0]["snippet"])
+        self.assertIn("&lt;the&gt;", results[0]["snippet"])
+
+    def test_scoped_to_own_conversations(self):
+        Message.objects.create_message(self.bc, sender=self.bob, text="secret plans")
+        own = Message.objects.create_message(self.ab, sender=self.bob, text="public plans")
+
+        self.assertEqual([r["id"] for r in self.search(q="plans")["results"]], [own.pk])
+        response = self.client.get(self.url, {"q": "plans", "conversation": self.bc.pk})
+        self.assertEqual(response.status_code, 403)
+
+    def test_index_follows_edits_and_deletes(self):
+        message = Message.objects.create_message(self.ab, sender=self.bob, text="old wording")
+        message.text = "new wording"
+        message.save()
+
+        self.assertEqual(self.search(q="old")["results"], [])
+        self.assertEqual(len(self.search(q="new")["results"]), 1)
+
+        message.delete()
+        self.assertEqual(self.search(q="wording")["results"], [])
+
+    def test_keyset_pages(self):
+        ids = [
+            Message.objects.create_message(self.ab, sender=self.bob, text=f"ping {i}").pk
+            for i in range(5)
+        ]
+        page = self.search(q="ping", page_size=2)
+        self.assertEqual([r["id"] for r in page["results"]], ids[:-3:-1])
+
+        page = self.client.get(page["next"]).data
+        self.assertEqual([r["id"] for r in page["results"]], ids[-3:-5:-1])
+
+    def test_query_required(self):
+        self.assertEqual(self.client.get(self.url, {"q": "  "}).status_code, 400)
+
+    @skipUnless(connection.vendor == "postgresql", "tsvector index is PostgreSQL-only")
+    def test_postgres_uses_generated_tsvector(self):
+        hit = Message.objects.create_message(self.ab, sender=self.bob, text="Lunch at the pizza place?")
+
+        with CaptureQueriesContext(connection) as queries:
+            results = self.search(q="pizza lunch")["results"]
+        self.assertEqual([r["id"] for r in results], [hit.pk])
+        self.assertIn("<mark>pizza</mark>", results[0]["snippet"])
+        self.assertTrue(any(
+            '"search_vector"' in q["sql"] and "@@ plainto_tsquery" in q["sql"] for q in queries.captured_queries
+        ))
+
+
+class AttachmentUploadTests(TestCase):
+    """Chunked attachments are spooled and sent to Cloudinary one part at a time."""
+
+    def spool(self, data, name="photo.jpg"):
+        upload = ChunkedUpload(name, len(data))
+        for start in range(0, len(data), upload.chunk_size):
+            upload.write(data[start:start + upload.chunk_size])
+        return File(upload.finalize(hashlib.sha256(data).hexdigest()), name=name)
+
+    @override_settings(CHAT_UPLOAD_CHUNK_SIZE=3, CHAT_UPLOAD_PART_SIZE=4)
+    @mock.patch("messaging.uploads.CLOUDINARY_MIN_PART_SIZE", 0)
+    def test_streams_parts_of_part_size(self):
+        parts = []
+
+        def upload_part(file, http_headers=None, **options):
+            parts.append((len(file[1]), options["resource_type"]))
+            return {"public_id": "attachments/x", "secure_url": "https://cdn.example.com/x.jpg"}
+
+        with mock.patch("cloudinary.uploader.upload_large_part", side_effect=upload_part):
+            fields = upload_attachment(self.spool(b"0123456789"), "photo.jpg", "image")
+
+        self.assertEqual(parts, [(4, "image"), (4, "image"), (2, "image")])
+        self.assertEqual(fields, {"cloudinary_url": "https://cdn.example.com/x.jpg"})
+
+    @override_settings(CHAT_UPLOAD_CHUNK_SIZE=4)
+    def test_rejects_bad_checksum_and_oversized_chunks(self):
+        upload = ChunkedUpload("notes.txt", 6)
+        with self.assertRaises(UploadError):
+            upload.write(b"12345")
+        upload.write(b"1234")
+        upload.write(b"56")
+        with self.assertRaises(UploadError):
+            upload.finalize("0" * 64)
+        upload.discard()
+
+
+class SocketAdmissionCacheTests(TestCase):
+    """A socket's user and conversation ids come from one cache entry (one query when cold)."""
+
+    def setUp(self):
+        cache.clear()
+        self.alice = CustomUser.objects.create_user(username="alice", email="alice@example.com", password="pass")
+        self.bob = CustomUser.objects.create_user(username="bob", email="bob@example.com", password="pass")
+        self.conversation, _ = Conversation.objects.get_or_create_1on1(self.alice, self.bob)
+
+    def test_cold_admission_is_one_query(self):
+        with self.assertNumQueries(1):
+            user = get_cached_user(str(self.alice.pk))
+            self.assertEqual(user_conversation_ids(user.pk), {self.conversation.pk})
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_cached_user(self.alice.pk).username, "alice")
+            self.assertEqual(user_conversation_ids(self.alice.pk), {self.conversation.pk})
+
+    def test_caches_no_credentials(self):
+        get_cached_user(self.alice.pk)
+        entry = repr(cache.get(user_key(self.alice.pk)))
+        self.assertNotIn(self.alice.password, entry)
+        self.assertNotIn("alice@example.com", entry)
+
+    def test_invalidated_by_changes(self):
+        get_cached_user(self.alice.pk)
+        carol = CustomUser.objects.create_user(username="carol", email="carol@example.com", password="pass")
+        other, _ = Conversation.objects.get_or_create_1on1(self.alice, carol)
+        self.assertEqual(user_conversation_ids(self.alice.pk), {self.conversation.pk, other.pk})
+
+        self.alice.is_active = False
+        self.alice.save()
+        self.assertIsNone(get_cached_user(self.alice.pk))
+        self.assertIsNone(get_cached_user(99999))
+
+
+# ============================================================
+# WEBSOCKET CONSUMERS
+# ============================================================
+
+@override_settings(
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+    PRESENCE_BACKEND="memory",
+)
+class ChatSocketTestCase(TransactionTestCase):
+    """Drives the chat consumers through the ASGI app with WebsocketCommunicator."""
+
+    def setUp(self):
+        cache.clear()
+        self.alice = CustomUser.objects.create_user(username="alice", email="alice@example.com", password="pass")
+        self.bob = CustomUser.objects.create_user(username="bob", email="bob@example.com", password="pass")
+        self.conversation, _ = Conversation.objects.get_or_create_1on1(self.alice, self.bob)
+
+    def socket(self, user, path=None, query="", subprotocols=None):
+        from backend.asgi import application
+
+        path = path or f"/ws/conversations/{self.conversation.pk}/"
+        token = AccessToken.for_user(user)
+        return WebsocketCommunicator(application, f"{path}?token={token}{query}", subprotocols=subprotocols)
+
+    async def connect(self, user, **kwargs):
+        socket = self.socket(user, **kwargs)
+        connected, _ = await socket.connect()
+        self.assertTrue(connected)
+        return socket
+
+    async def receive_until(self, socket, frame_type, timeout=2):
+        """Frames up to and including the first one of `frame_type`."""
+        frames = []
+        while not frames or frames[-1].get("type") != frame_type:
+            frames.append(await socket.receive_json_from(timeout=timeout))
+        return frames
+
+
+class OutboundQueueTests(TestCase):
+    """Drop / close policy of the per-socket send queue and its counters."""
+
+    def test_drops_droppable_frames_then_overflows(self):
+        async def run():
+            on_overflow, on_error = mock.AsyncMock(), mock.AsyncMock()
+            before = queue_metrics()
+            queue = OutboundQueue(mock.AsyncMock(), on_overflow, on_error, maxsize=4)  # writer not started
+
+            self.assertTrue(queue.put({"text_data": "1"}))
+            self.assertTrue(queue.put({"text_data": "2"}))
+            # Half full: typing / progress frames are dropped, others still queue
+            self.assertFalse(queue.put({"text_data": "typing"}, droppable=True))
+            self.assertTrue(queue.put({"text_data": "3"}))
+            self.assertTrue(queue.put({"text_data": "4"}))
+
+            self.assertFalse(queue.put({"text_data": "5"}))
+            self.assertFalse(queue.put({"text_data": "6"}))
+            await asyncio.sleep(0)
+            on_overflow.assert_awaited_once()
+
+            after = queue_metrics()
+            self.assertEqual(after["dropped"] - before["dropped"], 1)
+            self.assertEqual(after["overflow_closes"] - before["overflow_closes"], 1)
+            self.assertGreaterEqual(after["high_water"], 4)
+            await queue.stop()
+
+        async_to_sync(run)()
+
+    def test_send_error_stops_writer_and_closes(self):
+        async def run():
+            send = mock.AsyncMock(side_effect=[None, RuntimeError("connection lost")])
+            on_error = mock.AsyncMock()
+            before = queue_metrics()["send_errors"]
+            queue = OutboundQueue(send, mock.AsyncMock(), on_error, maxsize=4)
+            queue.start()
+
+            queue.put({"text_data": "1"})
+            queue.put({"text_data": "2"})
+            await asyncio.sleep(0.05)
+
+            on_error.assert_awaited_once()
+            self.assertFalse(queue.put({"text_data": "3"}))
+            self.assertEqual(send.await_count, 2)
+            self.assertEqual(queue_metrics()["send_errors"] - before, 1)
+            await queue.stop()
+
+        async_to_sync(run)()
+
+    def test_metrics_endpoint(self):
+        url = reverse("chat-socket-metrics")
+        client = APIClient()
+        client.force_authenticate(CustomUser.objects.create_user(username="u", email="u@example.com", password="p"))
+        self.assertEqual(client.get(url).status_code, 403)
+
+        client.force_authenticate(CustomUser.objects.create_superuser(username="s", email="s@example.com", password="p"))
+        data = client.get(url).data
+        self.assertEqual(data, queue_metrics())
+        self.assertIn("send_errors", data)
+
+
+class SlowClientTests(ChatSocketTestCase):
+    @override_settings(CHAT_SEND_QUEUE_SIZE=2)
+    def test_full_queue_closes_with_resume_code(self):
+        async def run():
+            # No writer task: nothing leaves the queue, as with a stalled client
+            with mock.patch.object(OutboundQueue, "start"):
+                socket = await self.connect(self.alice)
+                layer = get_channel_layer()
+                for i in range(3):
+                    await layer.group_send(
+                        chat_group(self.conversation.pk), {"type": "chat_message", "frame": f'{{"n": {i}}}'}
+                    )
+                output = await socket.receive_output(timeout=2)
+                self.assertEqual(output, {"type": "websocket.close", "code": RESUME_CLOSE_CODE})
+                await socket.wait()
+
+        async_to_sync(run)()
+
+
+@override_settings(CHAT_TYPING_WINDOW=0.3, CHAT_TYPING_TIMEOUT=0.4, CHAT_READ_RECEIPT_WINDOW=0.3)
+class CoalescedEventTests(ChatSocketTestCase):
+    """Typing and read receipts are rate-limited per socket and conversation."""
+
+    def test_typing_burst_is_one_broadcast_then_stops(self):
+        async def run():
+            alice, bob = await self.connect(self.alice), await self.connect(self.bob)
+            for _ in range(10):
+                await alice.send_json_to({"type": "typing"})
+
+            frame = await bob.receive_json_from(timeout=1)
+            self.assertEqual((frame["type"], frame["is_typing"]), ("typing", True))
+            self.assertTrue(await bob.receive_nothing(0.2))
+
+            # No keystroke for CHAT_TYPING_TIMEOUT: the watchdog ends the session
+            frame = await bob.receive_json_from(timeout=1)
+            self.assertEqual((frame["type"], frame["is_typing"]), ("typing_stopped", False))
+            self.assertTrue(await bob.receive_nothing(0.5))
+            await alice.disconnect()
+            await bob.disconnect()
+
+        async_to_sync(run)()
+
+    def test_read_burst_is_one_trailing_write(self):
+        async def run():
+            with mock.patch.object(ChatConsumer, "mark_messages_as_read", mock.AsyncMock(return_value=1)) as mark:
+                alice, bob = await self.connect(self.alice), await self.connect(self.bob)
+                self.assertTrue(await bob.receive_nothing(0.1))  # connect marks read once
+                connect_writes = mark.await_count
+
+                for _ in range(5):
+                    await bob.send_json_to({"type": "mark_read"})
+                self.assertEqual((await alice.receive_json_from(timeout=1))["type"], "read_receipt")
+                self.assertEqual(mark.await_count - connect_writes, 1)
+
+                # The other four collapse into one write at the end of the window
+                self.assertEqual((await alice.receive_json_from(timeout=1))["type"], "read_receipt")
+                self.assertTrue(await alice.receive_nothing(0.5))
+                self.assertEqual(mark.await_count - connect_writes, 2)
+                await alice.disconnect()
+                await bob.disconnect()
+
+        async_to_sync(run)()
+
+
+class ChunkedUploadSocketTests(ChatSocketTestCase):
+    """upload_init / binary chunks / upload_finalize, uploaded in the background."""
+
+    def upload(self, socket, data, sha256=None):
+        async def run():
+            await socket.send_json_to({"type": "upload_init", "file_name": "notes.pdf", "file_size": len(data)})
+            ready = await socket.receive_json_from(timeout=2)
+            self.assertEqual(ready["type"], "upload_ready")
+            for start in range(0, len(data), ready["chunk_size"]):
+                await socket.send_to(bytes_data=data[start:start + ready["chunk_size"]])
+            await socket.send_json_to({
+                "type": "upload_finalize",
+                "upload_id": ready["upload_id"],
+                "sha256": sha256 or hashlib.sha256(data).hexdigest(),
+            })
+        return run()
+
+    @override_settings(CHAT_UPLOAD_CHUNK_SIZE=4)
+    def test_message_first_then_attachment_ready(self):
+        async def run():
+            socket = await self.connect(self.alice)
+            with mock.patch("cloudinary.uploader.upload_large", return_value={"secure_url": "https://cdn/notes.pdf"}):
+                await self.upload(socket, b"twelve bytes")
+                frames = await self.receive_until(socket, "attachment_ready", timeout=5)
+            await socket.disconnect()
+
+            # The bare message goes out before the upload, then again with its URL
+            self.assertEqual(frames[0]["upload_status"], Message.UploadStatus.PENDING)
+            self.assertIn("queued", [f.get("status") for f in frames if f.get("type") == "upload_progress"])
+            self.assertEqual(frames[-1]["message"]["upload_status"], Message.UploadStatus.READY)
+
+        async_to_sync(run)()
+        message = Message.objects.get()
+        self.assertEqual((message.upload_status, message.cloudinary_url), ("ready", "https://cdn/notes.pdf"))
+
+    @override_settings(CHAT_UPLOAD_CHUNK_SIZE=4)
+    def test_checksum_mismatch_is_rejected(self):
+        async def run():
+            socket = await self.connect(self.alice)
+            await self.upload(socket, b"twelve bytes", sha256="0" * 64)
+            frame = await socket.receive_json_from(timeout=2)
+            self.assertEqual(frame["type"], "upload_error")
+            await socket.disconnect()
+
+        async_to_sync(run)()
+        self.assertFalse(Message.objects.exists())
+
+
+class InboxSocketTests(ChatSocketTestCase):
+    """ws/inbox/: messages from every conversation, live events per subscription."""
+
+    def test_messages_arrive_without_subscribing(self):
+        async def run():
+            inbox = await self.connect(self.bob, path="/ws/inbox/")
+            chat = await self.connect(self.alice)
+            await chat.send_json_to({"text": "hi"})
+
+            frame = await inbox.receive_json_from(timeout=2)
+            self.assertEqual((frame["type"], frame["conversation_id"]), ("message", self.conversation.pk))
+            self.assertEqual(frame["message"]["text"], "hi")
+
+            # Sending through the inbox reaches the conversation socket
+            await inbox.send_json_to({"conversation_id": self.conversation.pk, "text": "hello"})
+            self.assertEqual((await chat.receive_json_from(timeout=2))["text"], "hi")
+            self.assertEqual((await chat.receive_json_from(timeout=2))["text"], "hello")
+            await inbox.disconnect()
+            await chat.disconnect()
+
+        async_to_sync(run)()
+
+    def test_typing_only_while_subscribed(self):
+        async def run():
+            inbox = await self.connect(self.bob, path="/ws/inbox/")
+            chat = await self.connect(self.alice)
+            await chat.send_json_to({"type": "typing"})
+            self.assertTrue(await inbox.receive_nothing(0.2))
+
+            await inbox.send_json_to({"type": "subscribe", "conversation_id": self.conversation.pk})
+            self.assertEqual((await inbox.receive_json_from(timeout=2))["type"], "subscribed")
+            await chat.send_json_to({"type": "typing_stopped"})
+            await chat.send_json_to({"type": "typing"})
+            frames = await self.receive_until(inbox, "typing")
+            self.assertEqual(frames[-1]["conversation_id"], self.conversation.pk)
+
+            await inbox.send_json_to({"type": "unsubscribe", "conversation_id": self.conversation.pk})
+            await self.receive_until(inbox, "unsubscribed")
+            await chat.send_json_to({"type": "typing_stopped"})
+            self.assertTrue(await inbox.receive_nothing(0.2))
+            await inbox.disconnect()
+            await chat.disconnect()
+
+        async_to_sync(run)()
+
+    def test_foreign_conversation_is_refused(self):
+        carol = CustomUser.objects.create_user(username="carol", email="carol@example.com", password="pass")
+        other, _ = Conversation.objects.get_or_create_1on1(self.alice, carol)
+
+        async def run():
+            inbox = await self.connect(self.bob, path="/ws/inbox/")
+            await inbox.send_json_to({"type": "subscribe", "conversation_id": other.pk})
+            frame = await inbox.receive_json_from(timeout=2)
+            self.assertEqual(frame, {"error": "Unknown conversation_id", "conversation_id": other.pk})
+            await inbox.disconnect()
+
+        async_to_sync(run)()
+
+
+class ReadWatermarkTests(APITestCase):
+    """is_read / read_at come from the recipient's read watermark."""
+
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(username="alice", email="alice@example.com", password="pass")
+        self.bob = CustomUser.objects.create_user(username="bob", email="bob@example.com", password="pass")
+        self.conversation, _ = Conversation.objects.get_or_create_1on1(self.alice, self.bob)
+        self.messages_url = reverse("message-list-create", args=[self.conversation.pk])
+
+    def read_states(self, user):
+        self.client.force_authenticate(user)
+        results = self.client.get(self.messages_url).data["results"]
+        return {m["id"]: (m["is_read"], m["read_at"] is not None) for m in results}
+
+    def test_mark_read_moves_the_watermark(self):
+        sent = [Message.objects.create_message(self.conversation, sender=self.alice, text=f"m{i}") for i in range(3)]
+        self.assertEqual(self.read_states(self.alice), {m.pk: (False, False) for m in sent})
+
+        self.client.force_authenticate(self.bob)
+        self.assertEqual(self.client.post(reverse("message-mark-read", args=[self.conversation.pk])).status_code, 200)
+        later = Message.objects.create_message(self.conversation, sender=self.alice, text="later")
+
+        states = self.read_states(self.alice)
+        self.assertEqual(states.pop(later.pk), (False, False))
+        self.assertEqual(states, {m.pk: (True, True) for m in sent})
+
+    def test_mark_read_reports_the_counter_it_reset(self):
+        for i in range(5):
+            Message.objects.create_message(self.conversation, sender=self.alice, text=f"m{i}")
+        url = reverse("message-mark-read", args=[self.conversation.pk])
+        self.client.force_authenticate(self.bob)
+
+        self.assertEqual(self.client.post(url).data["marked_read"], 5)
+        # Nothing new to read: nothing reported, no row written
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.post(url).data["marked_read"], 0)
+        self.assertFalse(any(q["sql"].startswith("UPDATE") for q in queries.captured_queries))
+
+
+class UnreadCounterTests(APITestCase):
+    """Stored per-participant unread counters and their backfill."""
+
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(username="alice", email="alice@example.com", password="pass")
+        self.bob = CustomUser.objects.create_user(username="bob", email="bob@example.com", password="pass")
+        self.conversation, _ = Conversation.objects.get_or_create_1on1(self.alice, self.bob)
+
+    def counts(self, user):
+        self.client.force_authenticate(user)
+        data = self.client.get(reverse("conversation-list")).data
+        return data[0]["unread_count"], data[0]["unread_sent_count"]
+
+    def test_counters_follow_sends_and_reads(self):
+        for i in range(3):
+            Message.objects.create_message(self.conversation, sender=self.alice, text=f"m{i}")
+        self.assertEqual(self.counts(self.bob), (3, 0))
+        self.assertEqual(self.counts(self.alice), (0, 3))
+
+        self.client.force_authenticate(self.bob)
+        self.client.post(reverse("message-mark-read", args=[self.conversation.pk]))
+        self.assertEqual(self.counts(self.bob), (0, 0))
+        self.assertEqual(self.counts(self.alice), (0, 0))
+
+    def test_inbox_query_count_independent_of_conversations(self):
+        def inbox_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse("conversation-list"))
+            return len(queries.captured_queries)
+
+        Message.objects.create_message(self.conversation, sender=self.bob, text="hi")
+        self.client.force_authenticate(self.alice)
+        few = inbox_queries()
+        for i in range(4):
+            other = CustomUser.objects.create_user(username=f"u{i}", email=f"u{i}@example.com", password="pass")
+            conversation, _ = Conversation.objects.get_or_create_1on1(self.alice, other)
+            Message.objects.create_message(conversation, sender=other, text="hi")
+        self.assertEqual(inbox_queries(), few)
+
+    def test_backfill_recomputes_from_watermarks(self):
+        for i in range(4):
+            Message.objects.create_message(self.conversation, sender=self.alice, text=f"m{i}")
+        Message.objects.create_message(self.conversation, sender=self.bob, text="reply")
+        Conversation.objects.filter(pk=self.conversation.pk).update(user1_unread_count=9, user2_unread_count=9)
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command("backfill_unread_counts", "--chunk-size=1", stdout=StringIO())
+        if connection.features.has_select_for_update:
+            self.assertTrue(any("FOR UPDATE" in q["sql"] for q in queries.captured_queries))
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.unread_count_for(self.bob.pk), 4)
+        self.assertEqual(self.conversation.unread_count_for(self.alice.pk), 1)
+
+
+class MessageHistoryPaginationTests(APITestCase):
+    """?before= / ?after= keyset pages of a conversation's history."""
+
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(username="alice", email="alice@example.com", password="pass")
+        self.bob = CustomUser.objects.create_user(username="bob", email="bob@example.com", password="pass")
+        self.conversation, _ = Conversation.objects.get_or_create_1on1(self.alice, self.bob)
+        self.ids = [
+            Message.objects.create_message(self.conversation, sender=self.alice, text=f"m{i}").pk
+            for i in range(7)
+        ]
+        self.url = reverse("message-list-create", args=[self.conversation.pk])
+        self.client.force_authenticate(self.bob)
+
+    def page(self, url, **params):
+        data = self.client.get(url, params).data
+        return [m["id"] for m in data["results"]], data
+
+    def test_walk_back_through_history(self):
+        seen = []
+        url, params = self.url, {"page_size": 3}
+        while url:
+            ids, data = self.page(url, **params)
+            seen += ids
+            url, params = data["next"], {}
+        self.assertEqual(seen, self.ids[::-1])
+
+    def test_after_returns_newer_page_newest_first(self):
+        ids, data = self.page(self.url, page_size=3, after=self.ids[0])
+        self.assertEqual(ids, self.ids[3:0:-1])
+        self.assertIsNotNone(data["next"])
+
+        ids, data = self.page(data["previous"])
+        self.assertEqual(ids, self.ids[6:3:-1])
+        self.assertIsNone(data["previous"])
+
+    def test_page_cost_independent_of_depth(self):
+        # The conversation, then the page (the anchor is resolved inside it)
+        with self.assertNumQueries(2):
+            self.client.get(self.url, {"page_size": 2})
+        with self.assertNumQueries(2):
+            self.client.get(self.url, {"page_size": 2, "before": self.ids[2]})
+
+
+class CatchUpTests(ChatSocketTestCase):
+    """Reconnecting with since_seq replays missed messages in seq order."""
+
+    def setUp(self):
+        super().setUp()
+        for i in range(5):
+            Message.objects.create_message(self.conversation, sender=self.alice, text=f"m{i}")
+
+    def test_conversation_socket_replays_after_seq(self):
+        async def run():
+            socket = await self.connect(self.bob, query="&since_seq=2")
+            frame = await socket.receive_json_from(timeout=2)
+            await socket.disconnect()
+
+            self.assertEqual(frame["type"], "catch_up")
+            self.assertEqual([m["seq"] for m in frame["messages"]], [3, 4, 5])
+            self.assertFalse(frame["has_more"])
+
+        async_to_sync(run)()
+
+    @override_settings(CHAT_CATCHUP_LIMIT=2)
+    def test_inbox_subscribe_pages_with_has_more(self):
+        async def run():
+            inbox = await self.connect(self.bob, path="/ws/inbox/")
+            seen = []
+            has_more = True
+            while has_more:
+                await inbox.send_json_to({
+                    "type": "subscribe",
+                    "conversation_id": self.conversation.pk,
+                    "since_seq": seen[-1] if seen else 0,
+                })
+                frame = (await self.receive_until(inbox, "catch_up"))[-1]
+                seen += [m["seq"] for m in frame["messages"]]
+                has_more = frame["has_more"]
+            await inbox.disconnect()
+
+            # Every message exactly once, in order
+            self.assertEqual(seen, [1, 2, 3, 4, 5])
+
+        async_to_sync(run)()
+
+
+class MsgpackSubprotocolTests(ChatSocketTestCase):
+    """Sockets that negotiate "msgpack" send and receive binary msgpack frames."""
+
+    def test_binary_frames_both_ways(self):
+        async def run():
+            inbox = self.socket(self.bob, path="/ws/inbox/", subprotocols=["msgpack", "json"])
+            connected, subprotocol = await inbox.connect()
+            self.assertTrue(connected)
+            self.assertEqual(subprotocol, "msgpack")
+            chat = await self.connect(self.alice)
+
+            await inbox.send_to(bytes_data=msgpack.packb(
+                {"type": "message", "conversation_id": self.conversation.pk, "text": "packed"}
+            ))
+            self.assertEqual((await chat.receive_json_from(timeout=2))["text"], "packed")
+            frame = msgpack.unpackb((await inbox.receive_output(timeout=2))["bytes"])
+            self.assertEqual((frame["type"], frame["message"]["text"]), ("message", "packed"))
+
+            await inbox.send_to(bytes_data=b"\xc1 not msgpack")
+            frame = msgpack.unpackb((await inbox.receive_output(timeout=2))["bytes"])
+            self.assertEqual(frame, {"error": "Invalid msgpack format"})
+            await inbox.disconnect()
+            await chat.disconnect()
+
+        async_to_sync(run)()
+
+    def test_json_stays_the_default(self):
+        async def run():
+            socket = self.socket(self.bob, subprotocols=["json"])
+            connected, subprotocol = await socket.connect()
+            self.assertEqual((connected, subprotocol), (True, "json"))
+            await socket.send_json_to({"text": "plain"})
+            self.assertEqual((await socket.receive_json_from(timeout=2))["text"], "plain")
+            await socket.disconnect()
+
+        async_to_sync(run)()
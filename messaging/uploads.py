@@ -0,0 +1,174 @@
+import base64
+import hashlib
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import cloudinary.uploader
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+
+# Attachment uploads run here instead of on the database_sync_to_async thread,
+# so a slow upload never delays other DB work. Sized independently of the
+# number of WebSocket workers.
+UPLOAD_EXECUTOR = ThreadPoolExecutor(
+    max_workers=getattr(settings, "CHAT_UPLOAD_WORKERS", 4),
+    thread_name_prefix="chat-upload",
+)
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp", ".svg")
+AUDIO_EXTS = (".mp3", ".m4a", ".wav", ".ogg", ".aac", ".flac")
+VIDEO_EXTS = (".mp4", ".mov", ".avi", ".mkv", ".webm")
+DOCUMENT_EXTS = (".pdf", ".doc", ".docx", ".txt", ".xls", ".xlsx", ".ppt", ".pptx")
+
+# Cloudinary resource type per attachment type (anything else is "raw")
+RESOURCE_TYPES = {"image": "image", "audio": "video", "video": "video"}
+
+# Smallest part Cloudinary's chunked upload accepts (except the last one)
+CLOUDINARY_MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class UploadError(ValueError):
+    """Raised when a chunked upload breaks the protocol or its size limits."""
+
+
+class ChunkedUpload:
+    """
+    Attachment received over the chat socket as a series of binary frames.
+
+    Protocol (one upload in flight per socket):
+      1) {"type": "upload_init", "file_name", "file_size", "file_type"?, "text"?}
+         -> server answers {"type": "upload_ready", "upload_id", "chunk_size"}
+      2) binary frames of at most `chunk_size` bytes, in order
+      3) {"type": "upload_finalize", "upload_id", "sha256": "<hex digest>"}
+         -> message is saved and broadcast like any other
+      (or {"type": "upload_abort", "upload_id"} to give up)
+
+    Chunks are spooled straight to a temp file and hashed as they arrive,
+    so only one chunk is ever held in memory regardless of the file size.
+    """
+
+    def __init__(self, file_name, file_size, file_type=None, text="", conversation_id=None):
+        self.chunk_size = getattr(settings, "CHAT_UPLOAD_CHUNK_SIZE", 64 * 1024)
+        max_size = getattr(settings, "CHAT_UPLOAD_MAX_SIZE", 25 * 1024 * 1024)
+
+        if not file_name:
+            raise UploadError("file_name is required")
+        try:
+            file_size = int(file_size)
+        except (TypeError, ValueError):
+            raise UploadError("file_size must be an integer")
+        if file_size <= 0:
+            raise UploadError("file_size must be positive")
+        if file_size > max_size:
+            raise UploadError(f"File too large (max {max_size} bytes)")
+
+        self.upload_id = uuid.uuid4().hex
+        self.conversation_id = conversation_id
+        self.file_name = file_name
+        self.file_size = file_size
+        self.file_type = file_type
+        self.text = text or ""
+        self.received = 0
+
+        self._digest = hashlib.sha256()
+        self._file = tempfile.TemporaryFile()
+
+    def write(self, chunk):
+        """Append one binary frame to the spool file."""
+        if len(chunk) > self.chunk_size:
+            raise UploadError(f"Chunk exceeds {self.chunk_size} bytes")
+        if self.received + len(chunk) > self.file_size:
+            raise UploadError("Received more data than declared file_size")
+
+        self._file.write(chunk)
+        self._digest.update(chunk)
+        self.received += len(chunk)
+
+    def finalize(self, sha256):
+        """
+        Check length and checksum, then return the spool file rewound to the
+        start so it can be handed to storage as-is.
+        """
+        if self.received != self.file_size:
+            raise UploadError(
+                f"Incomplete upload: got {self.received} of {self.file_size} bytes"
+            )
+        if not sha256 or sha256.lower() != self._digest.hexdigest():
+            raise UploadError("Checksum mismatch")
+
+        self._file.seek(0)
+        return self._file
+
+    def discard(self):
+        """Close (and thereby delete) the spool file."""
+        self._file.close()
+
+
+# ============================================================
+# ATTACHMENT HELPERS
+# ============================================================
+
+def attachment_name(file_name):
+    """Unique storage name for an uploaded attachment."""
+    return f"{uuid.uuid4().hex}_{file_name}"
+
+
+def infer_file_type(file_name):
+    """Map a file name to image / audio / video / document / file."""
+    lower = (file_name or "").lower()
+    if lower.endswith(IMAGE_EXTS):
+        return "image"
+    if lower.endswith(AUDIO_EXTS):
+        return "audio"
+    if lower.endswith(VIDEO_EXTS):
+        return "video"
+    if lower.endswith(DOCUMENT_EXTS):
+        return "document"
+    return "file"
+
+
+def decode_base64_attachment(file_base64, file_name):
+    """Decode a legacy `file_base64` payload (plain or data URI) into a ContentFile."""
+    try:
+        # Handle data URI format: "data:<mime>;base64,<data>"
+        if file_base64.startswith("data:"):
+            _header, file_base64 = file_base64.split(",", 1)
+        decoded = base64.b64decode(file_base64)
+    except Exception as e:
+        raise UploadError(f"Invalid file data: {e}")
+    return ContentFile(decoded, name=attachment_name(file_name))
+
+
+def upload_attachment(file_obj, file_name, file_type, on_progress=None):
+    """
+    Push an attachment to Cloudinary. Runs on UPLOAD_EXECUTOR.
+
+    The file is streamed with upload_large, one part at a time, so an
+    upload holds a single part in memory whatever its size. Parts are
+    CHAT_UPLOAD_PART_SIZE bytes (independent of the socket frame size),
+    raised to Cloudinary's minimum part size (every part but the last must
+    be at least CLOUDINARY_MIN_PART_SIZE).
+
+    Returns the Message fields to set once the upload is done:
+      - image       -> Cloudinary `image` resource
+      - audio/video -> Cloudinary `video` resource
+      - other       -> Cloudinary `raw` resource
+    all stored in cloudinary_url.
+    """
+    if on_progress:
+        on_progress("uploading")
+
+    part_size = max(getattr(settings, "CHAT_UPLOAD_PART_SIZE", CLOUDINARY_MIN_PART_SIZE), CLOUDINARY_MIN_PART_SIZE)
+    result = cloudinary.uploader.upload_large(
+        file_obj,
+        # Cloudinary treats audio under the video resource type; documents
+        # go up as raw so it won't try to validate them as images
+        resource_type=RESOURCE_TYPES.get(file_type, "raw"),
+        public_id=f"attachments/{attachment_name(file_name)}",
+        filename=file_name,
+        chunk_size=part_size,
+        overwrite=True,
+    )
+    return {"cloudinary_url": result.get("secure_url") or result.get("url")}
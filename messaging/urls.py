@@ -14,10 +14,16 @@ urlpatterns = [
         name="message-list-create",
     ),
 
+    # Message search (across the user's conversations, or one with ?conversation=)
+    path("messages/search/", views.MessageSearchView.as_view(), name="message-search"),
+
     # Mark messages as read
     path(
         "conversations/<int:conversation_id>/messages/mark-read/",
         views.MarkMessagesReadView.as_view(),
         name="message-mark-read",
     ),
+
+    # WebSocket send queue metrics (per worker)
+    path("chat/metrics/", views.ChatSocketMetricsView.as_view(), name="chat-socket-metrics"),
 ]
@@ -1,25 +1,105 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
-from rest_framework.exceptions import PermissionDenied
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ParseError, PermissionDenied
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 from rest_framework.views import APIView
 from django.db import models
-from django.utils import timezone
+from django.db.models import Q, Subquery
+from django.shortcuts import get_object_or_404
 
+from backend.pagination import KeysetPagination
+
+from .cache import user_conversation_ids
 from .models import Conversation, Message
+from .outbox import queue_metrics
 from .serializers import (
     ConversationSerializer,
     ConversationCreateSerializer,
     MessageSerializer,
+    MessageSearchResultSerializer,
 )
+from .search import search_messages
+
+
+class MessageKeysetPagination(KeysetPagination):
+    """
+    Keyset pagination for message history (load more style).
 
+      ?before=<message_id>  older messages than that one
+      ?after=<message_id>   newer messages than that one
+      (neither)             the latest page
 
-class StandardResultsSetPagination(PageNumberPagination):
-    """Pagination for messages (load more style)."""
-    page_size = 20
-    page_size_query_param = "page_size"
+    Pages are always returned newest first and are located with a range
+    condition on (created_at, id), which the (conversation, created_at)
+    index serves directly. There is no COUNT and no OFFSET, so page 500
+    costs the same as page 1.
+    """
     max_page_size = 100
 
+    def _anchor(self, request, param):
+        value = request.query_params.get(param)
+        if value is None:
+            return None
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        size = self.get_page_size(request)
+        before = self._anchor(request, "before")
+        after = self._anchor(request, "after")
+
+        if after is not None and before is None:
+            # created_at of the anchor is resolved inside the same query
+            anchor_ts = Subquery(
+                queryset.model.objects.filter(pk=after).values("created_at")[:1]
+            )
+            rows = list(
+                queryset.filter(Q(created_at__gt=anchor_ts) | Q(created_at=anchor_ts, id__gt=after))
+                .order_by("created_at", "id")[: size + 1]
+            )
+            self.has_newer = len(rows) > size
+            self.has_older = True
+            rows = rows[:size][::-1]
+        else:
+            if before is not None:
+                anchor_ts = Subquery(
+                    queryset.model.objects.filter(pk=before).values("created_at")[:1]
+                )
+                queryset = queryset.filter(
+                    Q(created_at__lt=anchor_ts) | Q(created_at=anchor_ts, id__lt=before)
+                )
+            rows = list(queryset.order_by("-created_at", "-id")[: size + 1])
+            self.has_older = len(rows) > size
+            self.has_newer = before is not None
+            rows = rows[:size]
+
+        self.page = rows
+        return rows
+
+    def get_next_link(self):
+        """Older page."""
+        if not self.page or not self.has_older:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), "after")
+        return replace_query_param(url, "before", self.page[-1].pk)
+
+    def get_previous_link(self):
+        """Newer page."""
+        if not self.page or not self.has_newer:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), "before")
+        return replace_query_param(url, "after", self.page[0].pk)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
 
 class ConversationListView(generics.ListCreateAPIView):
     """List user's conversations or create a new one."""
@@ -31,8 +111,6 @@ class ConversationListView(generics.ListCreateAPIView):
             models.Q(user1=user) | models.Q(user2=user)
         ).select_related(
             'user1', 'user2', 'last_message', 'last_message__sender'
-        ).prefetch_related(
-            'messages'  # For calculating unread counts
         ).order_by("-updated_at")
 
     def get_serializer_class(self):
@@ -72,7 +150,7 @@ class ConversationDetailView(generics.RetrieveAPIView):
     def get_queryset(self):
         return Conversation.objects.select_related(
             'user1', 'user2', 'last_message', 'last_message__sender'
-        ).prefetch_related('messages')
+        )
 
     def get_object(self):
         conversation = super().get_object()
@@ -86,24 +164,23 @@ class MessageListCreateView(generics.ListCreateAPIView):
     """List or send messages in a conversation."""
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = MessageSerializer
-    pagination_class = StandardResultsSetPagination
+    pagination_class = MessageKeysetPagination
 
     def get_conversation(self):
-        """Get conversation object and check permissions."""
-        conversation_id = self.kwargs["conversation_id"]
-        conversation = Conversation.objects.select_related(
-            'user1', 'user2'
-        ).get(pk=conversation_id)
-        user = self.request.user
-        if user not in [conversation.user1, conversation.user2]:
-            raise PermissionDenied("You are not a participant in this conversation.")
-        return conversation
+        """Get conversation object and check permissions (looked up once per request)."""
+        if not hasattr(self, "_conversation"):
+            conversation = get_object_or_404(Conversation, pk=self.kwargs["conversation_id"])
+            user = self.request.user
+            if user.id not in (conversation.user1_id, conversation.user2_id):
+                raise PermissionDenied("You are not a participant in this conversation.")
+            self._conversation = conversation
+        return self._conversation
 
     def get_queryset(self):
         conversation = self.get_conversation()
         return Message.objects.filter(
             conversation=conversation
-        ).select_related('sender').order_by("-created_at")
+        ).select_related('sender').order_by("-created_at", "-id")
 
     def get_serializer_context(self):
         """Pass conversation and request to serializer context."""
@@ -116,6 +193,45 @@ class MessageListCreateView(generics.ListCreateAPIView):
         serializer.save()
 
 
+class MessageSearchView(generics.ListAPIView):
+    """
+    Full-text search over the user's own conversations.
+
+    GET /api/messages/search/?q=words[&conversation=<id>][&before=<message_id>]
+
+    Matches messages containing every word of `q` using the database's text
+    index (see messaging.search), newest first, with keyset pagination like
+    the message history.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = MessageSearchResultSerializer
+    pagination_class = MessageKeysetPagination
+
+    def get_queryset(self):
+        query = (self.request.query_params.get("q") or "").strip()
+        if not query:
+            raise ParseError("Query parameter `q` is required.")
+
+        user = self.request.user
+        queryset = Message.objects.select_related("sender", "conversation")
+
+        conversation_id = self.request.query_params.get("conversation")
+        if conversation_id:
+            try:
+                conversation_id = int(conversation_id)
+            except ValueError:
+                raise ParseError("`conversation` must be a conversation id.")
+            if conversation_id not in user_conversation_ids(user.id):
+                raise PermissionDenied("You are not a participant in this conversation.")
+            queryset = queryset.filter(conversation_id=conversation_id)
+        else:
+            queryset = queryset.filter(
+                Q(conversation__user1=user) | Q(conversation__user2=user)
+            )
+
+        return search_messages(queryset, query)
+
+
 class MarkMessagesReadView(APIView):
     """Mark all unread messages in a conversation as read."""
     permission_classes = [permissions.IsAuthenticated]
@@ -135,22 +251,20 @@ class MarkMessagesReadView(APIView):
         if user not in [conversation.user1, conversation.user2]:
             raise PermissionDenied("You are not a participant in this conversation.")
 
-        # Only mark messages as read that:
-        # 1. Are in this conversation
-        # 2. Were NOT sent by the current user (received messages)
-        # 3. Are currently unread
-        updated = Message.objects.filter(
-            conversation=conversation,
-            is_read=False
-        ).exclude(sender=user).update(
-            is_read=True, 
-            read_at=timezone.now()
-        )
+        marked_read = Conversation.objects.mark_read(conversation.pk, user)
 
         return Response(
             {
-                "marked_read": updated,
+                "marked_read": marked_read,
                 "conversation_id": conversation_id
             }, 
             status=status.HTTP_200_OK
-        )
\ No newline at end of file
+        )
+
+
+class ChatSocketMetricsView(APIView):
+    """Send queue depth / drops of the chat sockets served by this worker (staff only)."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(queue_metrics())
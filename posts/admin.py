@@ -20,7 +20,7 @@ class CommentInline(admin.TabularInline):
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
-    list_display = ["id", "user", "content_snippet", "likes_count", "created_at"]
+    list_display = ["id", "user", "content_snippet", "likes_count", "comments_count", "created_at"]
     list_filter = ["created_at", "user"]
     search_fields = ["user__username", "content"]
     inlines = [PostImageInline, CommentInline]  # 🔥 include both images & comments inline
@@ -28,9 +28,6 @@ class PostAdmin(admin.ModelAdmin):
     def content_snippet(self, obj):
         return obj.content[:50]
 
-    def likes_count(self, obj):
-        return obj.likes.count()
-
 
 @admin.register(PostImage)
 class PostImageAdmin(admin.ModelAdmin):
@@ -0,0 +1,76 @@
+"""
+"Liked by the viewer" flags for posts and comments.
+
+Serializers ask is_liked(context, obj); answers are memoized in the
+serializer context. List serializers call prime_likes() first with every
+post and comment on the page, which resolves them all with one query over
+the two like tables (restricted to the viewer and to those ids), instead of
+prefetching every liker or running an EXISTS per object.
+"""
+from django.db.models import Value
+
+from comments.models import Comment
+from posts.models import Post
+from users.relations import viewer_of
+
+# Through tables: (post, customuser) and (comment, customuser)
+PostLike = Post.likes.through
+CommentLike = Comment.likes.through
+
+
+def _memo(context):
+    return context.setdefault("liked", {"post": {}, "comment": {}})
+
+
+def _kind(obj):
+    return "comment" if isinstance(obj, Comment) else "post"
+
+
+def prime_likes(context, posts=(), comments=()):
+    """Resolve the viewer's likes for all of `posts` and `comments` in one query."""
+    viewer = viewer_of(context)
+    if viewer is None:
+        return
+
+    memo = _memo(context)
+    post_ids = {post.pk for post in posts if post.pk not in memo["post"]}
+    comment_ids = {comment.pk for comment in comments if comment.pk not in memo["comment"]}
+
+    queries = []
+    if post_ids:
+        queries.append(
+            PostLike.objects.filter(customuser_id=viewer.pk, post_id__in=post_ids)
+            .annotate(kind=Value("post"))
+            .values_list("kind", "post_id")
+        )
+    if comment_ids:
+        queries.append(
+            CommentLike.objects.filter(customuser_id=viewer.pk, comment_id__in=comment_ids)
+            .annotate(kind=Value("comment"))
+            .values_list("kind", "comment_id")
+        )
+    if not queries:
+        return
+
+    query = queries[0].union(*queries[1:], all=True) if len(queries) > 1 else queries[0]
+    liked = set(query)
+
+    for pk in post_ids:
+        memo["post"][pk] = ("post", pk) in liked
+    for pk in comment_ids:
+        memo["comment"][pk] = ("comment", pk) in liked
+
+
+def is_liked(context, obj):
+    """Whether the request's user likes `obj` (a Post or a Comment)."""
+    if viewer_of(context) is None:
+        return False
+
+    kind = _kind(obj)
+    memo = _memo(context)[kind]
+    if obj.pk not in memo:
+        if kind == "post":
+            prime_likes(context, posts=[obj])
+        else:
+            prime_likes(context, comments=[obj])
+    return memo[obj.pk]
@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.timeline import fan_out_pending_posts
+
+
+class Command(BaseCommand):
+    help = (
+        "Write queued posts (authors above TIMELINE_INLINE_FANOUT followers) "
+        "into their followers' home timelines. Runs once, or every "
+        "--interval seconds with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Followers per bulk INSERT (default: 1000).",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=100,
+            help="Posts delivered per pass (default: 100).",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep delivering until interrupted.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=settings.TIMELINE_FANOUT_INTERVAL,
+            help="Seconds between passes with --loop (default: TIMELINE_FANOUT_INTERVAL).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            delivered = fan_out_pending_posts(limit=options["limit"], batch_size=options["batch_size"])
+            self.stdout.write(f"Fanned out {delivered} posts.")
+            if not options["loop"]:
+                break
+            if delivered < options["limit"]:
+                # Caught up; a full pass means more are waiting
+                time.sleep(options["interval"])
@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts.timeline import rebuild_timeline
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild home timelines (posts.TimelineEntry) from the follow graph: "
+        "every user's, or only the given users'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "users",
+            nargs="*",
+            help="Usernames to rebuild (default: all users).",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of users loaded per query (default: 500).",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        users = User.objects.order_by("pk")
+        if options["users"]:
+            users = users.filter(username__in=options["users"])
+
+        last_pk = 0
+        total = 0
+        entries = 0
+        while True:
+            chunk = list(users.filter(pk__gt=last_pk).values_list("pk", flat=True)[:chunk_size])
+            if not chunk:
+                break
+
+            for user_id in chunk:
+                entries += rebuild_timeline(user_id)
+
+            total += len(chunk)
+            last_pk = chunk[-1]
+            self.stdout.write(f"Rebuilt {total} timelines ({entries} entries so far)")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} timelines with {entries} entries."))
@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand
+
+from comments.models import Comment
+from posts.models import Post
+from users.models import CustomUser
+from users.relations import count_of
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the stored counters Post.likes_count / comments_count, "
+        "Comment.likes_count and CustomUser.follower_count / following_count "
+        "from the underlying rows, in chunks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of rows recomputed per query (default: 500).",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+
+        self.reconcile(Post, chunk_size, {
+            "likes_count": count_of(Post.likes.through, "post"),
+            "comments_count": count_of(Comment, "post"),
+        })
+        self.reconcile(Comment, chunk_size, {
+            "likes_count": count_of(Comment.likes.through, "comment"),
+        })
+        self.reconcile(CustomUser, chunk_size, {
+            "follower_count": count_of(CustomUser.followers.through, "from_customuser"),
+            "following_count": count_of(CustomUser.followers.through, "to_customuser"),
+        })
+
+    def reconcile(self, model, chunk_size, counters):
+        name = model._meta.verbose_name_plural
+        computed = {f"computed_{field}": expression for field, expression in counters.items()}
+
+        last_pk = 0
+        total = 0
+        fixed = 0
+        while True:
+            chunk = list(
+                model.objects.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .annotate(**computed)
+                .only("pk", *counters)[:chunk_size]
+            )
+            if not chunk:
+                break
+
+            changed = []
+            for obj in chunk:
+                stale = False
+                for field in counters:
+                    value = getattr(obj, f"computed_{field}")
+                    if getattr(obj, field) != value:
+                        setattr(obj, field, value)
+                        stale = True
+                if stale:
+                    changed.append(obj)
+
+            if changed:
+                model.objects.bulk_update(changed, list(counters))
+
+            total += len(chunk)
+            fixed += len(changed)
+            last_pk = chunk[-1].pk
+            self.stdout.write(f"Processed {total} {name} ({len(changed)} corrected in this chunk)")
+
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {total} {name}, {fixed} corrected."))
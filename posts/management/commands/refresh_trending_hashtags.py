@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.trending import refresh_leaderboard
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the trending hashtags leaderboard from the hourly usage "
+        "buckets. Runs once, or every --interval seconds with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep refreshing until interrupted.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=300,
+            help="Seconds between refreshes with --loop (default: 300).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            ranked = refresh_leaderboard()
+            self.stdout.write(f"Ranked {ranked} trending hashtags.")
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
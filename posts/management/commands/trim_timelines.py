@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts.timeline import overfull_timeline_owners, trim_timeline
+
+
+class Command(BaseCommand):
+    help = (
+        "Trim home timelines (posts.TimelineEntry) longer than "
+        "TIMELINE_MAX_LENGTH. Meant to run periodically (e.g. from cron)."
+    )
+
+    def handle(self, *args, **options):
+        users = 0
+        deleted = 0
+        for user_id in list(overfull_timeline_owners()):
+            deleted += trim_timeline(user_id)
+            users += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Trimmed {users} timelines, {deleted} entries removed."))
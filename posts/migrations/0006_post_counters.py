@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:59
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(n=Count("pk"))
+        .values("n")
+    ), 0)
+
+
+def backfill_counters(apps, schema_editor):
+    """One correlated UPDATE per counter instead of Count() joins per row."""
+    Post = apps.get_model("posts", "Post")
+    Comment = apps.get_model("comments", "Comment")
+    PostLike = Post._meta.get_field("likes").remote_field.through
+
+    Post.objects.update(
+        likes_count=_count(PostLike, "post"),
+        comments_count=_count(Comment, "post"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_home_timeline'),
+        ('comments', '0002_comment_parent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
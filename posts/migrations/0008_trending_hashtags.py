@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-17 04:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_post_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingHashtag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveIntegerField(unique=True)),
+                ('score', models.FloatField()),
+                ('uses', models.PositiveIntegerField(help_text='Links in the trending window (undecayed)')),
+                ('computed_at', models.DateTimeField()),
+                ('hashtag', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='trending', to='posts.hashtag')),
+            ],
+            options={
+                'ordering': ['rank'],
+            },
+        ),
+        migrations.CreateModel(
+            name='HashtagUsageBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('hashtag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_buckets', to='posts.hashtag')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['bucket_start'], name='posts_hasht_bucket__d95b13_idx')],
+                'constraints': [models.UniqueConstraint(fields=('hashtag', 'bucket_start'), name='unique_hashtag_bucket')],
+            },
+        ),
+    ]
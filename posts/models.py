@@ -1,9 +1,23 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.conf import settings
 import re
 
+from users.relations import toggle_membership
+
 User = settings.AUTH_USER_MODEL
 
+HASHTAG_RE = re.compile(r"#(\w+)")
+
+
+def normalize_hashtags(names):
+    """Lowercased, de-duplicated tag names, cut to Hashtag.name's length."""
+    return {name.strip().lstrip("#").lower()[:100] for name in names if name and name.strip().lstrip("#")}
+
+
+def extract_hashtags(text):
+    return normalize_hashtags(HASHTAG_RE.findall(text or ""))
+
 # -------------------------------
 # Hashtag model
 # -------------------------------
@@ -18,6 +32,40 @@ class Hashtag(models.Model):
         return f"#{self.name}"
 
 
+# -------------------------------
+# Trending hashtags (posts.trending)
+# -------------------------------
+class HashtagUsageBucket(models.Model):
+    """Number of times a hashtag was linked to a post during one hour."""
+    hashtag = models.ForeignKey(Hashtag, on_delete=models.CASCADE, related_name="usage_buckets")
+    bucket_start = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=["bucket_start"])]
+        constraints = [
+            models.UniqueConstraint(fields=["hashtag", "bucket_start"], name="unique_hashtag_bucket"),
+        ]
+
+    def __str__(self):
+        return f"#{self.hashtag_id} x{self.count} @ {self.bucket_start:%Y-%m-%d %H:00}"
+
+
+class TrendingHashtag(models.Model):
+    """The precomputed leaderboard, rewritten by posts.trending.refresh_leaderboard()."""
+    rank = models.PositiveIntegerField(unique=True)
+    hashtag = models.OneToOneField(Hashtag, on_delete=models.CASCADE, related_name="trending")
+    score = models.FloatField()
+    uses = models.PositiveIntegerField(help_text="Links in the trending window (undecayed)")
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ["rank"]
+
+    def __str__(self):
+        return f"{self.rank}. #{self.hashtag_id} ({self.score:.2f})"
+
+
 # -------------------------------
 # Post model
 # -------------------------------
@@ -29,26 +77,132 @@ class Post(models.Model):
     # Likes
     likes = models.ManyToManyField(User, blank=True, related_name="liked_posts")
 
+    # Stored counters, so lists need no aggregate joins. Kept in step by the
+    # like toggle and by Comment.save / Comment.delete;
+    # `manage.py reconcile_counters` recomputes them.
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+
     # Hashtags
     hashtags = models.ManyToManyField(Hashtag, blank=True, related_name="posts")
 
+    # Set when the author had more than TIMELINE_FANOUT_THRESHOLD followers
+    # at posting time: no timeline entries are written, home feeds pull the
+    # post from the author instead (see posts.timeline)
+    fan_out_on_read = models.BooleanField(default=False)
+    # Set while the post waits for `manage.py fan_out_posts` to write its
+    # followers' timeline entries (authors above TIMELINE_INLINE_FANOUT)
+    fan_out_pending = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the global and per-author feeds
+            models.Index(fields=["created_at", "id"], name="post_created_idx"),
+            models.Index(fields=["user", "created_at", "id"], name="post_user_created_idx"),
+            models.Index(
+                fields=["user", "-created_at"],
+                condition=models.Q(fan_out_on_read=True),
+                name="post_fan_out_on_read_idx",
+            ),
+            models.Index(
+                fields=["id"],
+                condition=models.Q(fan_out_pending=True),
+                name="post_fan_out_pending_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"Post {self.id} by {self.user.username}"
 
+    # content as loaded from / last indexed into the DB (see save())
+    _indexed_content = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if "content" in field_names:
+            instance._indexed_content = values[field_names.index("content")]
+        return instance
+
     def save(self, *args, **kwargs):
-        # Save post first
+        update_fields = kwargs.get("update_fields")
+        created = self._state.adding
+        reindex = (created or self.content != self._indexed_content) and (
+            update_fields is None or "content" in update_fields
+        )
+
         super().save(*args, **kwargs)
 
-        # Extract hashtags from content
-        hashtags_in_content = set(re.findall(r"#(\w+)", self.content))
+        # Re-link hashtags only when the text changed, as a diff
+        if reindex:
+            self.set_hashtags(extract_hashtags(self.content), unlinked=created)
+            self._indexed_content = self.content
+
+    def set_hashtags(self, names, unlinked=False):
+        """
+        Make the post's hashtags exactly `names`: missing Hashtag rows are
+        created with one bulk INSERT, then links are added and removed in
+        one statement each. `unlinked` skips reading the current links (a
+        post that was just inserted has none).
+        """
+        names = normalize_hashtags(names)
+        current = {} if unlinked else dict(self.hashtags.values_list("name", "id"))
+        stale = [pk for name, pk in current.items() if name not in names]
+        if stale:
+            self.hashtags.remove(*stale)
+        self._link_hashtags(names - current.keys())
+
+    def add_hashtags(self, names):
+        """Link `names` in addition to the post's current hashtags."""
+        names = normalize_hashtags(names)
+        linked = set(self.hashtags.filter(name__in=names).values_list("name", flat=True))
+        self._link_hashtags(names - linked)
+
+    def _link_hashtags(self, names):
+        if not names:
+            return
+        from posts import trending
+
+        Hashtag.objects.bulk_create([Hashtag(name=name) for name in names], ignore_conflicts=True)
+        hashtag_ids = list(Hashtag.objects.filter(name__in=names).values_list("id", flat=True))
+        self.hashtags.add(*hashtag_ids)
+        trending.record_usage(hashtag_ids)
+
+    def toggle_like(self, user):
+        """
+        Like the post as `user`, or unlike it if already liked (see
+        users.relations). Returns whether it is now liked; `likes_count` is
+        refreshed from the database.
+        """
+        with transaction.atomic():
+            liked, changed = toggle_membership(self.likes, user)
+            if changed:
+                Post.objects.filter(pk=self.pk).update(likes_count=F("likes_count") + (1 if liked else -1))
+            self.refresh_from_db(fields=["likes_count"])
+        return liked
+
+
+# -------------------------------
+# Home timeline entry (fan-out-on-write)
+# -------------------------------
+class TimelineEntry(models.Model):
+    """
+    One post in one user's home timeline. Written for every follower when
+    the post is created; `created_at` is a copy of the post's, so a page of
+    the timeline is read from this table alone.
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="timeline_entries")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="timeline_entries")
+    created_at = models.DateTimeField()
 
-        # Clear old hashtags (in case of edit)
-        self.hashtags.clear()
+    class Meta:
+        indexes = [models.Index(fields=["owner", "-created_at", "-post"])]
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "post"], name="unique_timeline_entry"),
+        ]
 
-        # Link hashtags
-        for tag_name in hashtags_in_content:
-            hashtag, created = Hashtag.objects.get_or_create(name=tag_name.lower())
-            self.hashtags.add(hashtag)
+    def __str__(self):
+        return f"Post {self.post_id} in timeline of user {self.owner_id}"
 
 
 # -------------------------------
@@ -0,0 +1,78 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from backend.pagination import KeysetPagination
+
+
+class PostCursorPagination(KeysetPagination):
+    """
+    Keyset pagination for post feeds (infinite scroll), newest first.
+
+      ?cursor=<opaque>   the page after the one that returned it in `next`
+      (no cursor)        the latest page
+
+    The cursor encodes the (created_at, id) of the last post shown and the
+    next page is located with a range condition on that pair, which the
+    (created_at, id) / (user, created_at, id) indexes serve directly. There
+    is no COUNT and no OFFSET, so page 500 costs the same as page 1.
+
+    Works for any model with `created_at`; comment threads use it with
+    newest_first = False.
+    """
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor."
+    newest_first = True
+
+    @staticmethod
+    def encode_cursor(obj):
+        raw = f"{obj.created_at.isoformat()}|{obj.pk}"
+        return urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def get_anchor(self, request):
+        """(created_at, id) from the request's cursor, or None for the first page."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)).decode()
+            created_at, pk = raw.rsplit("|", 1)
+            return datetime.fromisoformat(created_at), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        size = self.get_page_size(request)
+        anchor = self.get_anchor(request)
+        past = "lt" if self.newest_first else "gt"
+        if anchor is not None:
+            created_at, pk = anchor
+            queryset = queryset.filter(
+                Q(**{f"created_at__{past}": created_at}) | Q(created_at=created_at, **{f"id__{past}": pk})
+            )
+        ordering = ("-created_at", "-id") if self.newest_first else ("created_at", "id")
+        rows = list(queryset.order_by(*ordering)[: size + 1])
+        return self.set_page(request, rows[:size], len(rows) > size)
+
+    def set_page(self, request, page, has_next):
+        """Record a page fetched by the caller (e.g. the home feed's merge)."""
+        self.request = request
+        self.page = page
+        self.has_next = has_next
+        return page
+
+    def get_next_link(self):
+        if not self.page or not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "results": data,
+        })
@@ -1,9 +1,15 @@
 from rest_framework import serializers
+from rest_framework.utils.urls import replace_query_param
 from django.contrib.auth import get_user_model
+from django.urls import reverse
 
+from .likes import is_liked, prime_likes
 from .models import Post, PostImage, Hashtag
-from comments.serializers import CommentSerializer
-from users.serializers import UserSerializer  # ensure this serializer is lightweight for lists
+from comments.pagination import CommentCursorPagination
+from comments.serializers import CommentThreadSerializer
+from comments.tree import attach_reply_previews
+from users.relations import PrimedListSerializer
+from users.serializers import AuthorSerializer
 
 User = get_user_model()
 
@@ -29,12 +35,18 @@ class HashtagSerializer(serializers.ModelSerializer):
 # -------------------------------
 # Post Serializer used for list endpoints (lightweight)
 # -------------------------------
+class PostListListSerializer(PrimedListSerializer):
+    def prime(self, posts):
+        # One query for the viewer's likes on the whole page
+        prime_likes(self.context, posts=posts)
+
+
 class PostListSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
+    user = AuthorSerializer(read_only=True)
     images = PostImageSerializer(many=True, read_only=True)
     hashtags = HashtagSerializer(many=True, read_only=True)
 
-    # annotated fields (added in queryset) or fallback
+    # stored counters on Post
     likes_count = serializers.IntegerField(read_only=True)
     comments_count = serializers.IntegerField(read_only=True)
 
@@ -53,32 +65,59 @@ class PostListSerializer(serializers.ModelSerializer):
             "hashtags",
             "created_at",
         ]
+        list_serializer_class = PostListListSerializer
 
     def get_is_liked(self, obj):
-        request = self.context.get("request", None)
-        user = getattr(request, "user", None)
-        if not user or not user.is_authenticated:
-            return False
-
-        # Try to read prefetched likes (fast, no DB hit)
-        prefetched = getattr(obj, "_prefetched_objects_cache", {}).get("likes", None)
-        if prefetched is not None:
-            return any(u.id == user.id for u in prefetched)
-
-        # Fallback to DB hit (only when necessary)
-        return obj.likes.filter(id=user.id).exists()
+        return is_liked(self.context, obj)
 
 
 # -------------------------------
 # Post Serializer used for detail endpoint (includes comments)
 # -------------------------------
 class PostDetailSerializer(PostListSerializer):
-    comments = CommentSerializer(many=True, read_only=True)
+    """
+    A post with the first page of its top-level comments, each with a
+    preview of its replies, as PostCommentListCreateView lists them.
+    `comments.next` continues at that endpoint; the rest of a thread is
+    paged by CommentRepliesView.
+    """
+    comments = serializers.SerializerMethodField()
+
+    comment_page_size = 10
+    reply_preview_size = 3
 
     class Meta(PostListSerializer.Meta):
         # Keep all fields from list serializer and add comments
         fields = PostListSerializer.Meta.fields + ["comments"]
 
+    def to_representation(self, instance):
+        rows = list(
+            instance.comments.filter(parent__isnull=True)
+            .select_related("user")
+            .order_by("-created_at", "-id")[: self.comment_page_size + 1]
+        )
+        instance.comment_page = rows[: self.comment_page_size]
+        instance.has_more_comments = len(rows) > self.comment_page_size
+        replies = attach_reply_previews(instance.comment_page, self.reply_preview_size)
+
+        # The post and the embedded comments in one likes query
+        prime_likes(self.context, posts=[instance], comments=instance.comment_page + replies)
+        return super().to_representation(instance)
+
+    def get_comments(self, obj):
+        next_link = None
+        request = self.context.get("request")
+        if obj.has_more_comments and request is not None:
+            url = request.build_absolute_uri(reverse("post-comments", args=[obj.pk]))
+            next_link = replace_query_param(
+                url, CommentCursorPagination.cursor_query_param,
+                CommentCursorPagination.encode_cursor(obj.comment_page[-1]),
+            )
+        return {
+            "next": next_link,
+            "results": CommentThreadSerializer(obj.comment_page, many=True, context=self.context).data,
+        }
+
 
 # -------------------------------
 # Post Create Serializer (for writing)
@@ -110,10 +149,9 @@ class PostCreateSerializer(serializers.ModelSerializer):
         for image in images_data:
             PostImage.objects.create(post=post, image=image)
 
-        # Handle hashtags
-        for tag_name in hashtags_data:
-            hashtag, _created = Hashtag.objects.get_or_create(name=tag_name.lower())
-            post.hashtags.add(hashtag)
+        # Explicit hashtags, on top of the ones found in the content
+        if hashtags_data:
+            post.add_hashtags(hashtags_data)
 
         return post
 
@@ -121,7 +159,6 @@ class PostCreateSerializer(serializers.ModelSerializer):
 # -------------------------------
 # Compatibility alias
 # -------------------------------
-# Some code (e.g. search.views) still imports `PostSerializer`. Provide an alias
-# so existing imports keep working. Point it to the detail serializer so callers
-# get the richer representation.
+# Older imports of `PostSerializer` keep working. Point it to the detail
+# serializer so callers get the richer representation.
 PostSerializer = PostDetailSerializer
\ No newline at end of file
@@ -0,0 +1,51 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import m2m_changed, post_save, pre_delete
+from django.dispatch import receiver
+
+from posts import timeline
+from posts.models import Post
+
+User = get_user_model()
+
+
+# -------------------------------
+# Home timelines (posts.timeline)
+# -------------------------------
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(partial(timeline.fan_out_post, instance.pk))
+
+
+@receiver(m2m_changed, sender=User.followers.through)
+def update_timelines_on_follow(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    followed.followers.add(follower) -> instance is the followed user;
+    follower.following.add(followed) -> instance is the follower (reverse).
+    """
+    if action not in ("post_add", "post_remove") or not pk_set:
+        return
+    for other_id in pk_set:
+        follower_id, followed_id = (instance.pk, other_id) if reverse else (other_id, instance.pk)
+        if action == "post_add":
+            timeline.backfill_follow(follower_id, followed_id)
+        else:
+            timeline.remove_follow(follower_id, followed_id)
+
+
+# -------------------------------
+# Post.likes_count when a user is deleted
+# -------------------------------
+@receiver(pre_delete, sender=User)
+def drop_likes_of_deleted_user(sender, instance, **kwargs):
+    """
+    The user's like rows go by CASCADE, without m2m_changed. pre_delete runs
+    inside the delete's transaction: one UPDATE takes their like off every
+    post they liked.
+    """
+    Post.objects.filter(likes=instance).update(likes_count=Greatest(F("likes_count") - 1, 0))
@@ -1,3 +1,386 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from comments.models import Comment
+from notifications.models import Notification
+from posts import timeline, trending
+from posts.models import Hashtag, HashtagUsageBucket, Post, TimelineEntry
+from users.models import CustomUser
+
+
+class HomeTimelineTests(TestCase):
+    """Fan-out-on-write home feed (posts.timeline)."""
+
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(username="alice", email="alice@example.com", password="pass")
+        self.bob = CustomUser.objects.create_user(username="bob", email="bob@example.com", password="pass")
+        self.carol = CustomUser.objects.create_user(username="carol", email="carol@example.com", password="pass")
+        self.alice.toggle_follow(self.bob)
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def post(self, user, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Post.objects.create(user=user, content=content)
+
+    def feed(self, **params):
+        response = self.client.get(reverse("home-feed"), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_fan_out_to_followers_and_author(self):
+        post = self.post(self.bob, "hello")
+        self.post(self.carol, "not followed")
+
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(post=post).values_list("owner_id", flat=True)),
+            {self.alice.pk, self.bob.pk},
+        )
+        self.assertEqual([p["id"] for p in self.feed()["results"]], [post.pk])
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=0)
+    def test_large_accounts_are_pulled_on_read(self):
+        pulled = self.post(self.bob, "from a large account")
+        own = self.post(self.alice, "mine")
+
+        pulled.refresh_from_db()
+        self.assertTrue(pulled.fan_out_on_read)
+        self.assertFalse(TimelineEntry.objects.filter(post=pulled).exists())
+        self.assertEqual([p["id"] for p in self.feed()["results"]], [own.pk, pulled.pk])
+
+    def test_follow_and_unfollow(self):
+        post = self.post(self.carol, "before the follow")
+
+        self.carol.followers.add(self.alice)
+        self.assertIn(post.pk, [p["id"] for p in self.feed()["results"]])
+
+        self.alice.following.remove(self.carol)
+        self.assertNotIn(post.pk, [p["id"] for p in self.feed()["results"]])
+
+    def test_keyset_pages(self):
+        ids = [self.post(self.bob, f"post {i}").pk for i in range(5)]
+
+        page = self.feed(page_size=2)
+        self.assertEqual([p["id"] for p in page["results"]], ids[:-3:-1])
+        page = self.client.get(page["next"]).data
+        self.assertEqual([p["id"] for p in page["results"]], ids[-3:-5:-1])
+
+    @override_settings(TIMELINE_INLINE_FANOUT=0)
+    def test_large_fan_out_is_queued(self):
+        post = self.post(self.bob, "queued")
+
+        post.refresh_from_db()
+        self.assertTrue(post.fan_out_pending)
+        self.assertEqual(self.feed()["results"], [])
+
+        call_command("fan_out_posts", "--batch-size=1", stdout=StringIO())
+        post.refresh_from_db()
+        self.assertFalse(post.fan_out_pending)
+        self.assertEqual([p["id"] for p in self.feed()["results"]], [post.pk])
+
+    @override_settings(TIMELINE_MAX_LENGTH=3)
+    def test_trimmed_to_max_length(self):
+        ids = [self.post(self.bob, f"post {i}").pk for i in range(5)]
+        self.assertEqual(len(self.feed()["results"]), 5)  # reads never trim
+
+        call_command("trim_timelines", stdout=StringIO())
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(owner=self.alice).order_by("post_id").values_list("post_id", flat=True)),
+            ids[2:],
+        )
+
+    def test_rebuild(self):
+        post = self.post(self.bob, "hello")
+        TimelineEntry.objects.all().delete()
+
+        self.assertEqual(timeline.rebuild_timeline(self.alice.pk), 1)
+        self.assertEqual([p["id"] for p in self.feed()["results"]], [post.pk])
+
+
+class CounterTests(TestCase):
+    """Stored like / comment counters on Post and Comment."""
+
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(username="alice", email="alice@example.com", password="pass")
+        self.bob = CustomUser.objects.create_user(username="bob", email="bob@example.com", password="pass")
+        self.post = Post.objects.create(user=self.bob, content="hello")
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def test_like_toggles(self):
+        url = reverse("post-like-toggle", args=[self.post.pk])
+        self.assertEqual(self.client.post(url).data["likes_count"], 1)
+        self.assertEqual(self.client.post(url).data["likes_count"], 0)
+
+        comment = Comment.objects.create(user=self.bob, post=self.post, content="hi")
+        url = reverse("comment-like-toggle", args=[comment.pk])
+        self.assertEqual(self.client.post(url).data["likes_count"], 1)
+        comment.refresh_from_db()
+        self.assertEqual(comment.likes_count, 1)
+
+    def test_comment_create_and_delete(self):
+        response = self.client.post(reverse("post-comments", args=[self.post.pk]), {"content": "first"})
+        parent = Comment.objects.get(pk=response.data["id"])
+        Comment.objects.create(user=self.bob, post=self.post, content="reply", parent=parent)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+
+        parent.delete()  # the reply goes with it
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+
+    def test_reply_delete_counts_subtree(self):
+        root = Comment.objects.create(user=self.bob, post=self.post, content="root")
+        reply = Comment.objects.create(user=self.alice, post=self.post, content="reply", parent=root)
+        Comment.objects.create(user=self.bob, post=self.post, content="nested", parent=reply)
+
+        reply.delete()  # takes the nested reply with it
+        self.post.refresh_from_db()
+        root.refresh_from_db()
+        self.assertEqual((self.post.comments_count, root.reply_count), (1, 0))
+
+    def test_user_delete_recounts_other_posts(self):
+        carol = CustomUser.objects.create_user(username="carol", email="carol@example.com", password="pass")
+        root = Comment.objects.create(user=self.bob, post=self.post, content="root")
+        Comment.objects.create(user=carol, post=self.post, content="reply", parent=root)
+        mine = Comment.objects.create(user=carol, post=self.post, content="mine")
+        Comment.objects.create(user=self.alice, post=self.post, content="answer", parent=mine)
+        self.post.toggle_like(carol)
+        self.post.toggle_like(self.alice)
+        root.toggle_like(carol)
+
+        carol.delete()
+        self.post.refresh_from_db()
+        root.refresh_from_db()
+        self.assertEqual((self.post.comments_count, root.reply_count), (1, 0))
+        self.assertEqual((self.post.likes_count, root.likes_count), (1, 0))
+
+    def test_list_has_no_aggregate_joins(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("post-list"))
+        self.assertFalse(any("COUNT(DISTINCT" in q["sql"] for q in queries.captured_queries))
+
+    def test_reconcile(self):
+        self.post.likes.add(self.alice)
+        Comment.objects.create(user=self.bob, post=self.post, content="hi")
+        Post.objects.filter(pk=self.post.pk).update(likes_count=7, comments_count=0)
+
+        call_command("reconcile_counters", stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (1, 1))
+
+
+class ViewerLikedTests(TestCase):
+    """is_liked for a page of posts / comments comes from one batched query."""
+
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(username="alice", email="alice@example.com", password="pass")
+        self.bob = CustomUser.objects.create_user(username="bob", email="bob@example.com", password="pass")
+        self.posts = [Post.objects.create(user=self.bob, content=f"post {i}") for i in range(4)]
+        self.posts[1].likes.add(self.alice, self.bob)
+        self.posts[2].likes.add(self.bob)
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def test_post_page(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("post-list"))
+
+        liked = {p["id"]: p["is_liked"] for p in response.data["results"]}
+        self.assertEqual(liked, {p.pk: p == self.posts[1] for p in self.posts})
+        like_queries = [q for q in queries.captured_queries if "posts_post_likes" in q["sql"]]
+        self.assertEqual(len(like_queries), 1)
+
+    def test_post_detail_with_comments(self):
+        post = self.posts[0]
+        comments = [Comment.objects.create(user=self.bob, post=post, content=f"c{i}") for i in range(3)]
+        comments[2].likes.add(self.alice)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("post-detail", args=[post.pk]))
+
+        self.assertFalse(response.data["is_liked"])
+        self.assertEqual(
+            {c["id"]: c["is_liked"] for c in response.data["comments"]["results"]},
+            {c.pk: c == comments[2] for c in comments},
+        )
+        like_queries = [q for q in queries.captured_queries if "_likes" in q["sql"]]
+        self.assertEqual(len(like_queries), 1)
+
+    def test_anonymous_viewer(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().get(reverse("post-list"))
+        self.assertFalse(any(p["is_liked"] for p in response.data["results"]))
+        self.assertFalse(any("posts_post_likes" in q["sql"] for q in queries.captured_queries))
+
+
+class PostCursorPaginationTests(TestCase):
+    """Keyset (created_at, id) pagination of the post feeds."""
+
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(username="alice", email="alice@example.com", password="pass")
+        self.bob = CustomUser.objects.create_user(username="bob", email="bob@example.com", password="pass")
+        self.posts = [
+            Post.objects.create(user=self.alice if i % 2 else self.bob, content=f"#tag post {i}")
+            for i in range(7)
+        ]
+        self.client = APIClient()
+
+    def walk(self, url):
+        ids = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, {"page_size": 2} if not ids else None)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(any("COUNT(" in q["sql"] for q in queries.captured_queries))
+            ids += [p["id"] for p in response.data["results"]]
+            url = response.data["next"]
+        return ids
+
+    def test_post_list(self):
+        self.assertEqual(self.walk(reverse("post-list")), [p.pk for p in reversed(self.posts)])
+
+    def test_user_posts(self):
+        expected = [p.pk for p in reversed(self.posts) if p.user == self.alice]
+        self.assertEqual(self.walk(reverse("user-posts", args=["alice"])), expected)
+
+    def test_hashtag_posts(self):
+        self.assertEqual(self.walk(reverse("hashtag-posts", args=["tag"])), [p.pk for p in reversed(self.posts)])
+
+    def test_same_timestamp_ties(self):
+        Post.objects.update(created_at=self.posts[0].created_at)
+        self.assertEqual(self.walk(reverse("post-list")), [p.pk for p in reversed(self.posts)])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get(reverse("post-list"), {"cursor": "nope"}).status_code, 404)
+
+
+class HashtagIndexingTests(TestCase):
+    """Post.save links hashtags as a bulk diff, and only when content changed."""
+
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(username="alice", email="alice@example.com", password="pass")
+
+    def tags(self, post):
+        return set(post.hashtags.values_list("name", flat=True))
+
+    def test_create_is_constant_in_tag_count(self):
+        content = " ".join(f"#Tag{i}" for i in range(15))
+        # INSERT post, INSERT tags, SELECT tag ids, INSERT links,
+        # INSERT + UPDATE trending buckets
+        with self.assertNumQueries(6):
+            post = Post.objects.create(user=self.alice, content=content)
+        self.assertEqual(self.tags(post), {f"tag{i}" for i in range(15)})
+
+    def test_edit_applies_diff(self):
+        post = Post.objects.create(user=self.alice, content="#a #b #c")
+        tag_ids = dict(Hashtag.objects.values_list("name", "id"))
+
+        post.content = "#b #c #d"
+        post.save()
+
+        self.assertEqual(self.tags(post), {"b", "c", "d"})
+        self.assertEqual(Hashtag.objects.get(name="b").pk, tag_ids["b"])
+
+    def test_unchanged_content_is_not_reindexed(self):
+        post = Post.objects.create(user=self.alice, content="#a")
+        post = Post.objects.get(pk=post.pk)
+
+        with self.assertNumQueries(1):
+            post.save()
+        with self.assertNumQueries(1):
+            post.content = "#b"
+            post.save(update_fields=["fan_out_on_read"])
+
+    def test_explicit_tags_on_create(self):
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        response = client.post(reverse("post-create"), {"content": "#one", "hashtags": ["Two", "one"]})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.tags(Post.objects.get()), {"one", "two"})
+
+
+class TrendingHashtagTests(TestCase):
+    """Hourly usage buckets, decayed scoring and the leaderboard endpoint."""
+
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(username="alice", email="alice@example.com", password="pass")
+
+    def test_linking_counts_usage(self):
+        Post.objects.create(user=self.alice, content="#django #python")
+        post = Post.objects.create(user=self.alice, content="#django")
+        post.content = "#django #rust"  # only the new link counts
+        post.save()
+
+        counts = dict(HashtagUsageBucket.objects.values_list("hashtag__name", "count"))
+        self.assertEqual(counts, {"django": 2, "python": 1, "rust": 1})
+
+    def test_recent_usage_outranks_older_usage(self):
+        now = timezone.now()
+        old, new = Hashtag.objects.bulk_create([Hashtag(name="old"), Hashtag(name="new")])
+        for _ in range(3):
+            trending.record_usage([old.pk], when=now - timedelta(hours=12))
+        for _ in range(2):
+            trending.record_usage([new.pk], when=now)
+        trending.record_usage([old.pk], when=now - timedelta(hours=72))  # outside the window
+
+        self.assertEqual(trending.refresh_leaderboard(now), 2)
+
+        response = APIClient().get(reverse("trending-hashtags"), {"limit": 5})
+        self.assertEqual([t["name"] for t in response.data], ["new", "old"])
+        self.assertEqual(response.data[1]["uses"], 3)
+        self.assertAlmostEqual(response.data[1]["score"], 0.75, places=3)  # 3 uses, two half-lives
+        self.assertFalse(HashtagUsageBucket.objects.filter(bucket_start__lt=now - timedelta(hours=48)).exists())
+
+    def test_refresh_command(self):
+        Post.objects.create(user=self.alice, content="#django")
+        call_command("refresh_trending_hashtags", stdout=StringIO())
+        self.assertEqual([t.hashtag.name for t in trending.top_hashtags()], ["django"])
+
+
+class ToggleTests(TestCase):
+    """Like toggles write the through table without loading it."""
+
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(username="alice", email="alice@example.com", password="pass")
+        self.bob = CustomUser.objects.create_user(username="bob", email="bob@example.com", password="pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def queries_for(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(url)
+        return len(queries.captured_queries)
+
+    def test_cost_independent_of_existing_likes(self):
+        quiet = Post.objects.create(user=self.bob, content="quiet")
+        popular = Post.objects.create(user=self.bob, content="popular")
+        for i in range(20):
+            popular.likes.add(CustomUser.objects.create_user(
+                username=f"fan{i}", email=f"fan{i}@example.com", password="pass"
+            ))
+        Post.objects.filter(pk=popular.pk).update(likes_count=20)
+
+        self.assertEqual(
+            self.queries_for(reverse("post-like-toggle", args=[popular.pk])),
+            self.queries_for(reverse("post-like-toggle", args=[quiet.pk])),
+        )
+        popular.refresh_from_db()
+        self.assertEqual(popular.likes_count, 21)
+
+    def test_like_keeps_notifications(self):
+        post = Post.objects.create(user=self.bob, content="hello")
+        self.assertTrue(post.toggle_like(self.alice))
+        self.assertTrue(Notification.objects.filter(to_user=self.bob, notification_type="like").exists())
+
+        self.assertFalse(post.toggle_like(self.alice))
+        self.assertEqual(post.likes_count, 0)
+        self.assertFalse(post.likes.exists())
@@ -0,0 +1,219 @@
+"""
+Home timelines (fan-out-on-write).
+
+Creating a post writes one TimelineEntry per follower (and one for the
+author), so reading a home feed is a single indexed range scan over the
+reader's own entries instead of a join across everyone they follow.
+
+Authors above TIMELINE_FANOUT_THRESHOLD followers are the exception: their
+posts are flagged `fan_out_on_read` and each reader pulls them from the
+followed authors at read time, merged with the stored entries. Authors
+above TIMELINE_INLINE_FANOUT are fanned out by `manage.py fan_out_posts`
+rather than while the post is created. Timelines are trimmed to
+TIMELINE_MAX_LENGTH entries by `manage.py trim_timelines`; older history
+falls back to the author pages.
+"""
+import heapq
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Q
+
+from posts.models import Post, TimelineEntry
+
+User = get_user_model()
+
+# Through table of CustomUser.followers: (from_customuser = followed user,
+# to_customuser = follower)
+Follow = User.followers.through
+
+
+def _max_length():
+    return getattr(settings, "TIMELINE_MAX_LENGTH", 500)
+
+
+def _fanout_threshold():
+    return getattr(settings, "TIMELINE_FANOUT_THRESHOLD", 5000)
+
+
+def _inline_fanout():
+    return getattr(settings, "TIMELINE_INLINE_FANOUT", 100)
+
+
+def follower_ids(user_id):
+    return Follow.objects.filter(from_customuser_id=user_id).values_list("to_customuser_id", flat=True)
+
+
+def following_ids(user_id):
+    return Follow.objects.filter(to_customuser_id=user_id).values_list("from_customuser_id", flat=True)
+
+
+# ============================================================
+# WRITE PATH
+# ============================================================
+
+def fan_out_post(post_id, batch_size=1000):
+    """
+    Place a new post in its author's timeline, and in its followers' when
+    there are few of them. Run after the post's transaction commits
+    (posts.signals), so it stays cheap: the follower count is the author's
+    stored counter, and authors above TIMELINE_INLINE_FANOUT are queued for
+    `manage.py fan_out_posts` instead. Returns the number of timelines
+    written.
+    """
+    post = (
+        Post.objects.filter(pk=post_id)
+        .values("id", "user_id", "created_at", "user__follower_count")
+        .first()
+    )
+    if post is None:
+        return 0
+
+    followers = post["user__follower_count"]
+    if followers > _fanout_threshold():
+        # Readers (the author included) pull it instead
+        Post.objects.filter(pk=post_id).update(fan_out_on_read=True)
+        return 0
+
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(owner_id=post["user_id"], post_id=post_id, created_at=post["created_at"])],
+        ignore_conflicts=True,
+    )
+    if followers > _inline_fanout():
+        Post.objects.filter(pk=post_id).update(fan_out_pending=True)
+        return 1
+    return 1 + deliver_post(post_id, post["user_id"], post["created_at"], batch_size)
+
+
+def deliver_post(post_id, author_id, created_at, batch_size=1000):
+    """
+    Write the post into every follower's timeline, one page of the follow
+    table (keyset on its id) and one bulk INSERT per `batch_size` followers.
+    Safe to repeat. Returns the number of timelines written.
+    """
+    last_id = 0
+    written = 0
+    while True:
+        chunk = list(
+            Follow.objects.filter(from_customuser_id=author_id, id__gt=last_id)
+            .order_by("id")
+            .values_list("id", "to_customuser_id")[:batch_size]
+        )
+        if not chunk:
+            return written
+
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(owner_id=owner_id, post_id=post_id, created_at=created_at) for _, owner_id in chunk],
+            ignore_conflicts=True,
+        )
+        written += len(chunk)
+        last_id = chunk[-1][0]
+
+
+def fan_out_pending_posts(limit=100, batch_size=1000):
+    """Deliver up to `limit` queued posts, oldest first. Returns how many."""
+    posts = list(
+        Post.objects.filter(fan_out_pending=True)
+        .order_by("id")
+        .values_list("id", "user_id", "created_at")[:limit]
+    )
+    for post_id, author_id, created_at in posts:
+        deliver_post(post_id, author_id, created_at, batch_size)
+        Post.objects.filter(pk=post_id).update(fan_out_pending=False)
+    return len(posts)
+
+
+def backfill_follow(follower_id, followed_id, limit=50):
+    """Copy the followed user's recent posts into a new follower's timeline."""
+    posts = (
+        Post.objects.filter(user_id=followed_id, fan_out_on_read=False)
+        .order_by("-created_at", "-id")
+        .values_list("id", "created_at")[:limit]
+    )
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(owner_id=follower_id, post_id=pk, created_at=created_at) for pk, created_at in posts],
+        ignore_conflicts=True,
+    )
+
+
+def remove_follow(follower_id, followed_id):
+    TimelineEntry.objects.filter(owner_id=follower_id, post__user_id=followed_id).delete()
+
+
+def overfull_timeline_owners():
+    """Ids of users whose timeline is longer than TIMELINE_MAX_LENGTH."""
+    return (
+        TimelineEntry.objects.order_by()
+        .values("owner_id")
+        .annotate(entries=Count("id"))
+        .filter(entries__gt=_max_length())
+        .values_list("owner_id", flat=True)
+    )
+
+
+def trim_timeline(user_id):
+    """Drop entries past TIMELINE_MAX_LENGTH (two indexed queries at most)."""
+    max_length = _max_length()
+    cutoff = list(
+        TimelineEntry.objects.filter(owner_id=user_id)
+        .order_by("-created_at", "-post_id")
+        .values_list("created_at", "post_id")[max_length:max_length + 1]
+    )
+    if not cutoff:
+        return 0
+    created_at, post_id = cutoff[0]
+    deleted, _ = TimelineEntry.objects.filter(owner_id=user_id).filter(
+        Q(created_at__lt=created_at) | Q(created_at=created_at, post_id__lte=post_id)
+    ).delete()
+    return deleted
+
+
+def rebuild_timeline(user_id):
+    """Recreate a user's timeline from the follow graph. Returns its length."""
+    authors = list(following_ids(user_id)) + [user_id]
+    posts = (
+        Post.objects.filter(user_id__in=authors, fan_out_on_read=False)
+        .order_by("-created_at", "-id")
+        .values_list("id", "created_at")[:_max_length()]
+    )
+    entries = [TimelineEntry(owner_id=user_id, post_id=pk, created_at=created_at) for pk, created_at in posts]
+    with transaction.atomic():
+        TimelineEntry.objects.filter(owner_id=user_id).delete()
+        TimelineEntry.objects.bulk_create(entries)
+    return len(entries)
+
+
+# ============================================================
+# READ PATH
+# ============================================================
+
+def _before(queryset, created_at_field, id_field, anchor):
+    if anchor is None:
+        return queryset
+    created_at, pk = anchor
+    return queryset.filter(
+        Q(**{f"{created_at_field}__lt": created_at})
+        | Q(**{created_at_field: created_at, f"{id_field}__lt": pk})
+    )
+
+
+def home_feed_ids(user_id, size, before=None):
+    """
+    Post ids of one page of the home feed, newest first, and whether there
+    are more. `before` is the (created_at, id) of the last post already shown.
+    """
+    entries = _before(
+        TimelineEntry.objects.filter(owner_id=user_id), "created_at", "post_id", before
+    ).order_by("-created_at", "-post_id").values_list("created_at", "post_id")[:size + 1]
+
+    # Posts from followed accounts too large to fan out on write
+    pulled = _before(
+        Post.objects.filter(fan_out_on_read=True).filter(
+            Q(user_id__in=following_ids(user_id)) | Q(user_id=user_id)
+        ),
+        "created_at", "id", before,
+    ).order_by("-created_at", "-id").values_list("created_at", "id")[:size + 1]
+
+    page = [pk for _, pk in heapq.merge(list(entries), list(pulled), reverse=True)][:size + 1]
+    return page[:size], len(page) > size
@@ -0,0 +1,109 @@
+"""
+Trending hashtags.
+
+Every time Post.save links a hashtag, the tag's counter for the current
+hour (HashtagUsageBucket) is incremented, so usage is never recomputed by
+scanning posts_post_hashtags. Only TRENDING_WINDOW_HOURS of buckets are
+kept.
+
+refresh_leaderboard() (manage.py refresh_trending_hashtags, on a schedule)
+scores each tag as the sum of its hourly counts decayed exponentially by
+age, with a half-life of TRENDING_HALF_LIFE_HOURS, and stores the top
+TRENDING_SIZE in TrendingHashtag. Reads take the first K rows of that
+table.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Sum, Value, When
+from django.utils import timezone
+
+from posts.models import HashtagUsageBucket, TrendingHashtag
+
+
+def _window_hours():
+    return getattr(settings, "TRENDING_WINDOW_HOURS", 48)
+
+
+def _half_life_hours():
+    return getattr(settings, "TRENDING_HALF_LIFE_HOURS", 6)
+
+
+def _size():
+    return getattr(settings, "TRENDING_SIZE", 50)
+
+
+def bucket_start(when):
+    return when.replace(minute=0, second=0, microsecond=0)
+
+
+# ============================================================
+# COUNTERS
+# ============================================================
+
+def record_usage(hashtag_ids, when=None):
+    """Count one use of each hashtag in the current hour (two queries)."""
+    if not hashtag_ids:
+        return
+    start = bucket_start(when or timezone.now())
+    HashtagUsageBucket.objects.bulk_create(
+        [HashtagUsageBucket(hashtag_id=pk, bucket_start=start) for pk in hashtag_ids],
+        ignore_conflicts=True,
+    )
+    HashtagUsageBucket.objects.filter(hashtag_id__in=hashtag_ids, bucket_start=start).update(
+        count=F("count") + 1
+    )
+
+
+# ============================================================
+# LEADERBOARD
+# ============================================================
+
+def refresh_leaderboard(now=None):
+    """
+    Recompute the top TRENDING_SIZE tags from the buckets in the window and
+    replace the leaderboard; buckets older than the window are deleted.
+    Returns the number of tags ranked.
+    """
+    now = now or timezone.now()
+    current = bucket_start(now)
+    hours = _window_hours()
+    cutoff = current - timedelta(hours=hours - 1)
+
+    # Decay weight per bucket, by age in hours: 0.5 ** (age / half-life)
+    weight = Case(
+        *[
+            When(bucket_start=current - timedelta(hours=age), then=Value(0.5 ** (age / _half_life_hours())))
+            for age in range(hours)
+        ],
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+    top = list(
+        HashtagUsageBucket.objects.filter(bucket_start__gte=cutoff)
+        .values("hashtag_id")
+        .annotate(score=Sum(F("count") * weight, output_field=FloatField()), uses=Sum("count"))
+        .filter(uses__gt=0)
+        .order_by("-score", "hashtag_id")[:_size()]
+    )
+
+    with transaction.atomic():
+        TrendingHashtag.objects.all().delete()
+        TrendingHashtag.objects.bulk_create([
+            TrendingHashtag(
+                rank=rank,
+                hashtag_id=row["hashtag_id"],
+                score=row["score"],
+                uses=row["uses"],
+                computed_at=now,
+            )
+            for rank, row in enumerate(top, start=1)
+        ])
+        HashtagUsageBucket.objects.filter(bucket_start__lt=cutoff).delete()
+    return len(top)
+
+
+def top_hashtags(limit=10):
+    """The first `limit` entries of the leaderboard, with their hashtags."""
+    return list(TrendingHashtag.objects.select_related("hashtag").order_by("rank")[:limit])
@@ -1,18 +1,23 @@
 from django.urls import path
 from .views import (
     PostListView,
+    HomeFeedView,
     PostDetailView,
     PostCreateView,
     PostLikeToggleView,
     PostDeleteView,
     UserPostsView,
-    HashtagPostsView,  
+    HashtagPostsView,
+    TrendingHashtagsView,
 )
 
 urlpatterns = [
     # List all posts (feed)
     path("", PostListView.as_view(), name="post-list"),
 
+    # Home feed (posts by the user and the accounts they follow)
+    path("feed/", HomeFeedView.as_view(), name="home-feed"),
+
     # Get all posts by a specific user
     path("users/<str:username>/posts/", UserPostsView.as_view(), name="user-posts"),
 
@@ -28,6 +33,9 @@ urlpatterns = [
     # Delete a post
     path("<int:pk>/delete/", PostDeleteView.as_view(), name="post-delete"),
 
+    # Trending hashtags
+    path("hashtags/trending/", TrendingHashtagsView.as_view(), name="trending-hashtags"),
+
     # 🔹 Get all posts for a specific hashtag
     path("hashtags/<str:name>/posts/", HashtagPostsView.as_view(), name="hashtag-posts"),
 ]
@@ -1,15 +1,15 @@
 from django.shortcuts import get_object_or_404
-from django.db.models import Count, Prefetch
 from django.contrib.auth import get_user_model
 
 from rest_framework import generics
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.exceptions import PermissionDenied
 
+from . import timeline, trending
 from .models import Post, Hashtag
+from .pagination import PostCursorPagination
 from .serializers import (
     PostListSerializer,
     PostDetailSerializer,
@@ -19,18 +19,12 @@ from .serializers import (
 User = get_user_model()
 
 
-class StandardResultsSetPagination(PageNumberPagination):
-    page_size = 20
-    page_size_query_param = "page_size"
-    max_page_size = 50
-
-
 # -------------------------------
 # List all posts (feed) -- optimized
 # -------------------------------
 class PostListView(generics.ListAPIView):
     serializer_class = PostListSerializer
-    pagination_class = StandardResultsSetPagination
+    pagination_class = PostCursorPagination
 
     def get_queryset(self):
         qs = (
@@ -38,13 +32,7 @@ class PostListView(generics.ListAPIView):
             .prefetch_related(
                 "images",                # reverse FK to PostImage
                 "hashtags",              # M2M
-                Prefetch("likes", queryset=User.objects.only("id")),  # prefetch minimal user fields
             )
-            .annotate(
-                likes_count=Count("likes", distinct=True),
-                comments_count=Count("comments", distinct=True),
-            )
-            .order_by("-created_at")
         )
         return qs
 
@@ -55,10 +43,18 @@ class PostListView(generics.ListAPIView):
 
 
 # -------------------------------
-# Retrieve a single post (detail) - prefetch comments for the detail view
+# Home feed: the user's and followed accounts' posts (posts.timeline)
 # -------------------------------
-class PostDetailView(generics.RetrieveAPIView):
-    serializer_class = PostDetailSerializer
+class HomeFeedView(generics.ListAPIView):
+    """
+    GET /api/posts/feed/?cursor=<opaque>&page_size=20
+
+    Posts by the user and the accounts they follow, newest first, paginated
+    like the other post feeds.
+    """
+    serializer_class = PostListSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = PostCursorPagination
 
     def get_queryset(self):
         return (
@@ -66,15 +62,30 @@ class PostDetailView(generics.RetrieveAPIView):
             .prefetch_related(
                 "images",
                 "hashtags",
-                Prefetch("likes", queryset=User.objects.only("id")),
-                Prefetch("comments__user"),  # prefetch comment user for serializer
-            )
-            .annotate(
-                likes_count=Count("likes", distinct=True),
-                comments_count=Count("comments", distinct=True),
             )
         )
 
+    def list(self, request, *args, **kwargs):
+        paginator = self.paginator
+        anchor = paginator.get_anchor(request)
+        ids, has_more = timeline.home_feed_ids(request.user.id, paginator.get_page_size(request), anchor)
+        posts = self.get_queryset().in_bulk(ids)
+        page = paginator.set_page(request, [posts[pk] for pk in ids if pk in posts], has_more)
+        return paginator.get_paginated_response(self.get_serializer(page, many=True).data)
+
+
+# -------------------------------
+# Retrieve a single post (detail) with its first page of comments
+# -------------------------------
+class PostDetailView(generics.RetrieveAPIView):
+    serializer_class = PostDetailSerializer
+
+    def get_queryset(self):
+        return (
+            Post.objects.select_related("user")
+            .prefetch_related("images", "hashtags")
+        )
+
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context["request"] = self.request
@@ -102,17 +113,9 @@ class PostLikeToggleView(APIView):
 
     def post(self, request, post_id):
         post = get_object_or_404(Post, id=post_id)
-        user = request.user
-
-        if user in post.likes.all():
-            post.likes.remove(user)
-            action = "unliked"
-        else:
-            post.likes.add(user)
-            action = "liked"
-
+        action = "liked" if post.toggle_like(request.user) else "unliked"
         return Response(
-            {"detail": f"Post successfully {action}.", "likes_count": post.likes.count()}
+            {"detail": f"Post successfully {action}.", "likes_count": post.likes_count}
         )
 
 
@@ -134,7 +137,7 @@ class PostDeleteView(generics.DestroyAPIView):
 # -------------------------------
 class UserPostsView(generics.ListAPIView):
     serializer_class = PostListSerializer
-    pagination_class = StandardResultsSetPagination
+    pagination_class = PostCursorPagination
 
     def get_queryset(self):
         username = self.kwargs.get("username")
@@ -144,13 +147,7 @@ class UserPostsView(generics.ListAPIView):
             .prefetch_related(
                 "images",
                 "hashtags",
-                Prefetch("likes", queryset=User.objects.only("id")),
-            )
-            .annotate(
-                likes_count=Count("likes", distinct=True),
-                comments_count=Count("comments", distinct=True),
             )
-            .order_by("-created_at")
         )
 
     def get_serializer_context(self):
@@ -164,7 +161,7 @@ class UserPostsView(generics.ListAPIView):
 # -------------------------------
 class HashtagPostsView(generics.ListAPIView):
     serializer_class = PostListSerializer
-    pagination_class = StandardResultsSetPagination
+    pagination_class = PostCursorPagination
 
     def get_queryset(self):
         hashtag_name = self.kwargs.get("name").lower()
@@ -174,16 +171,35 @@ class HashtagPostsView(generics.ListAPIView):
             .select_related("user")
             .prefetch_related(
                 "images",
-                Prefetch("likes", queryset=User.objects.only("id")),
             )
-            .annotate(
-                likes_count=Count("likes", distinct=True),
-                comments_count=Count("comments", distinct=True),
-            )
-            .order_by("-created_at")
         )
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context["request"] = self.request
-        return context
\ No newline at end of file
+        return context
+
+# -------------------------------
+# Trending hashtags (precomputed leaderboard, see posts.trending)
+# -------------------------------
+class TrendingHashtagsView(APIView):
+    """GET /api/posts/hashtags/trending/?limit=10"""
+    max_limit = 50
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get("limit", 10))
+        except (TypeError, ValueError):
+            limit = 10
+        limit = max(1, min(limit, self.max_limit))
+
+        return Response([
+            {
+                "id": entry.hashtag_id,
+                "name": entry.hashtag.name,
+                "rank": entry.rank,
+                "score": round(entry.score, 3),
+                "uses": entry.uses,
+            }
+            for entry in trending.top_hashtags(limit)
+        ])
@@ -1,3 +1,37 @@
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from comments.models import Comment
+from posts.models import Post
+from users.models import CustomUser
+
+
+class PostSearchTests(TestCase):
+    """Post results are list-shaped: no comment trees, no likers."""
+
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(username="alice", email="alice@example.com", password="pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def search(self):
+        response = self.client.get(reverse("search"), {"q": "needle"})
+        self.assertEqual(response.status_code, 200)
+        return response.data["results"]["posts"]
+
+    def test_query_count_independent_of_comments(self):
+        post = Post.objects.create(user=self.alice, content="needle")
+        post.likes.add(self.alice)
+        # post count, posts, images, hashtags, users, the viewer's likes
+        with self.assertNumQueries(6):
+            self.search()
+
+        for i in range(3):
+            other = Post.objects.create(user=self.alice, content=f"needle {i}")
+            Comment.objects.create(user=self.alice, post=other, content="hi")
+        with self.assertNumQueries(6):
+            results = self.search()
+
+        self.assertNotIn("comments", results[0])
+        self.assertEqual([p["is_liked"] for p in results], [False, False, False, True])
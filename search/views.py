@@ -8,7 +8,7 @@ from rest_framework.permissions import AllowAny
 from rest_framework.pagination import PageNumberPagination
 
 from posts.models import Post
-from posts.serializers import PostSerializer
+from posts.serializers import PostListSerializer
 from users.serializers import UserSerializer
 
 User = get_user_model()
@@ -70,7 +70,7 @@ class SearchView(APIView):
         posts_qs = (
             Post.objects.filter(post_filter)
             .select_related("user")
-            .prefetch_related("images", "likes")
+            .prefetch_related("images", "hashtags")
             .distinct()
             .order_by("-created_at")
         )
@@ -81,7 +81,7 @@ class SearchView(APIView):
 
         context = {"request": request}
         users_data = UserSerializer(users_qs, many=True, context=context).data
-        posts_data = PostSerializer(paginated_posts, many=True, context=context).data
+        posts_data = PostListSerializer(paginated_posts, many=True, context=context).data
 
         # Return DRF paginated response for posts,
         # but also include the users list & query string.
@@ -0,0 +1,65 @@
+"""
+Follow graph reads.
+
+Follower / following lists are pages over the follow table itself, newest
+follow first, located with the (user, id) indexes created in migration
+users.0008, so a page costs the same for an account with ten followers or
+a million. "Does the viewer follow X" is answered with the unique
+(followed, follower) index: serializers ask is_following(context, user),
+and list serializers call prime_following() first with every user on the
+page (one query), memoized in the serializer context.
+"""
+from .models import CustomUser
+from .relations import viewer_of
+
+# Through table of CustomUser.followers: (from_customuser = followed user,
+# to_customuser = follower)
+Follow = CustomUser.followers.through
+
+
+def followers_of(user_id):
+    """Follow rows of `user_id`'s followers, newest first, with the follower loaded."""
+    return (
+        Follow.objects.filter(from_customuser_id=user_id)
+        .select_related("to_customuser")
+        .order_by("-id")
+    )
+
+
+def following_of(user_id):
+    """Follow rows of the accounts `user_id` follows, newest first, with them loaded."""
+    return (
+        Follow.objects.filter(to_customuser_id=user_id)
+        .select_related("from_customuser")
+        .order_by("-id")
+    )
+
+
+def prime_following(context, users):
+    """Resolve whether the viewer follows each of `users` in one query."""
+    viewer = viewer_of(context)
+    if viewer is None:
+        return
+
+    memo = context.setdefault("following", {})
+    ids = {user.pk for user in users if user.pk not in memo}
+    if not ids:
+        return
+
+    followed = set(
+        Follow.objects.filter(to_customuser_id=viewer.pk, from_customuser_id__in=ids)
+        .values_list("from_customuser_id", flat=True)
+    )
+    for pk in ids:
+        memo[pk] = pk in followed
+
+
+def is_following(context, user):
+    """Whether the request's user follows `user`."""
+    if viewer_of(context) is None:
+        return False
+
+    memo = context.setdefault("following", {})
+    if user.pk not in memo:
+        prime_following(context, [user])
+    return memo[user.pk]
@@ -0,0 +1,46 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from users.presence import flush_presence, get_store
+
+
+class Command(BaseCommand):
+    help = (
+        "Write last_seen / is_online from the Redis presence store to the "
+        "users table. Runs once, or every --interval seconds with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Rows per bulk UPDATE (default: 500).",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep flushing until interrupted.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=settings.PRESENCE_FLUSH_INTERVAL,
+            help="Seconds between flushes with --loop (default: PRESENCE_FLUSH_INTERVAL).",
+        )
+
+    def handle(self, *args, **options):
+        if get_store().in_process:
+            raise CommandError(
+                "PRESENCE_BACKEND is 'memory': the presence store lives in the "
+                "server process, which flushes it itself. This command needs "
+                "PRESENCE_BACKEND='redis' (set REDIS_URL)."
+            )
+        while True:
+            flushed = flush_presence(batch_size=options["batch_size"])
+            self.stdout.write(f"Flushed presence for {flushed} users.")
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
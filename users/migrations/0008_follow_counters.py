@@ -0,0 +1,60 @@
+# Generated by Django 5.2.7 on 2026-10-17 04:20
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(n=Count("pk"))
+        .values("n")
+    ), 0)
+
+
+def backfill_counters(apps, schema_editor):
+    CustomUser = apps.get_model("users", "CustomUser")
+    Follow = CustomUser._meta.get_field("followers").remote_field.through
+
+    CustomUser.objects.update(
+        follower_count=_count(Follow, "from_customuser"),
+        following_count=_count(Follow, "to_customuser"),
+    )
+
+
+# Follower / following pages walk the auto-created through table by
+# (user, id); its own indexes are on (followed, follower) and single columns
+FOLLOW_INDEXES = [
+    ("users_follow_followed_idx", "from_customuser_id"),
+    ("users_follow_follower_idx", "to_customuser_id"),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_customuser_is_online_customuser_last_seen'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='follower_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ] + [
+        migrations.RunSQL(
+            f'CREATE INDEX {name} ON "users_customuser_followers" ("{column}", "id")',
+            f"DROP INDEX {name}",
+        )
+        for name, column in FOLLOW_INDEXES
+    ]
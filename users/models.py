@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, When
 from django.utils import timezone
 from datetime import timedelta
 import random
@@ -7,6 +8,8 @@ import string
 from django.contrib.auth.hashers import make_password, check_password
 import re
 
+from .relations import toggle_membership
+
 
 class CustomUser(AbstractUser):
     """
@@ -34,6 +37,10 @@ class CustomUser(AbstractUser):
         related_name="following",
         blank=True
     )
+    # Stored counters, kept by toggle_follow (manage.py reconcile_counters
+    # repairs them)
+    follower_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
 
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -69,6 +76,40 @@ class CustomUser(AbstractUser):
         self.last_seen = timezone.now()
         self.save(update_fields=["last_seen"])
 
+    # ---------------------------------------------
+    # Follow methods
+    # ---------------------------------------------
+    def toggle_follow(self, user):
+        """
+        Follow `user`, or unfollow if already following. Returns whether now
+        following; both users' counters move in one UPDATE and
+        `user.follower_count` is refreshed.
+        """
+        with transaction.atomic():
+            following, changed = toggle_membership(user.followers, self)
+            if changed:
+                delta = 1 if following else -1
+                CustomUser.objects.filter(pk__in=[self.pk, user.pk]).update(
+                    follower_count=Case(
+                        When(pk=user.pk, then=F("follower_count") + delta),
+                        default=F("follower_count"),
+                        output_field=models.IntegerField(),
+                    ),
+                    following_count=Case(
+                        When(pk=self.pk, then=F("following_count") + delta),
+                        default=F("following_count"),
+                        output_field=models.IntegerField(),
+                    ),
+                )
+            user.refresh_from_db(fields=["follower_count"])
+        return following
+
+    def is_following(self, user):
+        """Whether this user follows `user` (one lookup on the follow index)."""
+        return CustomUser.followers.through.objects.filter(
+            from_customuser_id=user.pk, to_customuser_id=self.pk
+        ).exists()
+
     # ---------------------------------------------
     # Password reset methods
     # ---------------------------------------------
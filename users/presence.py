@@ -0,0 +1,286 @@
+"""
+Presence: who is online and when each user was last seen.
+
+Heartbeats (authenticated HTTP requests, WebSocket frames) and socket
+connect / disconnect events go to a fast store instead of the users table:
+Redis in production, an in-process dict when Redis isn't configured (dev,
+tests). `last_seen` is written back to the DB in periodic batches by
+flush_presence(), so the users table takes one bulk UPDATE per
+PRESENCE_FLUSH_INTERVAL instead of one UPDATE per request:
+
+  redis   `manage.py flush_presence --loop`, out of the request path.
+  memory  the store only exists inside the server process, so that process
+          flushes it itself (flush_in_process_if_due, from
+          ActiveUserMiddleware) at most once per interval.
+
+A user is online while they have an open chat socket, or if their last
+heartbeat is within PRESENCE_TIMEOUT seconds.
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+
+def _timeout():
+    return getattr(settings, "PRESENCE_TIMEOUT", 300)
+
+
+# ============================================================
+# STORES
+# ============================================================
+
+class InMemoryPresenceStore:
+    """Single-process stand-in for RedisPresenceStore (dev and tests)."""
+
+    # Only visible to this process: it has to flush itself
+    in_process = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_seen = {}
+        self._sockets = {}
+        self._dirty = set()
+        self._flushed_at = time.monotonic()
+
+    def claim_flush(self, interval):
+        """True (once per `interval` seconds) when it is time to flush."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._flushed_at < interval:
+                return False
+            self._flushed_at = now
+            return True
+
+    def touch(self, user_id, ts):
+        with self._lock:
+            self._last_seen[user_id] = ts
+            self._dirty.add(user_id)
+
+    def add_socket(self, user_id, ts):
+        with self._lock:
+            self._sockets[user_id] = self._sockets.get(user_id, 0) + 1
+            self._last_seen[user_id] = ts
+            self._dirty.add(user_id)
+
+    def remove_socket(self, user_id, ts):
+        with self._lock:
+            remaining = self._sockets.get(user_id, 0) - 1
+            if remaining > 0:
+                self._sockets[user_id] = remaining
+            else:
+                self._sockets.pop(user_id, None)
+            self._last_seen[user_id] = ts
+            self._dirty.add(user_id)
+
+    def get_many(self, user_ids):
+        """{user_id: (last_seen ts or None, open socket count)}"""
+        with self._lock:
+            return {
+                user_id: (self._last_seen.get(user_id), self._sockets.get(user_id, 0))
+                for user_id in user_ids
+            }
+
+    def drain_dirty(self):
+        """Ids touched since the last drain (the batch to flush)."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            return dirty
+
+    def clear(self):
+        with self._lock:
+            self._last_seen.clear()
+            self._sockets.clear()
+            self._dirty.clear()
+
+
+class RedisPresenceStore:
+    """
+    Keys:
+      presence:last_seen    ZSET  user_id -> last heartbeat (unix ts)
+      presence:sockets      HASH  user_id -> open chat sockets
+      presence:dirty        SET   user ids not yet flushed to the DB
+    """
+
+    in_process = False
+
+    LAST_SEEN = "presence:last_seen"
+    SOCKETS = "presence:sockets"
+    DIRTY = "presence:dirty"
+
+    def __init__(self, url):
+        import redis
+
+        self.redis = redis.Redis.from_url(url)
+
+    def touch(self, user_id, ts):
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zadd(self.LAST_SEEN, {user_id: ts})
+        pipe.sadd(self.DIRTY, user_id)
+        pipe.execute()
+
+    def add_socket(self, user_id, ts):
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hincrby(self.SOCKETS, user_id, 1)
+        pipe.zadd(self.LAST_SEEN, {user_id: ts})
+        pipe.sadd(self.DIRTY, user_id)
+        pipe.execute()
+
+    def remove_socket(self, user_id, ts):
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hincrby(self.SOCKETS, user_id, -1)
+        pipe.zadd(self.LAST_SEEN, {user_id: ts})
+        pipe.sadd(self.DIRTY, user_id)
+        remaining = pipe.execute()[0]
+        if remaining <= 0:
+            self.redis.hdel(self.SOCKETS, user_id)
+
+    def get_many(self, user_ids):
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zmscore(self.LAST_SEEN, user_ids)
+        pipe.hmget(self.SOCKETS, user_ids)
+        scores, sockets = pipe.execute()
+        return {
+            user_id: (score, max(int(count or 0), 0))
+            for user_id, score, count in zip(user_ids, scores, sockets)
+        }
+
+    def drain_dirty(self):
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.smembers(self.DIRTY)
+        pipe.delete(self.DIRTY)
+        members = pipe.execute()[0]
+        return {int(user_id) for user_id in members}
+
+    def clear(self):
+        self.redis.delete(self.LAST_SEEN, self.SOCKETS, self.DIRTY)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """The process-wide presence store selected by PRESENCE_BACKEND."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if getattr(settings, "PRESENCE_BACKEND", "memory") == "redis":
+                    _store = RedisPresenceStore(settings.REDIS_URL)
+                else:
+                    _store = InMemoryPresenceStore()
+    return _store
+
+
+@receiver(setting_changed)
+def reset_store(setting, **kwargs):
+    """Pick the backend again when settings are overridden (tests, load harness)."""
+    global _store
+    if setting in ("PRESENCE_BACKEND", "REDIS_URL"):
+        _store = None
+
+
+# ============================================================
+# API
+# ============================================================
+
+def heartbeat(user_id):
+    """Record activity for a user (no DB write)."""
+    get_store().touch(user_id, time.time())
+
+
+def socket_connected(user_id):
+    get_store().add_socket(user_id, time.time())
+
+
+def socket_disconnected(user_id):
+    get_store().remove_socket(user_id, time.time())
+
+
+def get_presence_many(users):
+    """
+    {user_id: (is_online, last_seen datetime or None)} for `users`.
+    Falls back to the DB `last_seen` column for users the store doesn't know.
+    """
+    users = list(users)
+    records = get_store().get_many([user.id for user in users])
+    now = time.time()
+    presence = {}
+    for user in users:
+        ts, sockets = records.get(user.id, (None, 0))
+        if ts is None:
+            last_seen = user.last_seen
+            is_online = bool(sockets) or (
+                last_seen is not None
+                and timezone.now() - last_seen <= timedelta(seconds=_timeout())
+            )
+        else:
+            last_seen = datetime.fromtimestamp(ts, tz=dt_timezone.utc)
+            is_online = bool(sockets) or now - ts <= _timeout()
+        presence[user.id] = (is_online, last_seen)
+    return presence
+
+
+def presence_for(context, user):
+    """
+    (is_online, last_seen) for a user being serialized. Results are memoized
+    in the serializer context, so a response looks each user up once; call
+    prime_presence() first to fetch a whole page in one store round trip.
+    """
+    memo = context.setdefault("presence", {})
+    if user.id not in memo:
+        memo.update(get_presence_many([user]))
+    return memo[user.id]
+
+
+def prime_presence(context, users):
+    memo = context.setdefault("presence", {})
+    missing = {user.id: user for user in users if user is not None and user.id not in memo}
+    if missing:
+        memo.update(get_presence_many(missing.values()))
+
+
+# ============================================================
+# FLUSH TO DB
+# ============================================================
+
+def flush_presence(batch_size=500):
+    """
+    Write last_seen / is_online of every user touched since the previous
+    flush, as bulk UPDATEs of `batch_size` rows. Returns the number of users
+    flushed.
+    """
+    from users.models import CustomUser
+
+    user_ids = get_store().drain_dirty()
+    if not user_ids:
+        return 0
+
+    users = list(CustomUser.objects.filter(pk__in=user_ids).only("id", "last_seen", "is_online"))
+    presence = get_presence_many(users)
+    for user in users:
+        user.is_online, user.last_seen = presence[user.id]
+
+    CustomUser.objects.bulk_update(users, ["last_seen", "is_online"], batch_size=batch_size)
+    return len(users)
+
+
+def flush_in_process_if_due():
+    """
+    With the in-process store, flush it from the server process at most once
+    per PRESENCE_FLUSH_INTERVAL (`manage.py flush_presence` runs in another
+    process and would see an empty store). The flush runs once the current
+    transaction, if any, commits. A no-op with Redis.
+    """
+    store = get_store()
+    if store.in_process and store.claim_flush(settings.PRESENCE_FLUSH_INTERVAL):
+        transaction.on_commit(flush_presence)
@@ -0,0 +1,103 @@
+"""
+Race-safe toggles for many-to-many memberships (likes, follows).
+
+A toggle is a conditional DELETE on the through table's unique
+(source, target) index; only when it removed nothing is the row INSERTed,
+inside a savepoint. No liker/follower set is ever loaded, so the cost does
+not depend on how many rows the relation already has. Two concurrent
+toggles cannot both insert: the unique constraint rejects the second one,
+which then reports the membership without having changed anything.
+
+count_of() is the correlated COUNT used to recompute the stored counters
+these relations feed (likes_count, follower_count, ...).
+
+Serializers answer "does the viewer like / follow X" from flags memoized in
+their context: viewer_of() is the request's user (None when anonymous), and
+PrimedListSerializer resolves the flags for a whole page before any item is
+serialized.
+"""
+from django.db import IntegrityError, router, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.manager import BaseManager
+from django.db.models.signals import m2m_changed
+from rest_framework import serializers
+
+
+def toggle_membership(manager, obj):
+    """
+    Remove `obj` from the many-to-many `manager` (e.g. post.likes,
+    user.followers) if it is a member, add it otherwise.
+
+    Returns (is_member, changed): whether `obj` is a member afterwards and
+    whether this call changed the relation (False when a concurrent toggle
+    got there first). Sends the post_add / post_remove m2m_changed signals
+    that manager.add() / remove() would, so receivers keep working.
+    """
+    through = manager.through
+    instance = manager.instance
+    db = router.db_for_write(through, instance=instance)
+    values = {
+        f"{manager.source_field_name}_id": instance.pk,
+        f"{manager.target_field_name}_id": obj.pk,
+    }
+    rows = through._default_manager.using(db)
+
+    with transaction.atomic(using=db, savepoint=False):
+        deleted, _ = rows.filter(**values).delete()
+        if deleted:
+            is_member, action = False, "post_remove"
+        else:
+            try:
+                with transaction.atomic(using=db):
+                    rows.create(**values)
+            except IntegrityError:
+                # A concurrent toggle inserted the same row
+                return True, False
+            is_member, action = True, "post_add"
+
+        m2m_changed.send(
+            sender=through,
+            action=action,
+            instance=instance,
+            reverse=manager.reverse,
+            model=manager.model,
+            pk_set={obj.pk},
+            using=db,
+        )
+    return is_member, True
+
+
+def count_of(model, field):
+    """Correlated COUNT of `model` rows pointing at the outer row."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(n=Count("pk"))
+        .values("n")
+    ), 0)
+
+
+def viewer_of(context):
+    """The authenticated user of the serializer context's request, else None."""
+    request = context.get("request")
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        return None
+    return user
+
+
+class PrimedListSerializer(serializers.ListSerializer):
+    """
+    ListSerializer that evaluates the page once and hands it to prime()
+    (one query per relation for the whole page) before serializing items.
+    """
+
+    def prime(self, items):
+        pass
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, BaseManager) else data)
+        self.prime(items)
+        return super().to_representation(items)
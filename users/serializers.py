@@ -1,20 +1,68 @@
 from rest_framework import serializers
 from django.core.mail import send_mail
 from django.conf import settings
+from .follows import is_following, prime_following
 from .models import CustomUser
+from .presence import presence_for, prime_presence
+from .relations import PrimedListSerializer
 
 
 # -------------------------------
-# Full User Serializer (includes followers + following + status)
+# Compact author (embedded in posts and follow lists)
 # -------------------------------
+class AuthorSerializer(serializers.ModelSerializer):
+    profile_picture = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CustomUser
+        fields = ["id", "username", "first_name", "last_name", "profile_picture"]
+
+    def get_profile_picture(self, obj):
+        request = self.context.get("request")
+        if obj.profile_picture:
+            try:
+                return request.build_absolute_uri(obj.profile_picture.url)
+            except Exception:
+                return obj.profile_picture.url
+        return None
+
+
+class FollowListSerializer(PrimedListSerializer):
+    def prime(self, users):
+        # One query for whether the viewer follows each of them
+        prime_following(self.context, users)
+
+
+class FollowUserSerializer(AuthorSerializer):
+    """Entry of a follower / following page."""
+    is_following = serializers.SerializerMethodField()
+
+    class Meta(AuthorSerializer.Meta):
+        fields = AuthorSerializer.Meta.fields + ["is_following"]
+        list_serializer_class = FollowListSerializer
+
+    def get_is_following(self, obj):
+        return is_following(self.context, obj)
+
+
+# -------------------------------
+# Full User Serializer (includes follow counts + status)
+# -------------------------------
+class UserListSerializer(PrimedListSerializer):
+    def prime(self, users):
+        # One presence store round trip and one follow query for the whole list
+        prime_presence(self.context, users)
+        prime_following(self.context, users)
+
+
 class UserSerializer(serializers.ModelSerializer):
-    followers = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
-    following = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    follower_count = serializers.IntegerField(read_only=True)
+    following_count = serializers.IntegerField(read_only=True)
     profile_picture = serializers.SerializerMethodField()
     banner_image = serializers.SerializerMethodField()
     is_following = serializers.SerializerMethodField()
-    is_online = serializers.BooleanField(read_only=True)       # ✅ Added
-    last_seen = serializers.DateTimeField(read_only=True)      # ✅ Added
+    is_online = serializers.SerializerMethodField()
+    last_seen = serializers.SerializerMethodField()
 
     class Meta:
         model = CustomUser
@@ -28,8 +76,8 @@ class UserSerializer(serializers.ModelSerializer):
             "banner_image",
             "bio",
             "location",
-            "followers",
-            "following",
+            "follower_count",
+            "following_count",
             "is_following",
             "is_online",   # ✅
             "last_seen",   # ✅
@@ -37,12 +85,13 @@ class UserSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = [
             "created_at",
-            "followers",
-            "following",
+            "follower_count",
+            "following_count",
             "is_following",
             "is_online",
             "last_seen",
         ]
+        list_serializer_class = UserListSerializer
 
     def get_profile_picture(self, obj):
         request = self.context.get("request")
@@ -62,12 +111,17 @@ class UserSerializer(serializers.ModelSerializer):
                 return obj.banner_image.url
         return None
 
+    def get_is_online(self, obj):
+        """Online status from the presence store, not the DB column."""
+        return presence_for(self.context, obj)[0]
+
+    def get_last_seen(self, obj):
+        last_seen = presence_for(self.context, obj)[1]
+        return serializers.DateTimeField().to_representation(last_seen) if last_seen else None
+
     def get_is_following(self, obj):
         """Check if the current authenticated user follows this user."""
-        request = self.context.get("request")
-        if request and request.user and request.user.is_authenticated:
-            return request.user in obj.followers.all()
-        return False
+        return is_following(self.context, obj)
 
 
 # -------------------------------
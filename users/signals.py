@@ -0,0 +1,23 @@
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from users.models import CustomUser
+
+
+# -------------------------------
+# Follow counters when a user is deleted
+# -------------------------------
+# CustomUser.toggle_follow moves both counters, but deleting a user drops
+# their follow rows through CASCADE, without m2m_changed. pre_delete runs
+# inside the delete's transaction, so the accounts on the other side of
+# those rows are decremented there, one UPDATE per direction.
+@receiver(pre_delete, sender=CustomUser)
+def drop_follows_of_deleted_user(sender, instance, **kwargs):
+    CustomUser.objects.filter(followers=instance).update(
+        follower_count=Greatest(F("follower_count") - 1, 0)
+    )
+    CustomUser.objects.filter(following=instance).update(
+        following_count=Greatest(F("following_count") - 1, 0)
+    )
@@ -1,3 +1,135 @@
-from django.test import TestCase
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from notifications.models import Notification
+from posts.models import Post, TimelineEntry
+from users.models import CustomUser
+
+
+class FollowGraphTests(TestCase):
+    """Follow counters, is_following and the paginated follower / following lists."""
+
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(username="alice", email="alice@example.com", password="pass")
+        self.bob = CustomUser.objects.create_user(username="bob", email="bob@example.com", password="pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def make_users(self, count, prefix="fan"):
+        return [
+            CustomUser.objects.create_user(username=f"{prefix}{i}", email=f"{prefix}{i}@example.com", password="pass")
+            for i in range(count)
+        ]
+
+    def test_toggle_moves_counters(self):
+        url = reverse("follow-toggle", args=[self.bob.pk])
+        self.assertEqual(self.client.post(url).data["follower_count"], 1)
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.following_count, 1)
+        self.assertTrue(self.alice.is_following(self.bob))
+
+        self.assertEqual(self.client.post(url).data["follower_count"], 0)
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.following_count, 0)
+        self.assertFalse(self.alice.is_following(self.bob))
+
+    def test_user_delete_moves_counters(self):
+        carol = CustomUser.objects.create_user(username="carol", email="carol@example.com", password="pass")
+        carol.toggle_follow(self.bob)
+        self.alice.toggle_follow(carol)
+
+        carol.delete()
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((self.bob.follower_count, self.alice.following_count), (0, 0))
+
+    def test_follow_toggle(self):
+        url = reverse("follow-toggle", args=[self.bob.pk])
+        post = Post.objects.create(user=self.bob, content="hello")
+
+        self.assertEqual(self.client.post(url).data["detail"], "Successfully followed user.")
+        self.assertTrue(self.bob.followers.filter(pk=self.alice.pk).exists())
+        self.assertTrue(Notification.objects.filter(to_user=self.bob, notification_type="follow").exists())
+        # posts.signals still backfills the timeline
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.alice, post=post).exists())
+
+        self.assertEqual(self.client.post(url).data["detail"], "Successfully unfollowed user.")
+        self.assertFalse(self.bob.followers.exists())
+        self.assertFalse(Notification.objects.filter(to_user=self.bob, notification_type="follow").exists())
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.alice, post=post).exists())
+
+    def test_profile_has_counts_not_id_lists(self):
+        self.alice.toggle_follow(self.bob)
+        data = self.client.get(reverse("user-detail", args=["bob"])).data
+
+        self.assertNotIn("followers", data)
+        self.assertEqual((data["follower_count"], data["following_count"]), (1, 0))
+        self.assertTrue(data["is_following"])
+
+    def test_post_author_is_compact(self):
+        Post.objects.create(user=self.bob, content="hello")
+        author = self.client.get(reverse("post-list")).data["results"][0]["user"]
+        self.assertEqual(set(author), {"id", "username", "first_name", "last_name", "profile_picture"})
+
+    def test_follower_pages_newest_first(self):
+        fans = self.make_users(5)
+        for fan in fans:
+            fan.toggle_follow(self.bob)
+        self.alice.toggle_follow(fans[0])
+
+        page = self.client.get(reverse("user-followers", args=["bob"]), {"page_size": 3}).data
+        self.assertEqual([u["username"] for u in page["results"]], ["fan4", "fan3", "fan2"])
+        page = self.client.get(page["next"]).data
+        self.assertEqual([u["username"] for u in page["results"]], ["fan1", "fan0"])
+        self.assertEqual([u["is_following"] for u in page["results"]], [False, True])
+        self.assertIsNone(page["next"])
+
+        following = self.client.get(reverse("user-following", args=["fan0"])).data["results"]
+        self.assertEqual([u["username"] for u in following], ["bob"])
+
+    def test_list_cost_independent_of_size(self):
+        for fan in self.make_users(3):
+            fan.toggle_follow(self.bob)
+        carol = CustomUser.objects.create_user(username="carol", email="carol@example.com", password="pass")
+        for fan in self.make_users(12, prefix="c"):
+            fan.toggle_follow(carol)
+
+        # user, one page of follow rows with the users, the viewer's follows
+        for username in ("bob", "carol"):
+            with self.assertNumQueries(3):
+                self.client.get(reverse("user-followers", args=[username]), {"page_size": 3})
+
+    def test_reconcile(self):
+        self.bob.followers.add(self.alice)
+        CustomUser.objects.filter(pk=self.bob.pk).update(follower_count=9)
+
+        call_command("reconcile_counters", stdout=StringIO())
+        self.bob.refresh_from_db()
+        self.alice.refresh_from_db()
+        self.assertEqual((self.bob.follower_count, self.alice.following_count), (1, 1))
+
+
+@override_settings(PRESENCE_BACKEND="memory")
+class PresenceFlushTests(TestCase):
+    """last_seen reaches the users table with the in-process presence store too."""
+
+    def setUp(self):
+        self.alice = CustomUser.objects.create_user(username="alice", email="alice@example.com", password="pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    @override_settings(PRESENCE_FLUSH_INTERVAL=0)
+    def test_server_process_flushes_memory_store(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse("user-detail", args=["alice"]))
+        self.alice.refresh_from_db()
+        self.assertIsNotNone(self.alice.last_seen)
+        self.assertTrue(self.alice.is_online)
+
+    def test_command_refuses_memory_store(self):
+        with self.assertRaises(CommandError):
+            call_command("flush_presence", stdout=StringIO())
@@ -8,6 +8,7 @@ from .views import (
     PasswordResetRequestView,
     PasswordResetConfirmView,
     FollowToggleView,
+    FollowListView,
     UserDetailView,
     LogoutView,  
 )
@@ -36,6 +37,10 @@ urlpatterns = [
     # Follow/unfollow user
     path("follow/<int:user_id>/", FollowToggleView.as_view(), name="follow-toggle"),
      
+    # Followers / following of a user (cursor-paginated)
+    path("<str:username>/followers/", FollowListView.as_view(relation="followers"), name="user-followers"),
+    path("<str:username>/following/", FollowListView.as_view(relation="following"), name="user-following"),
+
     # Get user by username 
     path("<str:username>/", UserDetailView.as_view(), name="user-detail"),
 ]
@@ -5,6 +5,8 @@ from google.oauth2 import id_token
 from google.auth.transport import requests
 
 from rest_framework.views import APIView
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
@@ -12,7 +14,11 @@ from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
 
+from backend.pagination import KeysetPagination
+
+from . import follows
 from .serializers import (
+    FollowUserSerializer,
     UserSerializer,
     UserUpdateSerializer,
     EmailSignupSerializer,
@@ -203,14 +209,77 @@ class FollowToggleView(APIView):
         if target_user == request.user:
             return Response({"detail": "Cannot follow yourself."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if request.user in target_user.followers.all():
-            target_user.followers.remove(request.user)
-            action = "unfollowed"
+        action = "followed" if request.user.toggle_follow(target_user) else "unfollowed"
+
+        return Response(
+            {"detail": f"Successfully {action} user.", "follower_count": target_user.follower_count},
+            status=status.HTTP_200_OK,
+        )
+
+
+# -----------------------------
+# FOLLOWER / FOLLOWING LISTS
+# -----------------------------
+class FollowCursorPagination(KeysetPagination):
+    """
+    Keyset pagination over follow rows, most recent follow first.
+
+      ?cursor=<follow id>   the page after the one that returned it in `next`
+      (no cursor)           the first page
+
+    Pages are located with `id < cursor` on the (user, id) follow indexes;
+    no COUNT, no OFFSET (the totals are the users' stored counters).
+    """
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        size = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            try:
+                queryset = queryset.filter(id__lt=int(cursor))
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+        rows = list(queryset.order_by("-id")[: size + 1])
+        self.page = rows[:size]
+        self.has_next = len(rows) > size
+        return self.page
+
+    def get_next_link(self):
+        if not self.page or not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.page[-1].pk)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "results": data,
+        })
+
+
+class FollowListView(APIView):
+    """A user's followers (`relation = "followers"`) or followed accounts, paginated."""
+    permission_classes = [IsAuthenticated]
+    relation = "followers"
+
+    def get(self, request, username):
+        user = User.objects.filter(username=username).only("id").first()
+        if user is None:
+            return Response({"detail": "User not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        if self.relation == "followers":
+            rows, other = follows.followers_of(user.pk), "to_customuser"
         else:
-            target_user.followers.add(request.user)
-            action = "followed"
+            rows, other = follows.following_of(user.pk), "from_customuser"
 
-        return Response({"detail": f"Successfully {action} user."}, status=status.HTTP_200_OK)
+        paginator = FollowCursorPagination()
+        page = paginator.paginate_queryset(rows, request, view=self)
+        users = [getattr(row, other) for row in page]
+        serializer = FollowUserSerializer(users, many=True, context={"request": request})
+        return paginator.get_paginated_response(serializer.data)
 
 
 # -----------------------------